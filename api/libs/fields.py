@@ -0,0 +1,82 @@
+"""Spotify field projections.
+
+Playlist endpoints take a ``fields`` parameter that selects the parts of
+the response to return, e.g. ``items(track(id,name,album(id,name)))``.
+Leaving out what we don't read (``available_markets`` arrays in
+particular) shrinks the payload several times over.
+
+Projections are declared next to the code that reads the responses:
+
+    ITEM_FIELDS = FieldProjection(track=FieldProjection("id", "name"))
+
+    str(ITEM_FIELDS.page())  # "next,total,items(track(id,name))"
+"""
+
+import typing
+
+PAGE_FIELDS = ("next", "total", "offset", "limit")
+
+
+class FieldProjection:
+    """A selection of fields of an API object.
+
+    Args:
+        fields: Names of the selected (leaf) fields.
+        nested: Selections within object (or array of objects) fields.
+    """
+
+    def __init__(
+        self, *fields: str, **nested: "FieldProjection | typing.Iterable[str]"
+    ) -> None:
+        """Create a projection."""
+        self.fields = tuple(dict.fromkeys(fields))
+        self.nested = {
+            name: value
+            if isinstance(value, FieldProjection)
+            else FieldProjection(*value)
+            for name, value in nested.items()
+        }
+
+    def __str__(self) -> str:
+        """Render the projection in the ``fields`` parameter syntax."""
+        # A field selected as a whole takes precedence over a selection in it.
+        return ",".join(
+            [
+                *self.fields,
+                *(
+                    f"{name}({value})"
+                    for name, value in self.nested.items()
+                    if name not in self.fields
+                ),
+            ]
+        )
+
+    def __repr__(self) -> str:
+        """Representation of the projection."""
+        return f"FieldProjection({str(self)!r})"
+
+    def __eq__(self, other: object) -> bool:
+        """Projections are equal when they select the same fields."""
+        return isinstance(other, FieldProjection) and str(self) == str(other)
+
+    def __hash__(self) -> int:
+        """Hash of the rendered projection."""
+        return hash(str(self))
+
+    def __or__(self, other: "FieldProjection") -> "FieldProjection":
+        """Union of two projections, for responses read by many consumers."""
+        nested = dict(self.nested)
+
+        for name, value in other.nested.items():
+            nested[name] = nested[name] | value if name in nested else value
+
+        return FieldProjection(*self.fields, *other.fields, **nested)
+
+    def page(self) -> "FieldProjection":
+        """Projection of a page of items, each selected by this projection."""
+        return FieldProjection(*PAGE_FIELDS, items=self)
+
+    @property
+    def params(self) -> dict[str, str]:
+        """Query parameters for the projection."""
+        return {"fields": str(self)}
@@ -0,0 +1,52 @@
+"""Recount the maintained track counts of playlists & albums."""
+
+import itertools
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from api.models import Album, Playlist
+from browser.models import Library, LibraryStats
+
+
+class Command(BaseCommand):
+    """Reconcile the track counts of every playlist & album.
+
+    The counts are recounted by the sync managers whenever they link or
+    unlink tracks, this fixes counts that drifted because of writes that
+    bypassed them (e.g. tracks deleted from the admin). The statistics of
+    every library are refreshed with the reconciled counts.
+    """
+
+    help = "Recount the tracks of every playlist and album, refresh library stats."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Command arguments."""
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of playlists (or albums) recounted per query.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """Recount in batches of primary keys."""
+        for model in (Playlist, Album):
+            pks = model.objects.order_by().values_list("pk", flat=True).iterator()
+            count = 0
+            name = model._meta.verbose_name_plural
+
+            while batch := list(itertools.islice(pks, options["batch_size"])):
+                count += model.sync.recount(batch)
+
+            self.stdout.write(
+                self.style.SUCCESS(f"Recounted the tracks of {count} {name}.")
+            )
+
+        library_pks = list(Library.objects.values_list("pk", flat=True))
+
+        for library_pk in library_pks:
+            LibraryStats.objects.refresh(library_pk)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Refreshed the stats of {len(library_pks)} libraries.")
+        )
@@ -0,0 +1,97 @@
+"""Playlist items, with their position, replace the track-playlist relation.
+
+The relation's table is kept (renamed) with its rows, so existing playlists
+stay linked until their next sync sets the positions of their items.
+"""
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0006_analysis_album_alter_analysis_playlist"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="PlaylistItem",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "playlist",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                related_name="items",
+                                to="api.playlist",
+                            ),
+                        ),
+                        (
+                            "track",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                related_name="playlist_items",
+                                to="api.track",
+                            ),
+                        ),
+                    ],
+                    options={
+                        "db_table": "api_track_playlists",
+                        "unique_together": {("track", "playlist")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="track",
+                    name="playlists",
+                    field=models.ManyToManyField(
+                        related_name="tracks",
+                        through="api.PlaylistItem",
+                        to="api.playlist",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="playlistitem",
+            name="position",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="playlistitem",
+            name="added_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="playlistitem",
+            name="added_by",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.AlterUniqueTogether(
+            name="playlistitem",
+            unique_together=set(),
+        ),
+        migrations.AlterModelTable(
+            name="playlistitem",
+            table=None,
+        ),
+        migrations.AlterModelOptions(
+            name="playlistitem",
+            options={"ordering": ["playlist", "position"]},
+        ),
+        migrations.AddIndex(
+            model_name="playlistitem",
+            index=models.Index(
+                fields=["playlist", "position"], name="api_playlistitem_position_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,71 @@
+"""Maintained track counts of playlists & albums, counted from their tracks."""
+
+from django.apps.registry import Apps
+from django.db import migrations, models
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.db.models.functions import Coalesce
+
+
+def count(rows: models.QuerySet) -> Coalesce:
+    """Number of rows linked to the outer row."""
+    return Coalesce(
+        models.Subquery(rows.annotate(count=models.Count("pk")).values("count")), 0
+    )
+
+
+def count_tracks(apps: Apps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    """Count the tracks of the existing playlists & albums."""
+    Playlist = apps.get_model("api", "Playlist")
+    PlaylistItem = apps.get_model("api", "PlaylistItem")
+    Album = apps.get_model("api", "Album")
+    Track = apps.get_model("api", "Track")
+
+    items = (
+        PlaylistItem._default_manager.filter(playlist=models.OuterRef("pk"))
+        .order_by()
+        .values("playlist")
+    )
+    tracks = (
+        Track._default_manager.filter(album=models.OuterRef("pk"))
+        .order_by()
+        .values("album")
+    )
+
+    Playlist._default_manager.update(
+        num_tracks=count(items),
+        num_analyzed_tracks=count(items.filter(track__features__isnull=False)),
+    )
+    Album._default_manager.update(
+        num_tracks=count(tracks),
+        num_analyzed_tracks=count(tracks.filter(features__isnull=False)),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0007_playlistitem"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="album",
+            name="num_analyzed_tracks",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="album",
+            name="num_tracks",
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name="playlist",
+            name="num_analyzed_tracks",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="playlist",
+            name="num_tracks",
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(count_tracks, migrations.RunPython.noop),
+    ]
@@ -5,4 +5,4 @@ from api.models.album import Album
 from api.models.music import Artist, Genre
 from api.models.track import Track
 from api.models.analysis import Analysis, TrackFeatures, Computation
-from api.models.playlist import Playlist
+from api.models.playlist import Playlist, PlaylistItem
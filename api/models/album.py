@@ -1,5 +1,6 @@
 """Album Model."""
 
+import typing
 import uuid
 
 from django.db import models
@@ -7,7 +8,13 @@ from django_stubs_ext.db.models import TypedModelMeta
 from loguru import logger
 
 from api.blocks import AlbumArtistSyncBlock, AlbumSyncBlock, AlbumTrackSyncBlock
-from api.models.mixins import CanBeAnalyzedMixin, SpotifyModel, TimestampedModel
+from api.models.mixins import (
+    CanBeAnalyzedMixin,
+    HasTrackCountsMixin,
+    SpotifyModel,
+    TimestampedModel,
+    track_counts,
+)
 
 
 class AlbumSyncManager(models.Manager["Album"]):
@@ -97,8 +104,15 @@ class AlbumSyncManager(models.Manager["Album"]):
 
         return album.pk
 
+    def recount(self, pks: typing.Iterable[uuid.UUID] | models.QuerySet) -> int:
+        """Recount the tracks (and analyzed tracks) of albums."""
+        pks = pks if isinstance(pks, models.QuerySet) else list(pks)
+        tracks = self.model.tracks.field.model._default_manager.all()
 
-class Album(SpotifyModel, TimestampedModel, CanBeAnalyzedMixin):
+        return self.filter(pk__in=pks).update(**track_counts(tracks, "album"))
+
+
+class Album(SpotifyModel, TimestampedModel, CanBeAnalyzedMixin, HasTrackCountsMixin):
     """Album model.
 
     Required fields for creation:
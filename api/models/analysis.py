@@ -9,12 +9,12 @@ import typing
 import uuid
 
 import pandas as pd
-from django.db import models
+from django.db import models, transaction
 from loguru import logger
 
 from api.models.album import Album
 from api.models.mixins import TimestampedModel
-from api.models.playlist import Playlist
+from api.models.playlist import Playlist, PlaylistItem
 from api.models.track import Track
 from api.serializers import validation
 from core.models import AppUser
@@ -51,20 +51,7 @@ class AnalysisManager(models.Manager["Analysis"]):
             user=user,
         )
 
-        tracks = []
-
-        for item in items:
-            data = validation.SyncAnalysis(**item)
-            feature_data = data.model_dump().copy()
-            spotify_id = feature_data.pop("id")
-
-            track = album.tracks.get(spotify_id=spotify_id)
-
-            _ = TrackFeatures.objects.get_or_create(**feature_data, track_id=track.pk)
-
-            tracks.append(track)
-
-        analysis.tracks.set(tracks)
+        analysis.tracks.set(self.persist_features(album.tracks.all(), items))
         album.is_analyzed = True
 
         analysis.save()
@@ -113,11 +100,7 @@ class AnalysisManager(models.Manager["Analysis"]):
                 f"Playlist {str(playlist.pk)} | {playlist.name} is not synced."
             )
 
-        version_tag = (
-            f"version:{playlist.pk}:{playlist.version}"
-            if playlist.version
-            else f"playlist:{playlist.pk}"
-        )
+        version_tag = self.version_tag(playlist)
 
         if playlist.is_analyzed and self.filter(version=version_tag).exists():
             logger.info(f"Playlist {playlist.pk} is already analyzed.")
@@ -132,20 +115,7 @@ class AnalysisManager(models.Manager["Analysis"]):
             },
         )
 
-        tracks = []
-
-        for item in items:
-            data = validation.SyncAnalysis(**item)
-            feature_data = data.model_dump().copy()
-            spotify_id = feature_data.pop("id")
-
-            track = playlist.tracks.get(spotify_id=spotify_id)
-
-            _ = TrackFeatures.objects.get_or_create(**feature_data, track_id=track.pk)
-
-            tracks.append(track)
-
-        analysis.tracks.set(tracks)
+        analysis.tracks.set(self.persist_features(playlist.tracks.all(), items))
         playlist.is_analyzed = True
 
         analysis.save()
@@ -155,6 +125,138 @@ class AnalysisManager(models.Manager["Analysis"]):
 
         return analysis.pk
 
+    def persist_features(
+        self, tracks: models.QuerySet[Track], items: typing.Iterable[dict]
+    ) -> list[Track]:
+        """Write the features of a playlist's (or album's) tracks in bulk.
+
+        Items are audio features objects from the API. Returns the tracks
+        with features, items of tracks outside of ``tracks`` are skipped.
+        """
+        items = [item for item in items if item]
+        by_spotify_id = {t.spotify_id: t for t in tracks.only("pk", "spotify_id")}
+
+        TrackFeatures.sync.bulk_upsert(
+            items, {spotify_id: t.pk for spotify_id, t in by_spotify_id.items()}
+        )
+
+        return list(
+            {
+                by_spotify_id[item["id"]].pk: by_spotify_id[item["id"]]
+                for item in items
+                if item["id"] in by_spotify_id
+            }.values()
+        )
+
+    def version_tag(self, playlist: Playlist) -> str:
+        """Version tag of a playlist's analysis."""
+        if playlist.version:
+            return f"version:{playlist.pk}:{playlist.version}"
+
+        return f"playlist:{playlist.pk}"
+
+    # BATCH PLAYLIST ANALYSIS
+    def pre_batch_analysis(
+        self, playlist_pks: typing.Iterable[uuid.UUID], user_pk: int
+    ) -> dict[uuid.UUID, list[str]]:
+        """Setup the analysis of a set of playlists.
+
+        Retrieves the track Spotify IDs of each playlist that is synced &
+        not yet analyzed (at its current version).
+        """
+        playlists = {
+            p.pk: p
+            for p in Playlist.objects.filter(pk__in=list(playlist_pks), is_synced=True)
+        }
+        tags = {pk: self.version_tag(p) for pk, p in playlists.items()}
+        analyzed = set(
+            self.filter(version__in=tags.values()).values_list("version", flat=True)
+        )
+
+        pending: dict[uuid.UUID, list[str]] = {
+            pk: []
+            for pk, p in playlists.items()
+            if not (p.is_analyzed and tags[pk] in analyzed)
+        }
+
+        rows = Track.playlists.through.objects.filter(
+            playlist_id__in=pending.keys()
+        ).values_list("playlist_id", "track__spotify_id")
+
+        for playlist_pk, spotify_id in rows:
+            pending[playlist_pk].append(spotify_id)
+
+        return {pk: track_ids for pk, track_ids in pending.items() if track_ids}
+
+    def analyze_batch(
+        self,
+        playlist_tracks: dict[uuid.UUID, list[str]],
+        user_pk: int,
+        items: typing.Iterable[dict],
+    ) -> dict[uuid.UUID, uuid.UUID]:
+        """Build the analyses of a set of playlists from shared track data.
+
+        The features of every track are written in bulk, then an analysis
+        is created for each playlist. Returns the analysis primary key of
+        each playlist.
+        """
+        user = AppUser.objects.get(pk=user_pk)
+
+        TrackFeatures.sync.bulk_upsert(items)
+
+        tracks = {
+            t.spotify_id: t
+            for t in Track.objects.filter(
+                spotify_id__in={t for ids in playlist_tracks.values() for t in ids},
+                features__isnull=False,
+            ).only("pk", "spotify_id")
+        }
+
+        analyses = {}
+
+        for playlist in Playlist.objects.filter(pk__in=playlist_tracks.keys()):
+            analysis, _ = self.update_or_create(
+                playlist_id=playlist.pk,
+                user=user,
+                defaults={"version": self.version_tag(playlist)},
+            )
+
+            analysis.tracks.set(
+                [tracks[t] for t in playlist_tracks[playlist.pk] if t in tracks]
+            )
+
+            analyses[playlist.pk] = analysis.pk
+
+        return analyses
+
+    def compute_batch(self, analysis_pks: list[uuid.UUID]) -> dict[uuid.UUID, dict]:
+        """Compute a set of analyses from one shared dataset."""
+        memberships = self.model.tracks.through.objects.filter(
+            analysis_id__in=analysis_pks
+        ).values_list("analysis_id", "track_id")
+
+        tracks: dict[uuid.UUID, set[uuid.UUID]] = {pk: set() for pk in analysis_pks}
+
+        for analysis_pk, track_pk in memberships:
+            tracks[analysis_pk].add(track_pk)
+
+        data = pd.DataFrame(
+            list(
+                TrackFeatures.objects.filter(
+                    track_id__in={t for pks in tracks.values() for t in pks}
+                ).values()
+            )
+        )
+
+        if data.empty:
+            return {}
+
+        return {
+            analysis_pk: self.compute_frame(data[data["track_id"].isin(track_pks)])
+            for analysis_pk, track_pks in tracks.items()
+            if track_pks
+        }
+
     # COMPUTATION OPERATIONS
     def build_dataset(self, analysis_pk: uuid.UUID) -> pd.DataFrame:
         """Calculate playlist stats."""
@@ -177,8 +279,10 @@ class AnalysisManager(models.Manager["Analysis"]):
         2. Calculate averages, superlatives, and counts.
         3. Return the computed data.
         """
-        data = self.build_dataset(analysis_pk)
+        return self.compute_frame(self.build_dataset(analysis_pk))
 
+    def compute_frame(self, data: pd.DataFrame) -> dict:
+        """Calculate averages, superlatives, and counts of track features."""
         logger.debug(f"Data: {data.head()}")
 
         computation_fields = [
@@ -257,6 +361,94 @@ class AnalysisManager(models.Manager["Analysis"]):
         raise ValueError("Analysis must have a playlist or album.")
 
 
+FEATURE_FIELDS = [
+    field for field in validation.SyncAnalysis.model_fields if field != "id"
+]
+
+
+class TrackFeaturesSyncManager(models.Manager["TrackFeatures"]):
+    """Manager for stored audio features."""
+
+    def stored(self, spotify_ids: typing.Iterable[str]) -> dict[str, dict]:
+        """Stored features of tracks, keyed by the track's Spotify ID.
+
+        Features are returned in the shape of the API's audio features
+        objects (see ``validation.SyncAnalysis``).
+        """
+        rows = self.filter(track__spotify_id__in=list(spotify_ids)).values(
+            "track__spotify_id", *FEATURE_FIELDS
+        )
+
+        return {
+            row["track__spotify_id"]: {
+                "id": row["track__spotify_id"],
+                **{field: row[field] for field in FEATURE_FIELDS},
+            }
+            for row in rows
+        }
+
+    def missing(self, spotify_ids: typing.Iterable[str]) -> list[str]:
+        """Spotify IDs of the tracks without stored features."""
+        spotify_ids = list(dict.fromkeys(spotify_ids))
+        stored = set(
+            self.filter(track__spotify_id__in=spotify_ids).values_list(
+                "track__spotify_id", flat=True
+            )
+        )
+
+        return [spotify_id for spotify_id in spotify_ids if spotify_id not in stored]
+
+    def bulk_upsert(
+        self,
+        items: typing.Iterable[dict],
+        track_pks: dict[str, uuid.UUID] | None = None,
+    ) -> int:
+        """Write the features of tracks in bulk.
+
+        Items are audio features objects from the API; features of unknown
+        tracks are skipped. Track primary keys (by Spotify ID) are looked up
+        unless they're given in ``track_pks``. The analyzed track counts of
+        the playlists & albums of the tracks are recounted. Returns the
+        number of tracks written.
+        """
+        features = {
+            data.id: data.model_dump(exclude={"id"})
+            for data in (validation.SyncAnalysis(**item) for item in items if item)
+        }
+
+        if track_pks is None:
+            track_pks = dict(
+                Track.objects.filter(spotify_id__in=features.keys()).values_list(
+                    "spotify_id", "pk"
+                )
+            )
+
+        with transaction.atomic():
+            records = self.bulk_create(
+                [
+                    self.model(track_id=track_pks[spotify_id], **feature_data)
+                    for spotify_id, feature_data in features.items()
+                    if spotify_id in track_pks
+                ],
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=["track"],
+                update_fields=[*FEATURE_FIELDS, "updated_at"],
+            )
+
+            if records:
+                self.recount([record.track_id for record in records])
+
+        return len(records)
+
+    def recount(self, track_pks: list[uuid.UUID]) -> None:
+        """Recount the tracks of the playlists & albums of tracks."""
+        Playlist.sync.recount(
+            PlaylistItem.objects.filter(track_id__in=track_pks).values("playlist_id")
+        )
+        Album.sync.recount(Track.objects.filter(pk__in=track_pks).values("album_id"))
+
+
 class TrackFeatures(TimestampedModel):
     """Track feature record.
 
@@ -284,6 +476,9 @@ class TrackFeatures(TimestampedModel):
     duration_ms = models.IntegerField()
     time_signature = models.IntegerField()
 
+    objects: models.Manager["TrackFeatures"] = models.Manager()
+    sync: TrackFeaturesSyncManager = TrackFeaturesSyncManager()
+
 
 class Analysis(TimestampedModel):
     """Analysis model.
@@ -1,10 +1,15 @@
 """API Model Mixins."""
 
+import datetime
 import uuid
 
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django_stubs_ext.db.models import TypedModelMeta
 
+from server import settings
+
 
 class TokenSetMixin(models.Model):
     """Token attributes."""
@@ -15,8 +20,13 @@ class TokenSetMixin(models.Model):
 
     @property
     def token_expired(self) -> bool:
-        """Check if the token is expired."""
-        return True
+        """Check if the token is expired, or will be within the refresh margin."""
+        if self.token_expiry is None:
+            return True
+
+        margin = datetime.timedelta(seconds=settings.SPOTIFY_TOKEN_REFRESH_MARGIN)
+
+        return self.token_expiry <= timezone.now() + margin
 
     class Meta(TypedModelMeta):
         """TokenSet meta class."""
@@ -46,6 +56,59 @@ class CanBeAnalyzedMixin(CanBeSyncedMixin):
         abstract = True
 
 
+class HasTrackCountsMixin(models.Model):
+    """Maintained counts of a collection's tracks.
+
+    Counting the tracks of every listed collection is a query each, so the
+    counts are stored & recounted (see ``track_counts``) when the sync
+    managers link or unlink tracks.
+    """
+
+    num_tracks = models.PositiveIntegerField(default=0, db_index=True)
+    num_analyzed_tracks = models.PositiveIntegerField(default=0)
+
+    track_count_fields = ("num_tracks", "num_analyzed_tracks")
+
+    class Meta(TypedModelMeta):
+        """HasTrackCounts meta class."""
+
+        abstract = True
+
+    def save(self, *args, **kwargs) -> None:
+        """Save the model without writing over counts that were recounted."""
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            fields: list[models.Field] = list(self._meta.concrete_fields)
+
+            kwargs["update_fields"] = [
+                field.name
+                for field in fields
+                if not field.primary_key and field.name not in self.track_count_fields
+            ]
+
+        super().save(*args, **kwargs)
+
+
+def track_counts(rows: models.QuerySet, owner: str, track: str = "") -> dict:
+    """Count expressions of the tracks of collections, for an update.
+
+    ``rows`` are the rows that link tracks to the collection through the
+    ``owner`` foreign key, ``track`` is the lookup of the track from a row
+    (empty when the rows are tracks). Tracks with features are analyzed.
+    """
+    rows = rows.filter(**{owner: models.OuterRef("pk")}).order_by().values(owner)
+    features = f"{track}__features__isnull" if track else "features__isnull"
+
+    def count(qs: models.QuerySet) -> Coalesce:
+        return Coalesce(
+            models.Subquery(qs.annotate(count=models.Count("pk")).values("count")), 0
+        )
+
+    return {
+        "num_tracks": count(rows),
+        "num_analyzed_tracks": count(rows.filter(**{features: False})),
+    }
+
+
 class TimestampedModel(models.Model):
     """Base model for timestamped models."""
 
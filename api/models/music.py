@@ -4,7 +4,7 @@ Parking Lot
 - (TODO) Musicbrainz integration models
 """
 
-from django.db import models
+from django.db import models, transaction
 
 from api.blocks import AlbumArtistSyncBlock
 from api.models.album import Album
@@ -27,6 +27,44 @@ class ArtistSyncManager(models.Manager["Artist"]):
 
         return artist
 
+    def sync_genres(self, artist_genres: dict[str, list[str]]) -> list[int]:
+        """Sync the genres of artists (by Spotify ID) in bulk.
+
+        Distinct genre names are upserted with one insert and linked to the
+        artists with another, then the artists are marked as synced. Returns
+        the primary keys of the genres.
+        """
+        names = {name for genres in artist_genres.values() for name in genres}
+
+        with transaction.atomic():
+            Genre.objects.bulk_create(
+                [Genre(name=name) for name in names], ignore_conflicts=True
+            )
+
+            genre_pks = dict(
+                Genre.objects.filter(name__in=names).values_list("name", "pk")
+            )
+            artist_pks = dict(
+                self.filter(spotify_id__in=artist_genres.keys()).values_list(
+                    "spotify_id", "pk"
+                )
+            )
+
+            self.model.genres.through.objects.bulk_create(
+                [
+                    self.model.genres.through(
+                        artist_id=artist_pk, genre_id=genre_pks[name]
+                    )
+                    for spotify_id, artist_pk in artist_pks.items()
+                    for name in set(artist_genres[spotify_id])
+                ],
+                ignore_conflicts=True,
+            )
+
+            self.filter(pk__in=artist_pks.values()).update(is_synced=True)
+
+        return list(genre_pks.values())
+
 
 class Artist(SpotifyModel, TimestampedModel, CanBeSyncedMixin):
     """Artist model.
@@ -1,24 +1,40 @@
 """Playlist Model."""
 
+import collections
+import dataclasses
 import datetime
 import json
 import typing
 import uuid
 
 import pydantic
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django_stubs_ext.db.models import TypedModelMeta
 from loguru import logger
 
-from api.models.mixins import CanBeAnalyzedMixin
+from api.libs.fields import FieldProjection
+from api.models.mixins import CanBeAnalyzedMixin, HasTrackCountsMixin, track_counts
 from api.models.music import SpotifyModel, TimestampedModel
 from api.serializers import validation
+from core.membership import MembershipWriter
 
 
 class PlaylistSyncManager(models.Manager["Playlist"]):
     """Manager for syncing user playlists."""
 
+    # Fields of the playlist object read by clean_playlist
+    api_fields = FieldProjection(
+        "id",
+        "name",
+        "snapshot_id",
+        "public",
+        "collaborative",
+        "description",
+        owner=("id",),
+        images=("url",),
+    )
+
     def clean_playlist(self, playlist: dict) -> validation.SyncPlaylist:
         """Clean playlist data."""
         try:
@@ -62,13 +78,18 @@ class PlaylistSyncManager(models.Manager["Playlist"]):
             raise ValueError("Failed to validate playlist") from e
 
     def sync_playlist(self, cleaned: dict, user_pk: int) -> "Playlist":
-        """Sync a single playlist."""
+        """Sync a single playlist's metadata.
+
+        The playlist is marked unsynced until its items are written at the
+        new version (``complete_playlist_sync``).
+        """
         data = validation.SyncPlaylist(**cleaned)
         playlist, _ = self.update_or_create(
             spotify_id=data.spotify_id,
             defaults={
                 **data.model_dump(),
                 "user_id": user_pk,
+                "is_synced": False,
             },
         )
 
@@ -81,6 +102,25 @@ class PlaylistSyncManager(models.Manager["Playlist"]):
 
         return playlist
 
+    def stale(self, snapshots: dict[str, str | None]) -> set[str]:
+        """Find the playlists that need to be synced.
+
+        Takes the current snapshot ID of playlists (by Spotify ID), e.g. from
+        the playlists listing, and returns the Spotify IDs of those that are
+        not synced at that snapshot.
+        """
+        current = set(
+            self.filter(spotify_id__in=snapshots.keys(), is_synced=True).values_list(
+                "spotify_id", "version"
+            )
+        )
+
+        return {
+            spotify_id
+            for spotify_id, snapshot_id in snapshots.items()
+            if not snapshot_id or (spotify_id, snapshot_id) not in current
+        }
+
     def complete_playlist_sync(self, playlist: "Playlist") -> uuid.UUID:
         """Complete playlist sync."""
         playlist.is_synced = True
@@ -151,21 +191,33 @@ class PlaylistSyncManager(models.Manager["Playlist"]):
 
         Sets is_synced to True and adds library to playlists.
         """
-        updated = []
+        pks = [playlist.pk for playlist in playlists]
+
+        self.filter(pk__in=pks).update(is_synced=True)
+        MembershipWriter(self.model.libraries.through, "library", "playlist").add(
+            library_pk, pks
+        )
 
         for playlist in playlists:
             playlist.is_synced = True
-            playlist.libraries.add(library_pk)
-            playlist.save()
 
-            logger.debug(f"Added playlist {playlist.pk} to library {library_pk}.")
+        logger.debug(f"Added {len(pks)} playlists to library {library_pk}.")
+
+        return [(playlist.pk, playlist.spotify_id) for playlist in playlists]
 
-            updated.append((playlist.pk, playlist.spotify_id))
+    def recount(self, pks: typing.Iterable[uuid.UUID] | models.QuerySet) -> int:
+        """Recount the tracks (and analyzed tracks) of playlists.
+
+        A track that was added more than once is counted for each item.
+        """
+        pks = pks if isinstance(pks, models.QuerySet) else list(pks)
 
-        return updated
+        return self.filter(pk__in=pks).update(
+            **track_counts(PlaylistItem.objects.all(), "playlist", "track")
+        )
 
 
-class Playlist(SpotifyModel, TimestampedModel, CanBeAnalyzedMixin):
+class Playlist(SpotifyModel, TimestampedModel, CanBeAnalyzedMixin, HasTrackCountsMixin):
     """Spotify playlist model.
 
     Required fields for creation:
@@ -212,3 +264,201 @@ class Playlist(SpotifyModel, TimestampedModel, CanBeAnalyzedMixin):
 
         ordering = ["-is_synced", "-is_analyzed", "-updated_at", "-created_at"]
         unique_together = ["spotify_id", "user"]
+
+
+@dataclasses.dataclass
+class PlaylistEntry:
+    """A track's entry in the sequence of a playlist's items."""
+
+    track_pk: uuid.UUID
+    added_at: datetime.datetime | None = None
+    added_by: str = ""
+
+    @property
+    def key(self) -> tuple[uuid.UUID, datetime.datetime | None]:
+        """Identity of the entry, a track can be added more than once."""
+        return (self.track_pk, self.added_at)
+
+    @property
+    def as_dict(self) -> dict:
+        """Return the dataclass as a dictionary."""
+        return dataclasses.asdict(self)
+
+
+@dataclasses.dataclass
+class PlaylistItemChanges:
+    """Rows written by a playlist resync."""
+
+    inserted: int = 0
+    moved: int = 0
+    deleted: int = 0
+
+    @property
+    def as_dict(self) -> dict:
+        """Return the dataclass as a dictionary."""
+        return dataclasses.asdict(self)
+
+
+class PlaylistItemSyncManager(models.Manager["PlaylistItem"]):
+    """Sync the sequence of a playlist's items."""
+
+    def entries(
+        self, items: typing.Iterable[dict], track_pks: dict[str, uuid.UUID]
+    ) -> list[PlaylistEntry]:
+        """Entries of playlist items from the API, in order.
+
+        Items of tracks that aren't in ``track_pks`` (episodes, local files)
+        are skipped.
+        """
+        entries = []
+
+        for item in items:
+            track_pk = track_pks.get((item.get("track") or {}).get("id") or "")
+
+            if track_pk is None:
+                continue
+
+            added_at = item.get("added_at")
+
+            entries.append(
+                PlaylistEntry(
+                    track_pk=track_pk,
+                    added_at=datetime.datetime.fromisoformat(added_at)
+                    if added_at
+                    else None,
+                    added_by=(item.get("added_by") or {}).get("id") or "",
+                )
+            )
+
+        return entries
+
+    def resync(
+        self, playlist_pk: uuid.UUID, pages: typing.Iterable[list[PlaylistEntry]]
+    ) -> PlaylistItemChanges:
+        """Make the pages of entries the playlist's items.
+
+        The entries are matched to the stored items, so only new entries are
+        inserted, the items that changed position are moved & the items
+        that weren't matched are deleted. Each page is written before the
+        next one is read, the playlist's track counts are recounted once
+        the unmatched items are deleted.
+        """
+        changes = PlaylistItemChanges()
+        stored: dict[tuple, collections.deque[PlaylistItem]] = collections.defaultdict(
+            collections.deque
+        )
+
+        for item in (
+            self.filter(playlist_id=playlist_pk)
+            .order_by("position")
+            .only("pk", "track_id", "added_at", "position")
+        ):
+            stored[(item.track_id, item.added_at)].append(item)
+
+        position = 0
+
+        for page in pages:
+            inserted, moved = [], []
+
+            for entry in page:
+                if matches := stored.get(entry.key):
+                    item = matches.popleft()
+
+                    if item.position != position:
+                        item.position = position
+                        moved.append(item)
+                else:
+                    inserted.append(
+                        self.model(
+                            playlist_id=playlist_pk,
+                            track_id=entry.track_pk,
+                            position=position,
+                            added_at=entry.added_at,
+                            added_by=entry.added_by,
+                        )
+                    )
+
+                position += 1
+
+            with transaction.atomic():
+                self.bulk_create(inserted)
+                self.bulk_update(moved, ["position"], batch_size=500)
+
+            changes.inserted += len(inserted)
+            changes.moved += len(moved)
+
+        if removed := [item.pk for items in stored.values() for item in items]:
+            changes.deleted, _ = self.filter(pk__in=removed).delete()
+
+        Playlist.sync.recount([playlist_pk])
+
+        logger.debug(f"Resynced playlist {playlist_pk} items: {changes.as_dict}")
+
+        return changes
+
+    def append(self, playlist_pk: uuid.UUID, entries: list[PlaylistEntry]) -> int:
+        """Add the entries of tracks that aren't in the playlist to its end."""
+        current = self.filter(playlist_id=playlist_pk)
+        linked = set(current.values_list("track_id", flat=True))
+        last = current.aggregate(models.Max("position"))["position__max"]
+        position = -1 if last is None else last
+
+        items = []
+
+        for entry in entries:
+            if entry.track_pk in linked:
+                continue
+
+            linked.add(entry.track_pk)
+            position += 1
+
+            items.append(
+                self.model(
+                    playlist_id=playlist_pk,
+                    track_id=entry.track_pk,
+                    position=position,
+                    added_at=entry.added_at,
+                    added_by=entry.added_by,
+                )
+            )
+
+        with transaction.atomic():
+            added = self.bulk_create(items)
+
+            Playlist.sync.recount([playlist_pk])
+
+        return len(added)
+
+
+class PlaylistItem(models.Model):
+    """A track in a playlist, at a position.
+
+    A track can be added to a playlist more than once, each time is an item.
+    """
+
+    playlist = models.ForeignKey(
+        "api.Playlist", on_delete=models.CASCADE, related_name="items"
+    )
+    track = models.ForeignKey(
+        "api.Track", on_delete=models.CASCADE, related_name="playlist_items"
+    )
+    position = models.PositiveIntegerField(default=0)
+    added_at = models.DateTimeField(null=True, blank=True)
+    added_by = models.CharField(max_length=255, blank=True, default="")  # user id
+
+    objects: models.Manager["PlaylistItem"] = models.Manager()
+    sync = PlaylistItemSyncManager()
+
+    class Meta(TypedModelMeta):
+        """Playlist item model metadata."""
+
+        ordering = ["playlist", "position"]
+        indexes = [
+            models.Index(
+                fields=["playlist", "position"], name="api_playlistitem_position_idx"
+            )
+        ]
+
+    def __str__(self) -> str:
+        """String representation."""
+        return f"{self.playlist_id} #{self.position}: {self.track_id}"
@@ -1,16 +1,23 @@
+import datetime
+import io
 import json
 import unittest
 
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from faker import Faker
 
 from api.libs.helpers import TestHelpers
-from api.models.analysis import Analysis
+from api.models.analysis import Analysis, TrackFeatures
 from api.models.music import Album, Artist
-from api.models.playlist import Playlist
+from api.models.playlist import Playlist, PlaylistEntry, PlaylistItem
 from api.models.track import Track
 from api.serializers.validation.playlist import SyncPlaylist
 from api.serializers.validation.track import SyncTrackData
+from server import settings
 
 faker = Faker()
 
@@ -22,11 +29,23 @@ class UserManagerTestCase(TestCase):
         pass
 
 
-@unittest.skip("Not implemented")
 class UserModelTestCase(TestCase):
-    @unittest.skip("Not implemented")
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+
     def test_token_expired_property(self):
-        pass
+        self.assertFalse(self.user.token_expired)
+
+        margin = datetime.timedelta(seconds=settings.SPOTIFY_TOKEN_REFRESH_MARGIN)
+
+        self.user.token_expiry = timezone.now() + margin / 2
+        self.assertTrue(self.user.token_expired)
+
+        self.user.token_expiry = timezone.now() - datetime.timedelta(minutes=1)
+        self.assertTrue(self.user.token_expired)
+
+        self.user.token_expiry = timezone.now() + margin * 2
+        self.assertFalse(self.user.token_expired)
 
     @unittest.skip("Not implemented")
     def test_update_token_set_method(self):
@@ -136,6 +155,32 @@ class TrackSyncManagerTestCase(TestCase):
         self.assertEqual(Album.objects.count(), initial_album_count + tracks_added)
         self.assertEqual(Artist.objects.count(), initial_artist_count + artists_added)
 
+    def test_sync_uses_constant_number_of_queries(self):
+        data = Track.sync.pre_sync(self.data.get("items"))
+
+        with self.assertNumQueries(10):
+            Track.sync.do(data[:2])
+
+        with self.assertNumQueries(10):
+            result = Track.sync.do(data)
+
+        self.assertEqual(len(result), len({d.track.spotify_id for d in data}))
+
+    def test_sync_updates_existing_records(self):
+        data = Track.sync.pre_sync(self.fake_iterator())
+
+        Track.sync.do(data)
+
+        data[0].track.name = "Renamed"
+        data[0].album.name = "Renamed Album"
+
+        result = Track.sync.do(data)
+        track = Track.objects.select_related("album").get(pk=result[0][0])
+
+        self.assertEqual(track.name, "Renamed")
+        self.assertEqual(track.album.name, "Renamed Album")
+        self.assertGreater(track.album.artists.count(), 0)
+
     def test_complete(self):
         playlist = Playlist.objects.create(
             name=faker.name(), spotify_id=faker.uuid4(), owner_id=faker.uuid4()
@@ -222,3 +267,360 @@ class AnalysisManagerTestCase(TestCase):
         result = Analysis.sync.analyze(self.playlist.pk, self.user.pk, data)
 
         self.assertIsNotNone(result)
+
+
+def audio_features(spotify_id: str) -> dict:
+    return {
+        "id": spotify_id,
+        "danceability": faker.pyfloat(min_value=0, max_value=1),
+        "energy": faker.pyfloat(min_value=0, max_value=1),
+        "key": faker.random_int(0, 11),
+        "loudness": faker.pyfloat(min_value=-60, max_value=0),
+        "mode": faker.random_int(0, 1),
+        "speechiness": faker.pyfloat(min_value=0, max_value=1),
+        "acousticness": faker.pyfloat(min_value=0, max_value=1),
+        "instrumentalness": faker.pyfloat(min_value=0, max_value=1),
+        "liveness": faker.pyfloat(min_value=0, max_value=1),
+        "valence": faker.pyfloat(min_value=0, max_value=1),
+        "tempo": faker.pyfloat(min_value=60, max_value=200),
+        "duration_ms": faker.random_int(60_000, 600_000),
+        "time_signature": faker.random_int(3, 7),
+    }
+
+
+class BatchAnalysisTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.tracks = [
+            Track.objects.create(
+                name=faker.name(), spotify_id=faker.uuid4(), duration=1000
+            )
+            for _ in range(6)
+        ]
+        self.playlists = []
+
+        for tracks in (self.tracks[:4], self.tracks[2:]):
+            playlist = Playlist.objects.create(
+                name=faker.name(),
+                spotify_id=faker.uuid4(),
+                owner_id=faker.uuid4(),
+                version=faker.uuid4(),
+                is_synced=True,
+            )
+            playlist.tracks.add(*tracks)
+
+            self.playlists.append(playlist)
+
+    def test_pre_batch_analysis_unions_track_ids(self):
+        result = Analysis.sync.pre_batch_analysis(
+            [p.pk for p in self.playlists], self.user.pk
+        )
+        track_ids = {t for ids in result.values() for t in ids}
+
+        self.assertEqual(len(result), 2)
+        self.assertEqual(track_ids, {t.spotify_id for t in self.tracks})
+
+    def test_analyze_and_compute_batch(self):
+        playlist_tracks = Analysis.sync.pre_batch_analysis(
+            [p.pk for p in self.playlists], self.user.pk
+        )
+        items = [audio_features(t.spotify_id) for t in self.tracks]
+
+        analyses = Analysis.sync.analyze_batch(playlist_tracks, self.user.pk, items)
+        computations = Analysis.sync.compute_batch(list(analyses.values()))
+
+        self.assertEqual(TrackFeatures.objects.count(), len(self.tracks))
+        self.assertEqual(len(computations), 2)
+
+        for playlist in self.playlists:
+            analysis = Analysis.objects.get(pk=analyses[playlist.pk])
+
+            self.assertEqual(analysis.tracks.count(), 4)
+            self.assertEqual(
+                computations[analysis.pk], Analysis.sync.compute(analysis.pk)
+            )
+
+    def test_bulk_upsert_updates_stored_features(self):
+        track = self.tracks[0]
+        items = [audio_features(track.spotify_id)]
+
+        TrackFeatures.sync.bulk_upsert(items)
+
+        items[0]["tempo"] = 99.0
+
+        TrackFeatures.sync.bulk_upsert([*items, audio_features(faker.uuid4())])
+
+        self.assertEqual(TrackFeatures.objects.count(), 1)
+        self.assertEqual(TrackFeatures.objects.get(track=track).tempo, 99.0)
+
+    def test_analyze_upserts_features(self):
+        playlist = self.playlists[0]
+        items = [audio_features(t.spotify_id) for t in self.tracks]
+
+        Analysis.sync.analyze(playlist.pk, self.user.pk, items)
+
+        self.assertEqual(TrackFeatures.objects.count(), 4)
+
+        playlist.refresh_from_db()
+        playlist.version = faker.uuid4()
+        playlist.save()
+
+        for item in items:
+            item["tempo"] = 99.0
+
+        analysis_pk = Analysis.sync.analyze(playlist.pk, self.user.pk, items)
+
+        self.assertEqual(TrackFeatures.objects.count(), 4)
+        self.assertEqual(TrackFeatures.objects.filter(tempo=99.0).count(), 4)
+        self.assertEqual(Analysis.objects.get(pk=analysis_pk).tracks.count(), 4)
+
+    def test_analyze_constant_queries(self):
+        counts = []
+
+        for size in (5, 50):
+            tracks = [
+                Track.objects.create(
+                    name=faker.name(), spotify_id=faker.uuid4(), duration=1000
+                )
+                for _ in range(size)
+            ]
+            playlist = Playlist.objects.create(
+                name=faker.name(),
+                spotify_id=faker.uuid4(),
+                owner_id=faker.uuid4(),
+                version=faker.uuid4(),
+                is_synced=True,
+            )
+            playlist.tracks.add(*tracks)
+            items = [audio_features(t.spotify_id) for t in tracks]
+
+            with CaptureQueriesContext(connection) as queries:
+                Analysis.sync.analyze(playlist.pk, self.user.pk, items)
+
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+
+
+class PlaylistStaleTestCase(TestCase):
+    def setUp(self):
+        self.synced = Playlist.objects.create(
+            name=faker.name(),
+            spotify_id=faker.uuid4(),
+            owner_id=faker.uuid4(),
+            version=faker.uuid4(),
+            is_synced=True,
+        )
+        self.unsynced = Playlist.objects.create(
+            name=faker.name(),
+            spotify_id=faker.uuid4(),
+            owner_id=faker.uuid4(),
+            version=faker.uuid4(),
+        )
+
+    def test_stale(self):
+        new, changed = faker.uuid4(), faker.uuid4()
+
+        with self.assertNumQueries(1):
+            stale = Playlist.sync.stale(
+                {
+                    self.synced.spotify_id: self.synced.version,
+                    self.unsynced.spotify_id: self.unsynced.version,
+                    new: faker.uuid4(),
+                }
+            )
+
+        self.assertEqual(stale, {self.unsynced.spotify_id, new})
+
+        stale = Playlist.sync.stale({self.synced.spotify_id: changed})
+
+        self.assertEqual(stale, {self.synced.spotify_id})
+
+
+class PlaylistItemSyncTestCase(TestCase):
+    def setUp(self):
+        self.playlist = Playlist.objects.create(
+            name=faker.name(), spotify_id=faker.uuid4(), owner_id=faker.uuid4()
+        )
+        self.tracks = Track.objects.bulk_create(
+            Track(name=faker.name(), spotify_id=faker.uuid4(), duration=1000)
+            for _ in range(1000)
+        )
+        self.data = [(track.pk, track.spotify_id) for track in self.tracks]
+        self.added_at = timezone.now().replace(microsecond=0)
+        self.entries = [
+            PlaylistEntry(
+                track_pk=track.pk,
+                added_at=self.added_at - datetime.timedelta(minutes=i),
+            )
+            for i, track in enumerate(self.tracks)
+        ]
+
+    def items(self) -> list[tuple]:
+        return list(
+            PlaylistItem.objects.filter(playlist=self.playlist)
+            .order_by("position")
+            .values_list("track_id", "position")
+        )
+
+    def test_linking_a_playlist_uses_constant_queries(self):
+        # select the stored items, insert the new ones (in a savepoint) and
+        # recount the playlist's tracks
+        with self.assertNumQueries(5):
+            Track.sync.complete_sync(self.playlist.pk, self.data, replace=True)
+
+        self.assertEqual(self.playlist.tracks.count(), 1000)
+        self.assertEqual(
+            self.items(), [(track.pk, i) for i, track in enumerate(self.tracks)]
+        )
+
+    def test_appending_skips_linked_tracks(self):
+        Track.sync.complete_sync(self.playlist.pk, self.data[:10])
+        Track.sync.complete_sync(self.playlist.pk, self.data[5:15])
+
+        self.assertEqual(
+            self.items(), [(track.pk, i) for i, track in enumerate(self.tracks[:15])]
+        )
+
+    def test_resync_only_writes_changes(self):
+        PlaylistItem.sync.resync(self.playlist.pk, [self.entries])
+
+        later = self.added_at + datetime.timedelta(minutes=1)
+        added = [
+            PlaylistEntry(track_pk=track.pk, added_at=later)
+            for track in self.tracks[:2]
+        ]
+
+        # the added tracks are duplicates of tracks in the playlist
+        changes = PlaylistItem.sync.resync(
+            self.playlist.pk, [self.entries[:500], self.entries[500:] + added]
+        )
+
+        self.assertEqual(changes.as_dict, {"inserted": 2, "moved": 0, "deleted": 0})
+        self.assertEqual(
+            PlaylistItem.objects.filter(playlist=self.playlist).count(), 1002
+        )
+
+    def test_resync_moves_and_deletes(self):
+        PlaylistItem.sync.resync(self.playlist.pk, [self.entries])
+
+        entries = [self.entries[1], self.entries[0], *self.entries[2:990]]
+        changes = PlaylistItem.sync.resync(self.playlist.pk, [entries])
+
+        self.assertEqual(changes.as_dict, {"inserted": 0, "moved": 2, "deleted": 10})
+        self.assertEqual(
+            self.items(), [(entry.track_pk, i) for i, entry in enumerate(entries)]
+        )
+
+    def test_entries(self):
+        items = [
+            {
+                "added_at": "2024-10-04T13:35:25Z",
+                "added_by": {"id": "owner"},
+                "track": {"id": track.spotify_id},
+            }
+            for track in self.tracks[:3]
+        ]
+        items.insert(1, {"added_at": None, "track": {"id": "episode"}})
+
+        entries = PlaylistItem.sync.entries(
+            items, {spotify_id: pk for pk, spotify_id in self.data}
+        )
+
+        self.assertEqual([e.track_pk for e in entries], [t.pk for t in self.tracks[:3]])
+        self.assertEqual(entries[0].added_by, "owner")
+        self.assertEqual(
+            entries[0].added_at,
+            datetime.datetime(2024, 10, 4, 13, 35, 25, tzinfo=datetime.UTC),
+        )
+
+
+class TrackCountsTestCase(TestCase):
+    def setUp(self):
+        self.playlist = Playlist.objects.create(
+            name=faker.name(), spotify_id=faker.uuid4(), owner_id=faker.uuid4()
+        )
+        self.album = Album.objects.create(
+            name=faker.name(), spotify_id=faker.uuid4(), release_year=2020
+        )
+        self.tracks = Track.objects.bulk_create(
+            Track(
+                name=faker.name(),
+                spotify_id=faker.uuid4(),
+                duration=1000,
+                album=self.album,
+            )
+            for _ in range(10)
+        )
+        self.entries = [PlaylistEntry(track_pk=track.pk) for track in self.tracks]
+
+    def counts(self, model: Playlist | Album) -> tuple[int, int]:
+        model.refresh_from_db()
+
+        return model.num_tracks, model.num_analyzed_tracks
+
+    def analyze(self, tracks: list[Track]) -> int:
+        return TrackFeatures.sync.bulk_upsert(
+            {
+                "id": track.spotify_id,
+                "danceability": 0.5,
+                "energy": 0.5,
+                "key": 1,
+                "loudness": -5.0,
+                "mode": 1,
+                "speechiness": 0.5,
+                "acousticness": 0.5,
+                "instrumentalness": 0.5,
+                "liveness": 0.5,
+                "valence": 0.5,
+                "tempo": 120.0,
+                "duration_ms": 1000,
+                "time_signature": 4,
+            }
+            for track in tracks
+        )
+
+    def test_resync_counts_items(self):
+        PlaylistItem.sync.resync(self.playlist.pk, [self.entries])
+
+        self.assertEqual(self.counts(self.playlist), (10, 0))
+
+        # a track added twice is counted twice
+        PlaylistItem.sync.resync(self.playlist.pk, [self.entries[:5], self.entries[:1]])
+
+        self.assertEqual(self.counts(self.playlist), (6, 0))
+
+    def test_append_counts_items(self):
+        PlaylistItem.sync.append(self.playlist.pk, self.entries[:4])
+        PlaylistItem.sync.append(self.playlist.pk, self.entries[2:8])
+
+        self.assertEqual(self.counts(self.playlist), (8, 0))
+
+    def test_features_count_analyzed_tracks(self):
+        PlaylistItem.sync.resync(self.playlist.pk, [self.entries])
+        Album.sync.recount([self.album.pk])
+
+        self.assertEqual(self.analyze(self.tracks[:3]), 3)
+        self.assertEqual(self.counts(self.playlist), (10, 3))
+        self.assertEqual(self.counts(self.album), (10, 3))
+
+    def test_save_keeps_counts(self):
+        playlist = Playlist.objects.get(pk=self.playlist.pk)
+
+        PlaylistItem.sync.resync(self.playlist.pk, [self.entries])
+
+        playlist.is_analyzed = True
+        playlist.save()
+
+        self.assertEqual(self.counts(playlist), (10, 0))
+        self.assertTrue(playlist.is_analyzed)
+
+    def test_reconcile_track_counts(self):
+        self.playlist.tracks.add(*self.tracks[:4])
+
+        self.assertEqual(self.counts(self.album), (0, 0))
+
+        call_command("reconcile_track_counts", stdout=io.StringIO())
+
+        self.assertEqual(self.counts(self.playlist), (4, 0))
+        self.assertEqual(self.counts(self.album), (10, 0))
@@ -3,20 +3,43 @@
 import typing
 import uuid
 
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from loguru import logger
 
-from api.blocks import AlbumTrackSyncBlock
+from api.blocks import AlbumSyncBlock, AlbumTrackSyncBlock
+from api.libs.fields import FieldProjection
 from api.models.album import Album
 from api.models.mixins import CanBeAnalyzedMixin
 from api.models.music import Artist, SpotifyModel, TimestampedModel
+from api.models.playlist import PlaylistEntry, PlaylistItem
 from api.serializers import validation
 
 
 class TrackSyncManager(models.Manager["Track"]):
     """Sync tracks, albums, and artists."""
 
+    # Fields of the playlist/saved track items read by pre_sync & entries
+    api_item_fields = FieldProjection(
+        "added_at",
+        added_by=("id",),
+        track=FieldProjection(
+            "id",
+            "name",
+            "type",
+            "duration_ms",
+            album=FieldProjection(
+                "id",
+                "name",
+                "album_type",
+                "release_date",
+                images=("url",),
+                artists=("id", "name"),
+            ),
+            artists=("id", "name"),
+        ),
+    )
+
     def sync_album_track(self, album: Album, cleaned: AlbumTrackSyncBlock) -> "Track":
         """Sync album track."""
         track, _ = self.model.objects.update_or_create(
@@ -106,59 +129,224 @@ class TrackSyncManager(models.Manager["Track"]):
             - Track
                 - Album
                     - Artist
+
+        A whole page of tracks is written with a constant number of queries:
+        artists, albums & tracks are deduplicated and upserted in bulk,
+        album artists are linked with a single insert and the track counts
+        of the albums are recounted.
         """
-        data = []
-        for cleaned_data in items:
-            artists = cleaned_data.artists
-            album = cleaned_data.album
-            track = cleaned_data.track
+        artists = {a.spotify_id: a for item in items for a in item.artists}
+        albums = {item.album.spotify_id: item.album for item in items}
+        tracks = {item.track.spotify_id: item.track for item in items}
 
+        with transaction.atomic():
             Artist.objects.bulk_create(
-                (
-                    Artist(
-                        name=artist.name,
-                        spotify_id=artist.spotify_id,
+                [
+                    Artist(name=artist.name, spotify_id=artist.spotify_id)
+                    for artist in artists.values()
+                ],
+                update_conflicts=True,
+                unique_fields=["spotify_id"],
+                update_fields=["name", "updated_at"],
+            )
+            Album.objects.bulk_create(
+                [
+                    Album(
+                        spotify_id=album.spotify_id,
+                        name=album.name,
+                        release_year=album.release_year,
+                        image_url=album.image_url,
+                        album_type=album.album_type,
+                    )
+                    for album in albums.values()
+                ],
+                update_conflicts=True,
+                unique_fields=["spotify_id"],
+                update_fields=[
+                    "name",
+                    "release_year",
+                    "image_url",
+                    "album_type",
+                    "updated_at",
+                ],
+            )
+
+            artist_pks = self._pks(
+                Artist, {i for album in albums.values() for i in album.artist_ids}
+            )
+            album_pks = self._pks(Album, albums.keys())
+
+            Artist.albums.through.objects.bulk_create(
+                [
+                    Artist.albums.through(
+                        artist_id=artist_pks[artist_id],
+                        album_id=album_pks[album.spotify_id],
                     )
-                    for artist in artists
-                ),
+                    for album in albums.values()
+                    for artist_id in album.artist_ids
+                    if artist_id in artist_pks
+                ],
                 ignore_conflicts=True,
             )
 
-            album_artists = Artist.objects.filter(spotify_id__in=album.artist_ids)
+            self.bulk_create(
+                [
+                    self.model(
+                        spotify_id=track.spotify_id,
+                        name=track.name,
+                        duration=track.duration,
+                        album_id=album_pks.get(track.album_id),
+                    )
+                    for track in tracks.values()
+                ],
+                update_conflicts=True,
+                unique_fields=["spotify_id"],
+                update_fields=["name", "duration", "album", "updated_at"],
+            )
+
+            track_pks = self._pks(self.model, tracks.keys())
+
+            Album.sync.recount(album_pks.values())
+
+        return [(track_pks[spotify_id], spotify_id) for spotify_id in tracks]
+
+    def sync_new(self, items: list[dict]) -> dict[str, uuid.UUID]:
+        """Sync the tracks of a page of items that aren't stored yet.
+
+        The stored tracks of the page are looked up with a single query and
+        left as they are, so only new tracks (& their albums and artists) are
+        written. Maps the Spotify IDs of the page's tracks to primary keys.
+        """
+        spotify_ids = [(item.get("track") or {}).get("id") or "" for item in items]
+        track_pks = self._pks(self.model, set(spotify_ids))
+        new = [
+            item
+            for item, spotify_id in zip(items, spotify_ids, strict=True)
+            if spotify_id not in track_pks
+        ]
+
+        if cleaned := self.pre_sync(new):
+            track_pks.update(
+                {spotify_id: track_pk for track_pk, spotify_id in self.do(cleaned)}
+            )
+
+        return track_pks
+
+    def do_albums(self, items: list[AlbumSyncBlock]) -> list[tuple[uuid.UUID, str]]:
+        """Sync full albums, with their artists and tracks.
 
-            album_record, _ = Album.objects.update_or_create(
-                spotify_id=album.spotify_id,
-                defaults={
-                    "name": album.name,
-                    "release_year": album.release_year,
-                    "image_url": album.image_url,
-                    "album_type": album.album_type,
-                },
+        Like ``do``, a page of albums is written with a constant number of
+        queries. Returns the primary & Spotify IDs of the albums.
+        """
+        albums = {album.spotify_id: album for album in items}
+        artists = {a.spotify_id: a for album in items for a in album.artists}
+        tracks = {
+            track.spotify_id: (track, album.spotify_id)
+            for album in items
+            for track in album.tracks
+        }
+
+        with transaction.atomic():
+            Artist.objects.bulk_create(
+                [
+                    Artist(name=artist.name, spotify_id=artist.spotify_id)
+                    for artist in artists.values()
+                ],
+                update_conflicts=True,
+                unique_fields=["spotify_id"],
+                update_fields=["name", "updated_at"],
             )
+            Album.objects.bulk_create(
+                [
+                    Album(
+                        spotify_id=album.spotify_id,
+                        name=album.name,
+                        album_type=album.album_type,
+                        image_url=album.image_url,
+                        label=album.label,
+                        release_year=album.release_year,
+                        is_synced=False,
+                        copyright=album.copyright,
+                    )
+                    for album in albums.values()
+                ],
+                update_conflicts=True,
+                unique_fields=["spotify_id"],
+                update_fields=[
+                    "name",
+                    "album_type",
+                    "image_url",
+                    "label",
+                    "release_year",
+                    "is_synced",
+                    "copyright",
+                    "updated_at",
+                ],
+            )
+
+            artist_pks = self._pks(Artist, artists.keys())
+            album_pks = self._pks(Album, albums.keys())
 
-            for artist in album_artists:
-                artist.albums.add(album_record)
+            Artist.albums.through.objects.bulk_create(
+                [
+                    Artist.albums.through(
+                        artist_id=artist_pks[artist.spotify_id],
+                        album_id=album_pks[album.spotify_id],
+                    )
+                    for album in albums.values()
+                    for artist in album.artists
+                ],
+                ignore_conflicts=True,
+            )
 
-            t, _ = self.model.objects.update_or_create(
-                spotify_id=track.spotify_id,
-                defaults={
-                    "name": track.name,
-                    "duration": track.duration,
-                    "album": album_record,
-                },
+            self.bulk_create(
+                [
+                    self.model(
+                        spotify_id=track.spotify_id,
+                        name=track.name,
+                        duration=track.duration,
+                        album_id=album_pks[album_id],
+                    )
+                    for track, album_id in tracks.values()
+                ],
+                update_conflicts=True,
+                unique_fields=["spotify_id"],
+                update_fields=["name", "duration", "album", "updated_at"],
             )
 
-            data.append((t.pk, t.spotify_id))
+            Album.sync.recount(album_pks.values())
+
+        return [(album_pks[spotify_id], spotify_id) for spotify_id in albums]
 
-        return data
+    def _pks(
+        self, model: type[models.Model], spotify_ids: typing.Iterable[str]
+    ) -> dict[str, uuid.UUID]:
+        """Map Spotify IDs to primary keys."""
+        return dict(
+            model._default_manager.filter(spotify_id__in=list(spotify_ids)).values_list(
+                "spotify_id", "pk"
+            )
+        )
 
     def complete_sync(
-        self, playlist_pk: uuid.UUID, data: list[tuple[uuid.UUID, str]]
+        self,
+        playlist_pk: uuid.UUID,
+        data: list[tuple[uuid.UUID, str]],
+        replace: bool = False,
     ) -> uuid.UUID:
-        """Complete sync."""
-        for track_id, _ in data:
-            track = self.model.objects.get(pk=track_id)
-            track.playlists.add(playlist_pk)  # type: ignore
+        """Complete sync by linking the synced tracks to the playlist.
+
+        ``data`` holds synced tracks in playlist order. With ``replace``, it
+        holds all of the playlist's tracks and the playlist's items are
+        resynced to it, otherwise the tracks that aren't in the playlist are
+        appended.
+        """
+        entries = [PlaylistEntry(track_pk=track_pk) for track_pk, _ in data]
+
+        if replace:
+            PlaylistItem.sync.resync(playlist_pk, [entries])
+        else:
+            PlaylistItem.sync.append(playlist_pk, entries)
 
         return playlist_pk
 
@@ -175,7 +363,9 @@ class Track(SpotifyModel, TimestampedModel, CanBeAnalyzedMixin):
     album = models.ForeignKey(
         "api.Album", related_name="tracks", on_delete=models.PROTECT, null=True
     )
-    playlists = models.ManyToManyField("api.Playlist", related_name="tracks")
+    playlists = models.ManyToManyField(
+        "api.Playlist", related_name="tracks", through="api.PlaylistItem"
+    )
 
     objects: models.Manager["Track"] = models.Manager()
     sync: TrackSyncManager = TrackSyncManager()
@@ -1,7 +1,10 @@
 """Library serializers."""
 
+import typing
+
 from pydantic import BaseModel, Field
 
+from api.libs.fields import FieldProjection
 from api.models import Playlist as PlaylistModel
 
 
@@ -48,6 +51,30 @@ class ExpandedPlaylist(BaseModel):
 
     tracks: list[PlaylistTrack] = Field(default_factory=list)
 
+    # Fields of the playlist & its items read by get
+    api_fields: typing.ClassVar[FieldProjection] = FieldProjection(
+        "id",
+        "collaborative",
+        "description",
+        "name",
+        "public",
+        "snapshot_id",
+        external_urls=("spotify",),
+        images=("url",),
+        owner=("id", "display_name"),
+        followers=("total",),
+    )
+    api_item_fields: typing.ClassVar[FieldProjection] = FieldProjection(
+        track=FieldProjection(
+            "id",
+            "name",
+            "duration_ms",
+            album=("id", "name", "album_type"),
+            artists=("id", "name"),
+            external_ids=("isrc",),
+        )
+    )
+
     @classmethod
     def get(cls: type["ExpandedPlaylist"], response: dict) -> "ExpandedPlaylist":
         """Create an ExpandedPlaylist object from JSON data."""
@@ -6,10 +6,14 @@ TODO - Move the params class to the params module in the spotify service
 module.
 """
 
+from api.services.spotify.aio import AsyncSpotifyLibraryService
 from api.services.spotify.auth import SpotifyAuthService
+from api.services.spotify.cache import ResponseCache
 from api.services.spotify.data import SpotifyDataService
+from api.services.spotify.features import FEATURES, FeatureStore
 from api.services.spotify.library import SpotifyLibraryService
 from api.services.spotify.playback import SpotifyPlaybackService
+from api.services.spotify.transport import TRANSPORT, SpotifyTransport
 
 DATA = SpotifyDataService()
 AUTH = SpotifyAuthService()
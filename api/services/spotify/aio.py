@@ -0,0 +1,291 @@
+"""Async Spotify library service.
+
+Saved tracks, saved albums, playlists and playlist items are paginated by
+offset, and the first page tells us the ``total``. Instead of walking the
+``next`` links one page at a time, the remaining pages are requested
+concurrently (with a bounded number in flight) and their items are
+yielded in order.
+
+Use the service as an async context manager, so the event loop's client
+is closed once done:
+
+    async with AsyncSpotifyLibraryService() as library:
+        tracks = [t async for t in library.library_tracks(user.pk, all=True)]
+"""
+
+import asyncio
+import collections
+import typing
+import weakref
+from http import HTTPMethod
+
+import httpx
+from loguru import logger
+
+from api.libs.constants import SpotifyAPIEndpoints
+from api.services.spotify.auth import SpotifyAuthService
+from api.services.spotify.base import SpotifyService
+from api.services.spotify.transport import (
+    TRANSPORT,
+    BearerAuth,
+    SpotifyTransport,
+    SpotifyUserAuth,
+    TokenRefresher,
+)
+from core.models import AppUser
+from server import settings
+
+PAGE_SIZE = 50
+
+
+class AsyncSpotifyTransport:
+    """Pooled ``httpx.AsyncClient`` for the Spotify Web API.
+
+    Shares its configuration and rate limiter with a (sync) transport, so
+    sync and async requests draw from the same budget. An async client is
+    bound to the event loop it was created in, so one is kept per loop.
+    """
+
+    def __init__(self, transport: SpotifyTransport | None = None) -> None:
+        """Configure the transport from a sync transport."""
+        self.transport = transport or TRANSPORT
+        self._clients: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, httpx.AsyncClient
+        ] = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The pooled client for the running event loop."""
+        loop = asyncio.get_running_loop()
+
+        if (client := self._clients.get(loop)) is None or client.is_closed:
+            client = self._clients[loop] = httpx.AsyncClient(
+                base_url=self.transport.base_url,
+                limits=self.transport.limits,
+                timeout=self.transport.timeout,
+                http2=self.transport.http2,
+            )
+
+        return client
+
+    async def request(
+        self,
+        method: str,
+        url: str | httpx.URL,
+        *,
+        user: "AppUser | None" = None,
+        access_token: str | None = None,
+        refresh: TokenRefresher | None = None,
+        **kwargs,
+    ) -> httpx.Response:
+        """Send a request, authenticated as a user or with a bare token.
+
+        Throttled requests are retried like the sync transport's. The
+        limiter is used through its async methods, so a shared (Redis)
+        limiter doesn't block the event loop.
+        """
+        if user is not None:
+            kwargs.setdefault("auth", SpotifyUserAuth(user, refresh))
+        elif access_token is not None:
+            kwargs.setdefault("auth", BearerAuth(access_token))
+
+        limiter = self.transport.limiter
+        key = str(user.pk) if user is not None else None
+        attempt = 0
+
+        while True:
+            if (wait := await limiter.areserve(key)) > 0:
+                await asyncio.sleep(wait)
+
+            response = await self.client.request(method, url, **kwargs)
+            retry_after = await limiter.arecord(response, key)
+
+            if retry_after is None:
+                return response
+
+            if (
+                attempt >= self.transport.max_retries
+                or retry_after > self.transport.max_retry_after
+            ):
+                logger.error(f"Giving up on throttled request to {response.url}.")
+
+                return response
+
+            attempt += 1
+
+    async def get(self, url: str | httpx.URL, **kwargs) -> httpx.Response:
+        """Send a GET request."""
+        return await self.request(HTTPMethod.GET, url, **kwargs)
+
+    async def aclose(self) -> None:
+        """Close the client of the running event loop."""
+        loop = asyncio.get_running_loop()
+
+        if (client := self._clients.pop(loop, None)) is not None:
+            await client.aclose()
+
+
+class AsyncSpotifyLibraryService(SpotifyService):
+    """Async variant of the library service with concurrent page fetching.
+
+    Args:
+        auth_service: Used to refresh expired access tokens.
+        transport: Async transport, defaults to one sharing the sync
+            transport's pool settings & rate limiter.
+        concurrency: Maximum number of pages in flight per listing.
+    """
+
+    def __init__(
+        self,
+        auth_service: SpotifyAuthService | None = None,
+        transport: AsyncSpotifyTransport | None = None,
+        concurrency: int | None = None,
+    ) -> None:
+        """Add dependencies to the service."""
+        self.async_transport = transport or AsyncSpotifyTransport()
+
+        super().__init__(self.async_transport.transport, auth_service)
+
+        self.concurrency = concurrency or settings.SPOTIFY_HTTP_CONCURRENCY
+
+    async def __aenter__(self) -> "AsyncSpotifyLibraryService":
+        """Use the service as an async context manager."""
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Close the event loop's client."""
+        await self.async_transport.aclose()
+
+    async def aget_user(self, user_pk: int) -> "AppUser":
+        """Get a user by primary key."""
+        return await AppUser.objects.aget(pk=user_pk)
+
+    async def afetch(
+        self,
+        url: str | httpx.URL,
+        user: "AppUser",
+        params: dict[str, typing.Any] | None = None,
+    ) -> dict:
+        """GET a resource on behalf of a user and return the parsed body."""
+        response = await self.async_transport.get(
+            url, user=user, params=params, refresh=self.auth_service.ensure_fresh_token
+        )
+
+        if response.is_error:
+            self.handle_error(response)
+
+        return response.json()
+
+    async def paginate(
+        self,
+        user: "AppUser",
+        url: str,
+        limit: int = PAGE_SIZE,
+        offset: int = 0,
+        all: bool = False,
+        params: dict[str, typing.Any] | None = None,
+    ) -> typing.AsyncIterator[dict]:
+        """Yield the items of an offset-paginated listing, in order.
+
+        The first page is fetched on its own to learn the listing's total,
+        then the remaining pages are fetched with at most ``concurrency``
+        requests in flight.
+
+        Args:
+            user: User the listing belongs to.
+            url: Listing endpoint.
+            limit: Number of items to fetch, ignored when ``all`` is set.
+            offset: Index of the first item.
+            all: Fetch every item from ``offset`` on.
+            params: Additional query parameters.
+        """
+        page_size = PAGE_SIZE if all else min(limit, PAGE_SIZE)
+        params = params or {}
+
+        first = await self.afetch(
+            url, user, {**params, "limit": page_size, "offset": offset}
+        )
+
+        for item in first.get("items", []):
+            yield item
+
+        total = first.get("total") or 0
+        stop = total if all else min(total, offset + limit)
+        offsets = range(offset + page_size, stop, page_size)
+
+        logger.debug(f"Fetching {len(offsets)} more pages of {url} ({total} items)")
+
+        pending: collections.deque[asyncio.Task[dict]] = collections.deque()
+        remaining = iter(offsets)
+
+        def schedule() -> None:
+            for page_offset in remaining:
+                pending.append(
+                    asyncio.ensure_future(
+                        self.afetch(
+                            url,
+                            user,
+                            {**params, "limit": page_size, "offset": page_offset},
+                        )
+                    )
+                )
+
+                if len(pending) >= self.concurrency:
+                    return
+
+        try:
+            schedule()
+
+            while pending:
+                page = await pending.popleft()
+
+                schedule()
+
+                for item in page.get("items", []):
+                    yield item
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def library_tracks(
+        self, user_pk: int, limit: int = 50, offset: int = 0, all: bool = False
+    ) -> typing.AsyncIterator[dict]:
+        """Get the user's saved tracks."""
+        user = await self.aget_user(user_pk)
+
+        async for item in self.paginate(
+            user, SpotifyAPIEndpoints.SavedTracks, limit, offset, all
+        ):
+            yield item
+
+    async def library_albums(
+        self, user_pk: int, limit: int = 50, offset: int = 0, all: bool = False
+    ) -> typing.AsyncIterator[dict]:
+        """Get the user's saved albums."""
+        user = await self.aget_user(user_pk)
+
+        async for item in self.paginate(
+            user, SpotifyAPIEndpoints.SavedAlbums, limit, offset, all
+        ):
+            yield item
+
+    async def library_playlists(
+        self, user_pk: int, limit: int = 50, offset: int = 0, all: bool = False
+    ) -> typing.AsyncIterator[dict]:
+        """Get the user's playlists."""
+        user = await self.aget_user(user_pk)
+
+        async for item in self.paginate(
+            user, SpotifyAPIEndpoints.SavedPlaylists, limit, offset, all
+        ):
+            yield item
+
+    async def library_playlist_tracks(
+        self, user_pk: int, playlist_id: str
+    ) -> typing.AsyncIterator[dict]:
+        """Get all of a playlist's items."""
+        user = await self.aget_user(user_pk)
+        url = SpotifyAPIEndpoints.PlaylistTracks.format(playlist_id=playlist_id)
+
+        async for item in self.paginate(user, url, all=True):
+            yield item
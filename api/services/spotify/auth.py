@@ -8,6 +8,7 @@ import os
 from http import HTTPMethod
 
 import httpx
+from django.db import transaction
 from loguru import logger
 
 from api.libs.constants import SpotifyAPIEndpoints, SpotifyAPIScopes
@@ -17,6 +18,7 @@ from api.libs.requests import (
     SpotifyRefreshTokenRequest,
 )
 from api.serializers.authentication import CurrentUser
+from api.services.spotify.transport import TRANSPORT, SpotifyTransport
 from core.models import AccessToken, AppUser
 from server import settings
 
@@ -26,13 +28,13 @@ logger.add("logs/spotify_auth.log", rotation="1 MB", retention="1 day", level="D
 class SpotifyAuthService:
     """API actions for authorizing the Spotify API."""
 
-    client: httpx.Client
+    transport: SpotifyTransport
     client_id: str | None
     client_secret: str | None
 
-    def __init__(self) -> None:
+    def __init__(self, transport: SpotifyTransport | None = None) -> None:
         """Spotify API authentication service layer."""
-        self.client = httpx.Client()
+        self.transport = transport or TRANSPORT
         self.client_id = os.getenv("SPOTIFY_CLIENT_ID")
         self.client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
 
@@ -62,22 +64,21 @@ class SpotifyAuthService:
         """
         request_data = SpotifyAccessTokenRequest(code)
 
-        with httpx.Client(
-            base_url=SpotifyAPIEndpoints.Access_Token, auth=self.basic_auth
-        ) as client:
-            response = client.post(url="", data=request_data.as_dict)
-
-            if response.is_error:
-                logger.error(f"Error: {response.text}")
+        response = self.transport.post(
+            SpotifyAPIEndpoints.Access_Token,
+            data=request_data.as_dict,
+            auth=self.basic_auth,
+        )
 
-                raise SpotifyAPIError(response.text)
+        if response.is_error:
+            logger.error(f"Error: {response.text}")
 
-            resp = response.json()
+            raise SpotifyAPIError(response.text)
 
-            if not resp.get("access_token"):
-                raise SpotifyAPIError("Access token not found in response.")
+        resp = response.json()
 
-            client.close()
+        if not resp.get("access_token"):
+            raise SpotifyAPIError("Access token not found in response.")
 
         logger.debug(f"Access token response: {resp}")
 
@@ -86,13 +87,10 @@ class SpotifyAuthService:
     def fetch_user(self, access_token: str, refresh_token: str | None) -> dict:
         """Fetch the user's data from the Spotify API."""
         try:
-            client = httpx.Client(
-                base_url=SpotifyAPIEndpoints.BASE_URL,
-                headers={"Authorization": f"Bearer {access_token}"},
+            response = self.transport.get(
+                SpotifyAPIEndpoints.CurrentUser, access_token=access_token
             )
-            response = client.get(url=SpotifyAPIEndpoints.CurrentUser)
             response.raise_for_status()
-            client.close()
 
             return response.json()
         except httpx.HTTPStatusError as exc:
@@ -101,8 +99,8 @@ class SpotifyAuthService:
                 and "The access token expired" in exc.response.text
                 and refresh_token is not None
             ):
-                res = httpx.post(
-                    url=SpotifyAPIEndpoints.Access_Token,
+                res = self.transport.post(
+                    SpotifyAPIEndpoints.Access_Token,
                     data=SpotifyRefreshTokenRequest(
                         refresh_token,
                         self.client_id,  # type: ignore
@@ -119,11 +117,9 @@ class SpotifyAuthService:
                         "Access token not found in response."
                     ) from exc
 
-                response = client.get(
-                    url=SpotifyAPIEndpoints.CurrentUser,
-                    headers={"Authorization": f"Bearer {access_token}"},
+                response = self.transport.get(
+                    SpotifyAPIEndpoints.CurrentUser, access_token=access_token
                 )
-                client.close()
                 response.raise_for_status()
 
                 return response.json()
@@ -132,20 +128,16 @@ class SpotifyAuthService:
 
     def get_current_user(self, access_token: str) -> CurrentUser:
         """Get the current user's data."""
-        with httpx.Client(
-            base_url=SpotifyAPIEndpoints.BASE_URL,
-            headers={"Authorization": f"Bearer {access_token}"},
-        ) as client:
-            response = client.get(url=SpotifyAPIEndpoints.CurrentUser)
-
-            if response.is_error:
-                logger.error(f"Error: {response.text}")
+        response = self.transport.get(
+            SpotifyAPIEndpoints.CurrentUser, access_token=access_token
+        )
 
-                raise SpotifyAPIError(response.text)
+        if response.is_error:
+            logger.error(f"Error: {response.text}")
 
-            resp = response.json()
+            raise SpotifyAPIError(response.text)
 
-            client.close()
+        resp = response.json()
 
         if not resp.get("display_name") or not resp.get("email") or not resp.get("id"):
             raise SpotifyAPIError("User data not found in response.")
@@ -160,31 +152,14 @@ class SpotifyAuthService:
 
     def get_full_profile(self, user_id: int) -> dict:
         """Fetch's current user's full profile."""
-        try:
-            user = AppUser.objects.get(id=user_id)
-            client = httpx.Client(
-                base_url=SpotifyAPIEndpoints.BASE_URL,
-                headers={"Authorization": f"Bearer {user.access_token}"},
-            )
-
-            response = client.get(url=SpotifyAPIEndpoints.CurrentUser)
-
-            response.raise_for_status()
-        except httpx.HTTPStatusError as exc:
-            if (
-                exc.response.status_code == 401
-                and "The access token expired" in exc.response.text
-            ):
-                user = self.refresh_access_token(user.refresh_token)
-                client.headers["Authorization"] = f"Bearer {user.access_token}"
+        user = AppUser.objects.get(id=user_id)
+        response = self.transport.get(
+            SpotifyAPIEndpoints.CurrentUser,
+            user=user,
+            refresh=self.ensure_fresh_token,
+        )
 
-                response = client.get(url=SpotifyAPIEndpoints.CurrentUser)
-                response.raise_for_status()
-            else:
-                client.close()
-                raise exc
-        finally:
-            client.close()
+        response.raise_for_status()
 
         return response.json()
 
@@ -193,7 +168,7 @@ class SpotifyAuthService:
         if not self.client_id:
             raise MissingAPICredentialsError
 
-        request = httpx.Client().build_request(
+        request = self.transport.client.build_request(
             HTTPMethod.GET,
             url=SpotifyAPIEndpoints.Authorization,
             params={
@@ -218,8 +193,8 @@ class SpotifyAuthService:
 
         request_data = SpotifyRefreshTokenRequest(refresh_token, self.client_id)  # type: ignore
 
-        response = httpx.post(
-            url=SpotifyAPIEndpoints.Access_Token,
+        response = self.transport.post(
+            SpotifyAPIEndpoints.Access_Token,
             data=request_data.as_dict,
             auth=self.basic_auth,
             headers={"Content-Type": "application/x-www-form-urlencoded"},
@@ -251,3 +226,32 @@ class SpotifyAuthService:
         user = user.update_token_set(token_set)
 
         return user
+
+    def ensure_fresh_token(
+        self, user: AppUser, rejected_token: str | None = None
+    ) -> AppUser:
+        """Refresh a user's access token if it is expired (or about to be).
+
+        Refreshes are single-flighted per user: the user's row is locked
+        while refreshing, so concurrent callers (threads or workers) wait
+        for the first refresh and then reuse its token instead of
+        refreshing again.
+
+        Args:
+            user: The user, updated in place with the fresh token set.
+            rejected_token: Token the API rejected as expired, which is
+                refreshed even if token_expiry says otherwise.
+        """
+        with transaction.atomic():
+            locked = AppUser.objects.select_for_update().get(pk=user.pk)
+
+            if locked.token_expired or locked.access_token == rejected_token:
+                logger.debug(f"Refreshing access token for user {user.pk}")
+
+                locked = self.refresh_access_token(locked.refresh_token)
+
+        user.access_token = locked.access_token
+        user.refresh_token = locked.refresh_token
+        user.token_expiry = locked.token_expiry
+
+        return user
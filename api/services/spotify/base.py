@@ -0,0 +1,150 @@
+"""Base class for Spotify API services."""
+
+import typing
+
+import httpx
+from loguru import logger
+
+from api.libs.exceptions import SpotifyAPIError, SpotifyExpiredTokenError
+from api.services.spotify.auth import SpotifyAuthService
+from api.services.spotify.cache import CachedResponse, ResponseCache
+from api.services.spotify.coalesce import SINGLE_FLIGHT, SingleFlight, request_key
+from api.services.spotify.transport import TRANSPORT, SpotifyTransport
+from core.models import AppUser
+
+
+class SpotifyService:
+    """Shared plumbing for the Spotify API services.
+
+    All requests go through the (shared) transport, which owns the
+    connection pool and injects the user's access token. Tokens are
+    refreshed by the auth service before they expire. Identical GETs that
+    are in flight at the same time are coalesced into one request.
+    """
+
+    transport: SpotifyTransport
+    auth_service: SpotifyAuthService
+    cache: ResponseCache | None
+    single_flight: SingleFlight = SINGLE_FLIGHT
+
+    def __init__(
+        self,
+        transport: SpotifyTransport | None = None,
+        auth_service: SpotifyAuthService | None = None,
+        cache: ResponseCache | None = None,
+    ) -> None:
+        """Add the HTTP transport, auth service & (optional) cache to the service."""
+        self.transport = transport or TRANSPORT
+        self.auth_service = auth_service or SpotifyAuthService(self.transport)
+        self.cache = cache
+
+    def get_user(self, user_pk: int) -> "AppUser":
+        """Get a user by primary key."""
+        return AppUser.objects.get(pk=user_pk)
+
+    def handle_error(self, response: httpx.Response) -> None:
+        """Handle Spotify API errors."""
+        logger.error(f"Error: {response.text}")
+        logger.error(f"Status: {response.status_code}")
+
+        try:
+            error = response.json().get("error")
+        except ValueError:
+            error = None
+
+        if not isinstance(error, dict):
+            error = {"status": response.status_code, "message": response.text}
+
+        if (
+            error.get("status") == 401
+            and error.get("message") == "The access token expired"
+        ):
+            raise SpotifyExpiredTokenError("The access token expired")
+
+        raise SpotifyAPIError(response.text)
+
+    def fetch(
+        self,
+        url: str | httpx.URL,
+        user: "AppUser",
+        params: dict[str, typing.Any] | None = None,
+        version: str | None = None,
+    ) -> dict:
+        """GET a resource on behalf of a user and return the parsed body.
+
+        Concurrent calls for the same user, endpoint & params share one
+        request and its parsed body. With a response cache, fresh cached
+        bodies are returned without a request, and stale ones are
+        revalidated with their ETag.
+
+        Args:
+            url: Endpoint path or absolute URL.
+            user: User making the request.
+            params: Query parameters.
+            version: Version (e.g. a playlist's snapshot) of the resource;
+                cached responses for a version don't expire.
+        """
+        return self.single_flight.do(
+            request_key(user, url, params, version),
+            lambda: self._fetch(url, user, params, version),
+        )
+
+    def _fetch(
+        self,
+        url: str | httpx.URL,
+        user: "AppUser",
+        params: dict[str, typing.Any] | None = None,
+        version: str | None = None,
+    ) -> dict:
+        if self.cache is None:
+            return self._fetch_uncached(url, user, params)
+
+        key = self.cache.key(user, str(url), params, version)
+        entry = self.cache.get(key)
+
+        if entry is not None and self.cache.is_fresh(entry):
+            return entry.body
+
+        response = self._get(
+            url, user, params, headers=entry.validators if entry else None
+        )
+
+        if response.status_code == httpx.codes.NOT_MODIFIED and entry is not None:
+            return self.cache.touch(key, entry).body
+
+        if response.is_error:
+            self.handle_error(response)
+
+        body = response.json()
+
+        self.cache.set(key, CachedResponse.from_response(response, body, version))
+
+        return body
+
+    def _fetch_uncached(
+        self,
+        url: str | httpx.URL,
+        user: "AppUser",
+        params: dict[str, typing.Any] | None = None,
+    ) -> dict:
+        response = self._get(url, user, params)
+
+        if response.is_error:
+            self.handle_error(response)
+
+        return response.json()
+
+    def _get(
+        self,
+        url: str | httpx.URL,
+        user: "AppUser",
+        params: dict[str, typing.Any] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> httpx.Response:
+        return self.transport.get(
+            url,
+            user=user,
+            params=params,
+            headers=headers,
+            refresh=self.auth_service.ensure_fresh_token,
+        )
@@ -0,0 +1,159 @@
+"""Conditional response cache for Spotify API reads.
+
+Responses are stored per user, endpoint and query params together with
+their ``ETag`` validator. A cached body is served as-is while it is fresh
+(``ttl``); afterwards the request is revalidated with ``If-None-Match`` and
+a ``304`` serves the cached body again.
+
+Pages of a playlist's items can be cached under the playlist's snapshot
+(``version``): a snapshot identifies the playlist's contents, so those
+entries stay valid until the snapshot changes.
+
+The cache fails open: while the cache backend is unavailable, requests go
+to the API as if nothing was cached.
+"""
+
+import dataclasses
+import hashlib
+import json
+import time
+import typing
+
+from django.core.cache import BaseCache, caches
+from loguru import logger
+
+from server import settings
+
+if typing.TYPE_CHECKING:
+    import httpx
+
+    from core.models import AppUser
+
+
+@dataclasses.dataclass
+class CachedResponse:
+    """A cached response body and its validators."""
+
+    body: dict
+    etag: str | None = None
+    version: str | None = None
+    stored_at: float = dataclasses.field(default_factory=time.time)
+
+    @classmethod
+    def from_response(
+        cls: type["CachedResponse"],
+        response: "httpx.Response",
+        body: dict,
+        version: str | None = None,
+    ) -> "CachedResponse":
+        """Create an entry from an API response and its parsed body."""
+        return cls(
+            body=body,
+            etag=response.headers.get("ETag"),
+            version=version,
+        )
+
+    @property
+    def age(self) -> float:
+        """Seconds since the response was stored (or revalidated)."""
+        return time.time() - self.stored_at
+
+    @property
+    def validators(self) -> dict[str, str]:
+        """Conditional request headers for the entry."""
+        return {"If-None-Match": self.etag} if self.etag else {}
+
+
+class ResponseCache:
+    """Spotify API response cache, backed by a Django cache.
+
+    Args:
+        alias: Django cache alias.
+        ttl: Seconds a response is served without revalidation.
+        timeout: Seconds a response is kept for revalidation.
+        retry_interval: Seconds to skip the cache after a backend error.
+    """
+
+    def __init__(
+        self,
+        alias: str | None = None,
+        ttl: float | None = None,
+        timeout: int | None = None,
+        retry_interval: float = 30.0,
+    ) -> None:
+        """Configure the cache, defaults are read from SPOTIFY_CACHE."""
+        config = settings.SPOTIFY_CACHE
+
+        self.alias = alias or config["alias"]
+        self.ttl = ttl if ttl is not None else config["ttl"]
+        self.timeout = timeout if timeout is not None else config["timeout"]
+        self.retry_interval = retry_interval
+
+        self._unavailable_until = 0.0
+
+    @property
+    def backend(self) -> BaseCache:
+        """Django cache backend."""
+        return caches[self.alias]
+
+    @property
+    def available(self) -> bool:
+        """Whether the backend should be tried."""
+        return time.monotonic() >= self._unavailable_until
+
+    def _fail_open(self, exc: Exception) -> None:
+        logger.warning(
+            f"Spotify response cache unavailable ({exc}), skipping it for "
+            f"{self.retry_interval:.0f}s."
+        )
+
+        self._unavailable_until = time.monotonic() + self.retry_interval
+
+    def key(
+        self,
+        user: "AppUser",
+        url: str,
+        params: dict[str, typing.Any] | None = None,
+        version: str | None = None,
+    ) -> str:
+        """Cache key for a user's request."""
+        request = json.dumps(
+            [str(url), sorted((params or {}).items()), version], default=str
+        )
+        digest = hashlib.sha256(request.encode()).hexdigest()
+
+        return f"spotify:response:{user.pk}:{digest}"
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        """Whether the entry can be served without revalidation."""
+        return entry.version is not None or entry.age < self.ttl
+
+    def get(self, key: str) -> CachedResponse | None:
+        """Get a cached response."""
+        if not self.available:
+            return None
+
+        try:
+            return self.backend.get(key)
+        except Exception as exc:
+            self._fail_open(exc)
+
+        return None
+
+    def set(self, key: str, entry: CachedResponse) -> None:
+        """Store a response."""
+        if not self.available:
+            return
+
+        try:
+            self.backend.set(key, entry, timeout=self.timeout)
+        except Exception as exc:
+            self._fail_open(exc)
+
+    def touch(self, key: str, entry: CachedResponse) -> CachedResponse:
+        """Mark a revalidated (304) response as fresh again."""
+        entry.stored_at = time.time()
+
+        self.set(key, entry)
+
+        return entry
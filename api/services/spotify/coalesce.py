@@ -0,0 +1,107 @@
+"""Request coalescing (single-flight) for Spotify API reads.
+
+When the dashboard loads, several views ask the API the same question at
+nearly the same time. Concurrent identical calls share one in-flight call:
+the first caller (the leader) makes the request, the others wait for it
+and get its result, or its exception.
+
+Calls are coalesced within a process; the response cache is what shares
+results between processes.
+"""
+
+import copy
+import dataclasses
+import json
+import threading
+import typing
+
+from loguru import logger
+
+if typing.TYPE_CHECKING:
+    import httpx
+
+    from core.models import AppUser
+
+T = typing.TypeVar("T")
+
+
+def request_key(
+    user: "AppUser",
+    url: "str | httpx.URL",
+    params: dict[str, typing.Any] | None = None,
+    version: str | None = None,
+) -> tuple:
+    """Identity of a user's GET request."""
+    return (
+        user.pk,
+        str(url),
+        json.dumps(sorted((params or {}).items()), default=str),
+        version,
+    )
+
+
+@dataclasses.dataclass
+class Call:
+    """An in-flight call."""
+
+    done: threading.Event = dataclasses.field(default_factory=threading.Event)
+    result: typing.Any = None
+    error: BaseException | None = None
+    waiters: int = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one call."""
+
+    def __init__(self) -> None:
+        """Create an empty group of calls."""
+        self._lock = threading.Lock()
+        self._calls: dict[typing.Hashable, Call] = {}
+
+    def do(self, key: typing.Hashable, fn: typing.Callable[[], T]) -> T:
+        """Call ``fn``, unless a call with the same key is in flight.
+
+        Waiters get a copy of the leader's result, so callers can't see
+        each other's changes to it.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+
+            if call is None:
+                call = self._calls[key] = Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+
+            if call.error is not None:
+                raise call.error
+
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+            if call.waiters:
+                logger.debug(f"Coalesced {call.waiters} calls into one ({key}).")
+
+            call.done.set()
+
+        return call.result
+
+    @property
+    def in_flight(self) -> int:
+        """Number of calls in flight."""
+        return len(self._calls)
+
+
+SINGLE_FLIGHT = SingleFlight()
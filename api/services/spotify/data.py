@@ -9,16 +9,18 @@ Parking Lot:
     - The endpoint should dispatch a task.
 """
 
-import time
 import typing
 
-import httpx
 from loguru import logger
 
 from api.libs.constants import SpotifyAPIEndpoints
-from api.libs.exceptions import SpotifyAPIError, SpotifyExpiredTokenError
+from api.libs.fields import FieldProjection
 from api.services.spotify.auth import SpotifyAuthService
-from core.models import AppUser
+from api.services.spotify.base import SpotifyService
+from api.services.spotify.transport import SpotifyTransport
+
+if typing.TYPE_CHECKING:
+    from core.models import AppUser
 
 logger.add(
     "logs/spotify_data.log",
@@ -31,34 +33,28 @@ logger.add(
 AUTH = SpotifyAuthService()
 
 
-class SpotifyDataService:
+class SpotifyDataService(SpotifyService):
     """Single record data service."""
 
     _auth: SpotifyAuthService
 
-    def __init__(self, auth: SpotifyAuthService | None = None) -> None:
+    def __init__(
+        self,
+        auth: SpotifyAuthService | None = None,
+        transport: SpotifyTransport | None = None,
+    ) -> None:
         """Add dependencies to the service."""
-        self._auth = auth or AUTH
+        super().__init__(transport, auth or AUTH)
 
-    def get_user(self, user_pk: int) -> "AppUser":
-        """Get user data."""
-        return AppUser.objects.get(pk=user_pk)
+        self._auth = self.auth_service
 
     def fetch_playlist_tracks(
-        self, playlist_id: str, user_pk: int
+        self, playlist_id: str, user_pk: int, fields: FieldProjection | None = None
     ) -> typing.Iterable[dict]:
-        """Fetch playlist tracks."""
+        """Fetch playlist tracks, with only the given fields of each item."""
         user = self.get_user(user_pk)
 
-        try:
-            yield from self._fetch_playlist_tracks(playlist_id, user=user)
-        except SpotifyExpiredTokenError:
-            user_service = SpotifyAuthService()
-            user_service.refresh_access_token(user.refresh_token)
-
-            user.refresh_from_db()
-
-            yield from self._fetch_playlist_tracks(playlist_id, user=user)
+        yield from self._fetch_playlist_tracks(playlist_id, user=user, fields=fields)
 
     def fetch_saved_items(
         self,
@@ -74,80 +70,46 @@ class SpotifyDataService:
             SpotifyAPIEndpoints.FollowedArtists,
         ]
 
-        with httpx.Client(
-            base_url=SpotifyAPIEndpoints.BASE_URL,
-            headers={"Authorization": f"Bearer {user.access_token}"},
-        ) as client:
-            for path in paths:
-                params = {"limit": str(limit)}
+        for path in paths:
+            params = {"limit": str(limit)}
 
-                if path == SpotifyAPIEndpoints.FollowedArtists:
-                    params["type"] = "artist"
+            if path == SpotifyAPIEndpoints.FollowedArtists:
+                params["type"] = "artist"
 
-                response = client.get(url=path, params=params)
+            resp = self.fetch(path, user, params)
 
-                if response.is_error:
-                    logger.error(f"Error: {response.text}")
-
-                    raise SpotifyAPIError(response.text)
-
-                resp = response.json()
-
-                if path == SpotifyAPIEndpoints.FollowedArtists:
-                    yield (path, resp.get("artists", {}))
-                else:
-                    yield (path, resp)
+            if path == SpotifyAPIEndpoints.FollowedArtists:
+                yield (path, resp.get("artists", {}))
+            else:
+                yield (path, resp)
 
     def fetch_playlist(self, playlist_id: str, user: "AppUser") -> dict:
         """Fetch playlist data from Spotify API."""
-        with httpx.Client(
-            base_url=SpotifyAPIEndpoints.BASE_URL,
-            headers={"Authorization": f"Bearer {user.access_token}"},
-        ) as client:
-            response = client.get(
-                url=SpotifyAPIEndpoints.Playlist.format(playlist_id=playlist_id)
-            )
-
-            if response.is_error:
-                logger.error(f"Error: {response.text}")
-
-                raise SpotifyAPIError(response.text)
-
-            resp = response.json()
-
-            client.close()
-
-            return resp
+        return self.fetch(
+            SpotifyAPIEndpoints.Playlist.format(playlist_id=playlist_id), user
+        )
 
     def _fetch_playlist_tracks(
-        self, playlist_id: str, user: "AppUser"
+        self,
+        playlist_id: str,
+        user: "AppUser",
+        fields: FieldProjection | None = None,
     ) -> typing.Iterable[dict]:
         """Fetch a playlist's tracks."""
-        next = SpotifyAPIEndpoints.PlaylistTracks.format(playlist_id=playlist_id)
-
-        with httpx.Client(
-            base_url=SpotifyAPIEndpoints.BASE_URL,
-            headers={"Authorization": f"Bearer {user.access_token}"},
-        ) as client:
-            while next:
-                response = client.get(url=next)
+        next: str | None = SpotifyAPIEndpoints.PlaylistTracks.format(
+            playlist_id=playlist_id
+        )
+        params = fields.page().params if fields else None
 
-                if response.is_error:
-                    logger.error(f"Error: {response.text}")
+        while next:
+            resp = self.fetch(next, user, params)
 
-                    raise SpotifyAPIError(response.text)
+            logger.debug(f"No. Tracks: {len(resp.get("items", []))} items")
+            logger.debug(f"Next: {resp.get('next')}")
 
-                resp = response.json()
+            next = resp.get("next")
 
-                logger.debug(f"No. Tracks: {len(resp.get("items", []))} items")
-                logger.debug(f"Next: {resp.get('next')}")
-
-                next = resp.get("next")
-
-                if next:
-                    next = next.replace(f"{SpotifyAPIEndpoints.BASE_URL}/", "")
-
-                yield from resp.get("items", [])
+            yield from resp.get("items", [])
 
     def fetch_audio_features(
         self, track_ids: list[str], user_pk: int
@@ -155,52 +117,14 @@ class SpotifyDataService:
         """Fetch audio features."""
         user = self.get_user(user_pk)
 
-        try:
-            yield from self._fetch_audio_features(track_ids, user)
-        except SpotifyExpiredTokenError:
-            user_service = SpotifyAuthService()
-            user_service.refresh_access_token(user.refresh_token)
-
-            user.refresh_from_db()
-
-            yield from self._fetch_audio_features(track_ids, user)
+        yield from self._fetch_audio_features(track_ids, user)
 
     def fetch_audio_features_for_track(self, track_id: str, user_pk: int) -> dict:
         """Fetch audio features for a track."""
         user = self.get_user(user_pk)
         path = SpotifyAPIEndpoints.TrackAudioFeatures.format(track_id=track_id)
 
-        try:
-            response = httpx.get(
-                url=f"{SpotifyAPIEndpoints.BASE_URL}/{path}",
-                headers={"Authorization": f"Bearer {user.access_token}"},
-            )
-
-            if response.is_error:
-                logger.error(f"Error: {response.text}")
-
-                if (
-                    response.status_code == 401
-                    and "The access token expired" in response.text
-                ):
-                    raise SpotifyExpiredTokenError(response.text)
-                else:
-                    raise SpotifyAPIError(response.text)
-
-            return response.json()
-        except SpotifyExpiredTokenError:
-            self._auth.refresh_access_token(user.refresh_token)
-
-            user.refresh_from_db()
-
-            response = httpx.get(
-                url=f"{SpotifyAPIEndpoints.BASE_URL}/{path}",
-                headers={"Authorization": f"Bearer {user.access_token}"},
-            )
-
-            response.raise_for_status()
-
-            return response.json()
+        return self.fetch(path, user)
 
     def _fetch_audio_features(
         self, track_ids: list[str], user: "AppUser"
@@ -208,33 +132,14 @@ class SpotifyDataService:
         """Fetch audio features."""
         batches = [track_ids[i : i + 100] for i in range(0, len(track_ids), 100)]
 
-        with httpx.Client(
-            base_url=SpotifyAPIEndpoints.BASE_URL,
-            headers={"Authorization": f"Bearer {user.access_token}"},
-        ) as client:
-            for batch in batches:
-                time.sleep(0.5)
-                response = client.get(
-                    url=SpotifyAPIEndpoints.BulkTrackAudioFeatures,
-                    params={"ids": ",".join(batch)},
-                )
-
-                if response.is_error:
-                    logger.error(f"Error: {response.text}")
-                    logger.error(batch)
-                    if (
-                        response.status_code == 401
-                        and "The access token expired" in response.text
-                    ):
-                        raise SpotifyExpiredTokenError(response.text)
-                    else:
-                        raise SpotifyAPIError(response.text)
-
-                resp = response.json()
-
-                time.sleep(0.5)
-
-                yield from resp.get("audio_features", [])
+        for batch in batches:
+            resp = self.fetch(
+                SpotifyAPIEndpoints.BulkTrackAudioFeatures,
+                user,
+                {"ids": ",".join(batch)},
+            )
+
+            yield from resp.get("audio_features", [])
 
     def _fetch_album_tracks(self, album_id: str, user: "AppUser") -> dict:
         raise NotImplementedError
@@ -0,0 +1,183 @@
+"""Audio features store.
+
+A track's audio features never change, so they only need to be fetched
+from the Spotify API once. Features are looked up, in order, in:
+
+1. An in-process LRU cache.
+2. A shared (Redis) cache, through Django's cache framework.
+3. The ``TrackFeatures`` table.
+4. The API, requesting only the missing IDs in batches of 100.
+
+Whatever is found in a slower tier is copied into the faster ones.
+"""
+
+import collections
+import threading
+import time
+import typing
+
+from django.core.cache import BaseCache, caches
+from loguru import logger
+
+from api.models.analysis import TrackFeatures
+from api.services.spotify.data import SpotifyDataService
+from server import settings
+
+
+class LRUCache:
+    """Thread-safe, size-bounded in-memory cache."""
+
+    def __init__(self, maxsize: int) -> None:
+        """Create an empty cache holding at most ``maxsize`` entries."""
+        self.maxsize = maxsize
+        self._data: collections.OrderedDict[str, dict] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of cached entries."""
+        return len(self._data)
+
+    def get_many(self, keys: typing.Iterable[str]) -> dict[str, dict]:
+        """Get the cached entries, marking them as recently used."""
+        found = {}
+
+        with self._lock:
+            for key in keys:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    found[key] = self._data[key]
+
+        return found
+
+    def set_many(self, entries: dict[str, dict]) -> None:
+        """Add entries, evicting the least recently used ones."""
+        with self._lock:
+            for key, value in entries.items():
+                self._data[key] = value
+                self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+
+
+class FeatureStore:
+    """Audio features by track Spotify ID.
+
+    Args:
+        data: Data service used to fetch missing features.
+        alias: Django cache alias of the shared cache.
+        maxsize: Number of features kept in memory.
+        timeout: Seconds features are kept in the shared cache.
+        retry_interval: Seconds to skip the shared cache after an error.
+    """
+
+    def __init__(
+        self,
+        data: SpotifyDataService | None = None,
+        alias: str | None = None,
+        maxsize: int | None = None,
+        timeout: int | None = None,
+        retry_interval: float = 30.0,
+    ) -> None:
+        """Configure the store, defaults are read from SPOTIFY_FEATURE_STORE."""
+        config = settings.SPOTIFY_FEATURE_STORE
+
+        self.data = data or SpotifyDataService()
+        self.alias = alias or config["alias"]
+        self.memory = LRUCache(maxsize or config["maxsize"])
+        self.timeout = timeout if timeout is not None else config["timeout"]
+        self.retry_interval = retry_interval
+
+        self._unavailable_until = 0.0
+
+    @property
+    def backend(self) -> BaseCache:
+        """Shared cache backend."""
+        return caches[self.alias]
+
+    def key(self, spotify_id: str) -> str:
+        """Shared cache key of a track's features."""
+        return f"spotify:features:{spotify_id}"
+
+    def audio_features(
+        self, track_ids: typing.Iterable[str], user_pk: int
+    ) -> list[dict]:
+        """Get the audio features of tracks.
+
+        Tracks without audio features (e.g. local files) are left out.
+        """
+        track_ids = list(dict.fromkeys(track_ids))
+        features = self.memory.get_many(track_ids)
+
+        if missing := [t for t in track_ids if t not in features]:
+            shared = self._get_shared(missing)
+            features.update(shared)
+
+            self.memory.set_many(shared)
+
+        if missing := [t for t in track_ids if t not in features]:
+            stored = TrackFeatures.sync.stored(missing)
+            features.update(stored)
+
+            self._remember(stored)
+
+        if missing := [t for t in track_ids if t not in features]:
+            fetched = {
+                item["id"]: item
+                for item in self.data.fetch_audio_features(missing, user_pk)
+                if item
+            }
+            features.update(fetched)
+
+            self._remember(fetched)
+
+        logger.debug(
+            f"Audio features: {len(track_ids)} tracks, {len(missing)} fetched."
+        )
+
+        return [features[t] for t in track_ids if t in features]
+
+    def _remember(self, features: dict[str, dict]) -> None:
+        self.memory.set_many(features)
+        self._set_shared(features)
+
+    def _fail_open(self, exc: Exception) -> None:
+        logger.warning(
+            f"Shared feature cache unavailable ({exc}), skipping it for "
+            f"{self.retry_interval:.0f}s."
+        )
+
+        self._unavailable_until = time.monotonic() + self.retry_interval
+
+    def _get_shared(self, track_ids: list[str]) -> dict[str, dict]:
+        if time.monotonic() < self._unavailable_until:
+            return {}
+
+        try:
+            found = self.backend.get_many([self.key(t) for t in track_ids])
+        except Exception as exc:
+            self._fail_open(exc)
+
+            return {}
+
+        return {value["id"]: value for value in found.values()}
+
+    def _set_shared(self, features: dict[str, dict]) -> None:
+        if not features or time.monotonic() < self._unavailable_until:
+            return
+
+        try:
+            self.backend.set_many(
+                {self.key(t): value for t, value in features.items()},
+                timeout=self.timeout,
+            )
+        except Exception as exc:
+            self._fail_open(exc)
+
+
+FEATURES = FeatureStore()
@@ -1,134 +1,85 @@
 """Spotify data service."""
 
-import time
+import dataclasses
+import datetime
 import typing
 
-import httpx
 from loguru import logger
 
 from api.libs.constants import SpotifyAPIEndpoints
-from api.libs.exceptions import SpotifyAPIError, SpotifyExpiredTokenError
+from api.libs.exceptions import SpotifyAPIError
+from api.libs.fields import FieldProjection
 from api.services.spotify.auth import SpotifyAuthService
-from core.models import AppUser
+from api.services.spotify.base import SpotifyService
+from api.services.spotify.cache import ResponseCache
+from api.services.spotify.transport import SpotifyTransport
 
-logger.add("logs/spotify_data.log", rotation="1 MB", retention="1 day", level="DEBUG")
+if typing.TYPE_CHECKING:
+    from core.models import AppUser
 
+logger.add("logs/spotify_data.log", rotation="1 MB", retention="1 day", level="DEBUG")
 
-class SpotifyLibraryService:
-    """API actions for fetching data from the Spotify API."""
 
-    def __init__(self, auth_service: SpotifyAuthService | None = None) -> None:
-        """Add dependencies to the service."""
-        self.auth_service = auth_service or SpotifyAuthService()
+@dataclasses.dataclass
+class SavedItems:
+    """Items saved to a user's library, newest first."""
 
-    def get_user(self, user_pk: int) -> "AppUser":
-        """Get a user by primary key."""
-        return AppUser.objects.get(pk=user_pk)
+    items: list[dict]
+    total: int
 
-    def handle_error(self, response: httpx.Response) -> None:
-        """Handle Spotify API errors."""
-        logger.error(f"Error: {response.text}")
-        logger.error(f"Status: {response.status_code}")
+    @property
+    def as_dict(self) -> dict:
+        """Return the dataclass as a dictionary."""
+        return dataclasses.asdict(self)
 
-        if response.text and response.json():
-            error = response.json().get("error")
-        else:
-            error = {"status": response.status_code, "message": response.text}
 
-        if (
-            error.get("status") == 401
-            and error.get("message") == "The access token expired"
-        ):
-            raise SpotifyExpiredTokenError("The access token expired")
+class SpotifyLibraryService(SpotifyService):
+    """API actions for fetching data from the Spotify API."""
 
-        raise SpotifyAPIError(response.text)
+    def __init__(
+        self,
+        auth_service: SpotifyAuthService | None = None,
+        transport: SpotifyTransport | None = None,
+        cache: ResponseCache | None = None,
+    ) -> None:
+        """Add dependencies to the service."""
+        super().__init__(transport, auth_service, cache)
 
     def library_playlists(
         self, user_pk: int, limit: int = 50, offset: int = 0, all: bool = False
     ) -> typing.Iterable[dict]:
-        """Get the user's playlists.
-
-        Refresh the access token if it has expired.
-        """
+        """Get the user's playlists."""
         user = self.get_user(user_pk)
 
-        try:
-            yield from self._library_playlists(
-                user=user, limit=limit, offset=offset, all=all
-            )
-        except SpotifyExpiredTokenError:
-            self.auth_service.refresh_access_token(user.refresh_token)
-
-            user.refresh_from_db()
-
-            yield from self._library_playlists(user=user, limit=limit, all=all)
+        yield from self._library_playlists(
+            user=user, limit=limit, offset=offset, all=all
+        )
 
     def library_track(self, user_pk: int, track_id: str) -> dict:
         """Get the user's track."""
         user = self.get_user(user_pk)
-        try:
-            response = httpx.get(
-                url=f"{SpotifyAPIEndpoints.BASE_URL}/{SpotifyAPIEndpoints.Track.format(track_id=track_id)}",
-                headers={"Authorization": f"Bearer {user.access_token}"},
-            )
-
-            if response.is_error:
-                self.handle_error(response)
-
-            return response.json()
-        except SpotifyExpiredTokenError:
-            self.auth_service.refresh_access_token(user.refresh_token)
-
-            user.refresh_from_db()
-
-            response = httpx.get(
-                url=f"{SpotifyAPIEndpoints.BASE_URL}/{SpotifyAPIEndpoints.Track.format(track_id=track_id)}",
-                headers={"Authorization": f"Bearer {user.access_token}"},
-            )
 
-            if response.is_error:
-                self.handle_error(response)
-
-        return response.json()
+        return self.fetch(SpotifyAPIEndpoints.Track.format(track_id=track_id), user)
 
     def library_playlists_total(self, user_pk: int) -> int:
         """Get the total number of playlists."""
         user = self.get_user(user_pk)
 
-        response = httpx.get(
-            url=f"{SpotifyAPIEndpoints.BASE_URL}/{SpotifyAPIEndpoints.SavedPlaylists}",
-            headers={"Authorization": f"Bearer {user.access_token}"},
-            params={"limit": 1},
-        )
-
-        if response.is_error:
-            self.handle_error(response)
-
-        total = response.json().get("total", "0")
-
-        time.sleep(0.5)
+        resp = self.fetch(SpotifyAPIEndpoints.SavedPlaylists, user, {"limit": 1})
+        total = resp.get("total", "0")
 
         return int(total)
 
     def library_albums(
         self, user_pk: int, limit: int = 50, offset: int = 0, all: bool = False
     ) -> typing.Iterable[dict]:
-        """Get the user's albums.
-
-        Refresh the access token if it has expired.
-        """
+        """Get the user's albums."""
         user = self.get_user(user_pk)
 
         try:
             yield from self._library_albums(
                 user=user, limit=limit, offset=offset, all=all
             )
-        except SpotifyExpiredTokenError:
-            self.auth_service.refresh_access_token(user.refresh_token)
-
-            user.refresh_from_db()
-
-            yield from self._library_albums(user=user, limit=limit, all=all)
         except Exception as e:
             logger.error("Request to get albums failed.")
             logger.error(f"Error: {e}")
@@ -138,57 +89,25 @@ class SpotifyLibraryService:
     def library_artists(
         self, user_pk: int, limit: int = 50, all: bool = False, last: str | None = None
     ) -> typing.Iterable[dict]:
-        """Get the user's followed artists.
-
-        Refresh the access token if it has expired.
-        """
+        """Get the user's followed artists."""
         user = self.get_user(user_pk)
 
-        try:
-            yield from self._library_artists(user=user, limit=limit, last=last, all=all)
-        except SpotifyExpiredTokenError:
-            self.auth_service.refresh_access_token(user.refresh_token)
-
-            user.refresh_from_db()
-
-            yield from self._library_artists(user=user, limit=limit, all=all)
+        yield from self._library_artists(user=user, limit=limit, last=last, all=all)
 
     def library_tracks(
         self, user_pk: int, limit: int = 50, offset: int = 0, all: bool = False
     ) -> typing.Iterable[dict]:
-        """Get the user's saved tracks.
-
-        Refresh the access token if it has expired.
-        """
+        """Get the user's saved tracks."""
         user = self.get_user(user_pk)
 
-        try:
-            yield from self._library_tracks(
-                user=user, limit=limit, offset=offset, all=all
-            )
-        except SpotifyExpiredTokenError:
-            self.auth_service.refresh_access_token(user.refresh_token)
-
-            user.refresh_from_db()
-
-            yield from self._library_tracks(user=user, limit=limit, all=all)
+        yield from self._library_tracks(user=user, limit=limit, offset=offset, all=all)
 
     def library_tracks_total(self, user_pk: int) -> int:
         """Get the total number of saved tracks."""
         user = self.get_user(user_pk)
 
-        response = httpx.get(
-            url=f"{SpotifyAPIEndpoints.BASE_URL}/{SpotifyAPIEndpoints.SavedTracks}",
-            headers={"Authorization": f"Bearer {user.access_token}"},
-            params={"limit": 1},
-        )
-
-        if response.is_error:
-            self.handle_error(response)
-
-        total = response.json().get("total", "0")
-
-        time.sleep(0.5)
+        resp = self.fetch(SpotifyAPIEndpoints.SavedTracks, user, {"limit": 1})
+        total = resp.get("total", "0")
 
         return int(total)
 
@@ -196,58 +115,105 @@ class SpotifyLibraryService:
         """Get the total number of saved albums."""
         user = self.get_user(user_pk)
 
-        response = httpx.get(
-            url=f"{SpotifyAPIEndpoints.BASE_URL}/{SpotifyAPIEndpoints.SavedAlbums}",
-            headers={"Authorization": f"Bearer {user.access_token}"},
-            params={"limit": 1},
-        )
+        resp = self.fetch(SpotifyAPIEndpoints.SavedAlbums, user, {"limit": 1})
+        total = resp.get("total", "0")
 
-        if response.is_error:
-            self.handle_error(response)
+        return int(total)
 
-        total = response.json().get("total", "0")
+    def library_tracks_after(
+        self, user_pk: int, after: datetime.datetime | None = None
+    ) -> SavedItems:
+        """Get the tracks saved since ``after`` (all of them without it)."""
+        user = self.get_user(user_pk)
 
-        time.sleep(0.5)
+        return self._library_saved_after(user, SpotifyAPIEndpoints.SavedTracks, after)
 
-        return int(total)
+    def library_albums_after(
+        self, user_pk: int, after: datetime.datetime | None = None
+    ) -> SavedItems:
+        """Get the albums saved since ``after`` (all of them without it)."""
+        user = self.get_user(user_pk)
 
-    def library_playlist(self, user_pk: int, playlist_id: str, *args, **kwargs) -> dict:
+        return self._library_saved_after(user, SpotifyAPIEndpoints.SavedAlbums, after)
+
+    def library_playlist(
+        self,
+        user_pk: int,
+        playlist_id: str,
+        *args,
+        fields: FieldProjection | None = None,
+        item_fields: FieldProjection | None = None,
+        **kwargs,
+    ) -> dict:
         """Get the user's playlist with items.
 
-        Refresh the access token if it has expired.
+        Args:
+            user_pk: User the playlist belongs to.
+            playlist_id: Spotify ID of the playlist.
+            fields: Fields of the playlist to get, defaults to all.
+            item_fields: Fields of each item to get, defaults to all.
+            *args: Unused.
+            **kwargs: Unused.
         """
         user = self.get_user(user_pk)
 
         try:
-            return self._library_playlist(user=user, playlist_id=playlist_id)
-        except SpotifyExpiredTokenError:
-            self.auth_service.refresh_access_token(user.refresh_token)
-
-            user.refresh_from_db()
-
-            return self._library_playlist(user=user, playlist_id=playlist_id)
+            return self._library_playlist(
+                user=user,
+                playlist_id=playlist_id,
+                fields=fields,
+                item_fields=item_fields,
+            )
         except Exception as e:
             logger.error(f"Request to get playlist {playlist_id} items failed.")
             logger.error(f"Error: {e}")
 
             raise SpotifyAPIError(str(e)) from e
 
-    def library_artists_total(self, user_pk: int) -> int:
-        """Get the total number of followed artists."""
+    def library_playlist_metadata(
+        self, user_pk: int, playlist_id: str, fields: FieldProjection | None = None
+    ) -> dict:
+        """Get the user's playlist, without fetching its items."""
         user = self.get_user(user_pk)
 
-        response = httpx.get(
-            url=f"{SpotifyAPIEndpoints.BASE_URL}/{SpotifyAPIEndpoints.FollowedArtists}",
-            headers={"Authorization": f"Bearer {user.access_token}"},
-            params={"limit": 1, "type": "artist"},
+        return self._library_playlist_metadata(user, playlist_id, fields)
+
+    def library_playlist_pages(
+        self,
+        user_pk: int,
+        playlist_id: str,
+        snapshot_id: str | None = None,
+        fields: FieldProjection | None = None,
+    ) -> typing.Iterable[list[dict]]:
+        """Get the playlist's items, a page at a time.
+
+        A page is only requested once the previous one has been consumed,
+        so no more than one page is held in memory.
+        """
+        user = self.get_user(user_pk)
+
+        yield from self._library_playlist_pages(user, playlist_id, snapshot_id, fields)
+
+    def library_playlist_snapshot(self, user_pk: int, playlist_id: str) -> str | None:
+        """Get the playlist's current snapshot ID, without its items."""
+        user = self.get_user(user_pk)
+
+        resp = self.fetch(
+            SpotifyAPIEndpoints.Playlist.format(playlist_id=playlist_id),
+            user,
+            {"fields": "snapshot_id"},
         )
 
-        if response.is_error:
-            self.handle_error(response)
+        return resp.get("snapshot_id")
 
-        total = response.json().get("artists", {}).get("total", "0")
+    def library_artists_total(self, user_pk: int) -> int:
+        """Get the total number of followed artists."""
+        user = self.get_user(user_pk)
 
-        time.sleep(0.5)
+        resp = self.fetch(
+            SpotifyAPIEndpoints.FollowedArtists, user, {"limit": 1, "type": "artist"}
+        )
+        total = resp.get("artists", {}).get("total", "0")
 
         return int(total)
 
@@ -260,40 +226,26 @@ class SpotifyLibraryService:
         if all:
             limit = 50  # Default page size is 20
 
-        with httpx.Client(
-            base_url=SpotifyAPIEndpoints.BASE_URL,
-            headers={"Authorization": f"Bearer {user.access_token}"},
-        ) as client:
-            while next:
-                if not all and yielded >= limit:
-                    client.close()
-                    break
-
-                time.sleep(1)
-
-                params = {"limit": limit if limit <= 50 else 50}
-
-                if offset > 0:
-                    params["offset"] = offset
+        params: dict | None = {"limit": limit if limit <= 50 else 50}
 
-                response = client.get(url=next, params=params)
+        if offset > 0:
+            params["offset"] = offset  # type: ignore
 
-                if response.is_error:
-                    self.handle_error(response)
+        while next:
+            if not all and yielded >= limit:
+                break
 
-                resp = response.json()
+            resp = self.fetch(next, user, params)
 
-                next = (
-                    resp.get("next").replace(f"{SpotifyAPIEndpoints.BASE_URL}/", "")
-                    if resp.get("next")
-                    else None
-                )
+            # The next link carries its own limit & offset.
+            next, params = resp.get("next"), None
+            items = resp.get("items") or []
 
-                yielded += len(resp.get("items"))
+            yielded += len(items)
 
-                logger.debug(f"Fetched {yielded} {resp.get("total")}")
+            logger.debug(f"Fetched {yielded} {resp.get("total")}")
 
-                yield from resp.get("items")
+            yield from items
 
     def _library_albums(
         self, user: "AppUser", limit: int = 50, offset: int = 0, all: bool = False
@@ -305,37 +257,54 @@ class SpotifyLibraryService:
         if all:
             limit = 50  # Default page size is 20
 
-        with httpx.Client(
-            base_url=SpotifyAPIEndpoints.BASE_URL,
-            headers={"Authorization": f"Bearer {user.access_token}"},
-        ) as client:
-            while next:
-                if not all and yielded >= limit:
-                    client.close()
-                    break
+        params: dict | None = {"limit": limit if limit <= 50 else 50}
+
+        if offset > 0:
+            params["offset"] = offset  # type: ignore
+
+        while next:
+            if not all and yielded >= limit:
+                break
+
+            resp = self.fetch(next, user, params)
+
+            next, params = resp.get("next"), None
+            items = resp.get("items") or []
+
+            yielded += len(items)
 
-                time.sleep(1)
+            logger.debug(f"Fetched {yielded} of {resp.get("total")}")
 
-                params = {"limit": limit if limit <= 50 else 50}
+            yield from items
 
-                if offset > 0:
-                    params["offset"] = offset
+    def _library_saved_after(
+        self, user: "AppUser", endpoint: str, after: datetime.datetime | None
+    ) -> SavedItems:
+        """Page through saved items until one was saved before ``after``.
 
-                response = client.get(url=next, params=params)
-                if response.is_error:
-                    self.handle_error(response)
+        Saved items are listed newest first, so the pages past the watermark
+        are never requested. Items saved at ``after`` are included, as
+        ``added_at`` only has a precision of seconds.
+        """
+        saved = SavedItems(items=[], total=0)
+        next: str | None = endpoint
+        params: dict | None = {"limit": 50}
+
+        while next:
+            resp = self.fetch(next, user, params)
 
-                resp = response.json()
+            next, params = resp.get("next"), None
+            saved.total = int(resp.get("total") or 0)
 
-                next = resp.get("next")
-                if next is not None:
-                    next = next.replace(f"{SpotifyAPIEndpoints.BASE_URL}/", "")
+            for item in resp.get("items") or []:
+                added_at = datetime.datetime.fromisoformat(item["added_at"])
 
-                yielded += len(resp.get("items"))
+                if after is not None and added_at < after:
+                    return saved
 
-                logger.debug(f"Fetched {yielded} of {resp.get("total")}")
+                saved.items.append(item)
 
-                yield from resp.get("items")
+        return saved
 
     def _library_artists(
         self,
@@ -346,156 +315,142 @@ class SpotifyLibraryService:
     ) -> typing.Iterable[dict]:
         """Get the user's followed artists."""
         yielded = 0
-        next = f"{SpotifyAPIEndpoints.FollowedArtists}"
-        with httpx.Client(
-            base_url=SpotifyAPIEndpoints.BASE_URL,
-            headers={"Authorization": f"Bearer {user.access_token}"},
-        ) as client:
-            while next:
-                if not all and yielded >= limit:
-                    break
+        next: str | None = f"{SpotifyAPIEndpoints.FollowedArtists}"
+        params: dict[str, str | int] | None = {
+            "type": "artist",
+            "limit": limit if limit <= 50 else 50,
+        }
 
-                params: dict[str, str | int] = {"limit": limit if limit <= 50 else 50}
+        if last is not None:
+            params["after"] = last  # type: ignore
 
-                if last is not None:
-                    params["after"] = last
-
-                response = client.get(url=next, params={"type": "artist", **params})
-                if response.is_error:
-                    self.handle_error(response)
-
-                resp = response.json()
+        while next:
+            if not all and yielded >= limit:
+                break
 
-                next = resp.get("artists", {}).get("next")
+            resp = self.fetch(next, user, params)
 
-                if next is not None:
-                    next = next.replace(f"{SpotifyAPIEndpoints.BASE_URL}/", "")
+            next, params = resp.get("artists", {}).get("next"), None
 
-                if not all:
-                    yielded += len(resp.get("artists", {}).get("items"))
+            if not all:
+                yielded += len(resp.get("artists", {}).get("items"))
 
-                logger.debug(
-                    f"Fetched {yielded} {resp.get("artists", {}).get("total")}"
-                )
+            logger.debug(f"Fetched {yielded} {resp.get("artists", {}).get("total")}")
 
-                yield from resp.get("artists", {}).get("items")
+            yield from resp.get("artists", {}).get("items")
 
     def _library_tracks(
         self, user: "AppUser", limit: int = 50, offset: int = 0, all: bool = False
     ) -> typing.Iterable[dict]:
         """Get the user's saved tracks."""
         yielded = 0
-        next = f"{SpotifyAPIEndpoints.SavedTracks}"
+        next: str | None = f"{SpotifyAPIEndpoints.SavedTracks}"
 
         if all:
             limit = 50
 
-        with httpx.Client(
-            base_url=SpotifyAPIEndpoints.BASE_URL,
-            headers={"Authorization": f"Bearer {user.access_token}"},
-        ) as client:
-            while next:
-                if not all and yielded >= limit:
-                    client.close()
-                    break
-
-                time.sleep(1)
+        params: dict | None = {"limit": limit if limit <= 50 else 50}
 
-                params = {"limit": limit if limit <= 50 else 50}
+        if offset > 0:
+            params["offset"] = offset  # type: ignore
 
-                if offset > 0:
-                    params["offset"] = offset
-
-                response = client.get(url=next, params=params)
-
-                if response.is_error:
-                    self.handle_error(response)
-
-                resp = response.json()
+        while next:
+            if not all and yielded >= limit:
+                break
 
-                next = resp.get("next")
+            resp = self.fetch(next, user, params)
 
-                if next is not None:
-                    next = next.replace(f"{SpotifyAPIEndpoints.BASE_URL}/", "")
+            next, params = resp.get("next"), None
+            items = resp.get("items") or []
 
-                yielded += len(resp.get("items"))
+            yielded += len(items)
 
-                logger.debug(f"Fetched {yielded} {resp.get("total")}")
+            logger.debug(f"Fetched {yielded} {resp.get("total")}")
 
-                yield from resp.get("items")
+            yield from items
 
-    def _library_playlist(self, user: "AppUser", playlist_id: str) -> dict:
+    def _library_playlist(
+        self,
+        user: "AppUser",
+        playlist_id: str,
+        fields: FieldProjection | None = None,
+        item_fields: FieldProjection | None = None,
+    ) -> dict:
         """Get the user's playlist.
 
         1. Get the playlist's metadata.
         2. Get the playlist's tracks (items).
         """
-        with httpx.Client(
-            base_url=SpotifyAPIEndpoints.BASE_URL,
-            headers={"Authorization": f"Bearer {user.access_token}"},
-        ) as client:
-            response = client.get(
-                url=SpotifyAPIEndpoints.Playlist.format(playlist_id=playlist_id)
-            )
-
-            if response.is_error:
-                self.handle_error(response)
+        playlist = self._library_playlist_metadata(user, playlist_id, fields)
 
-            time.sleep(0.5)
-
-            data = {
-                "playlist": response.json(),
-                "tracks": list(
-                    self._library_playlist_tracks(client, playlist_id),
+        data = {
+            "playlist": playlist,
+            "tracks": list(
+                self._library_playlist_tracks(
+                    user, playlist_id, playlist.get("snapshot_id"), item_fields
                 ),
-            }
-
-            return data
+            ),
+        }
+
+        return data
+
+    def _library_playlist_metadata(
+        self, user: "AppUser", playlist_id: str, fields: FieldProjection | None = None
+    ) -> dict:
+        """Get the playlist's metadata."""
+        return self.fetch(
+            SpotifyAPIEndpoints.Playlist.format(playlist_id=playlist_id),
+            user,
+            fields.params if fields else None,
+        )
 
     def _library_playlist_tracks(
-        self, client: httpx.Client, playlist_id: str
+        self,
+        user: "AppUser",
+        playlist_id: str,
+        snapshot_id: str | None = None,
+        fields: FieldProjection | None = None,
     ) -> typing.Iterable[dict]:
         """Get the playlist's tracks."""
-        next = f"{SpotifyAPIEndpoints.PlaylistTracks.format(playlist_id=playlist_id)}"
+        pages = self._library_playlist_pages(user, playlist_id, snapshot_id, fields)
 
-        while next:
-            response = client.get(url=next, params={"limit": 50})
+        for page in pages:
+            yield from page
 
-            if response.is_error:
-                self.handle_error(response)
+    def _library_playlist_pages(
+        self,
+        user: "AppUser",
+        playlist_id: str,
+        snapshot_id: str | None = None,
+        fields: FieldProjection | None = None,
+    ) -> typing.Iterable[list[dict]]:
+        """Get the playlist's tracks, a page at a time.
 
-            resp = response.json()
+        Pages are cached under the playlist's snapshot, when it's known.
+        """
+        next: str | None = SpotifyAPIEndpoints.PlaylistTracks.format(
+            playlist_id=playlist_id
+        )
+        # The projection is passed along with the next links as well.
+        projection = fields.page().params if fields else None
+        params: dict | None = {"limit": 50, **(projection or {})}
 
-            next = resp.get("next")
+        while next:
+            resp = self.fetch(next, user, params, version=snapshot_id)
 
-            if next is not None:
-                time.sleep(0.75)
+            next, params = resp.get("next"), projection
 
-            yield from resp.get("items")
+            yield resp.get("items", [])
 
     def _library_album(self, user: "AppUser", album_id: str) -> dict:
         """Get the user's album."""
-        response = httpx.get(
-            url=f"{SpotifyAPIEndpoints.BASE_URL}/{SpotifyAPIEndpoints.Album.format(album_id=album_id)}",
-            headers={"Authorization": f"Bearer {user.access_token}"},
-        )
-
-        if response.is_error:
-            self.handle_error(response)
-
-        return response.json()
+        return self.fetch(SpotifyAPIEndpoints.Album.format(album_id=album_id), user)
 
     def library_album(self, user_pk: int, album_id: str) -> dict:
         """Get the user's album."""
         user = self.get_user(user_pk)
 
         try:
-            return self._library_album(user=user, album_id=album_id)
-        except SpotifyExpiredTokenError:
-            self.auth_service.refresh_access_token(user.refresh_token)
-
-            user.refresh_from_db()
-
             return self._library_album(user=user, album_id=album_id)
         except Exception as e:
             logger.error(f"Request to get album {album_id} failed.")
@@ -4,15 +4,15 @@ Parking Lot:
 - TODO: Now playing
 """
 
-import json
+import datetime
 import typing
 
-import httpx
 from loguru import logger
 
 from api.libs.constants import SpotifyAPIEndpoints
-from api.libs.exceptions import SpotifyAPIError, SpotifyExpiredTokenError
 from api.services.spotify.auth import SpotifyAuthService
+from api.services.spotify.base import SpotifyService
+from api.services.spotify.transport import SpotifyTransport
 from core.models import AppUser
 
 logger.add(
@@ -25,47 +25,40 @@ logger.add(
 auth_service = SpotifyAuthService()
 
 
-class SpotifyPlaybackService:
+class SpotifyPlaybackService(SpotifyService):
     """API actions for fetching data from the Spotify API."""
 
-    def __init__(self, auth: SpotifyAuthService = auth_service) -> None:
-        """Initialize the service."""
-        self.auth_service = auth
-
-    def get_user(self, user_pk: int) -> "AppUser":
-        """Get a user by primary key."""
-        return AppUser.objects.get(pk=user_pk)
-
-    def handle_error(self, response: httpx.Response) -> None:
-        """Handle Spotify API errors."""
-        logger.error(f"Error: {response.text}")
-
-        error = json.loads(response.text).get("error")
+    page_size = 50
 
-        if (
-            error.get("status") == 401
-            and error.get("message") == "The access token expired"
-        ):
-            raise SpotifyExpiredTokenError("The access token expired")
-
-        raise SpotifyAPIError(response.text)
+    def __init__(
+        self,
+        auth: SpotifyAuthService = auth_service,
+        transport: SpotifyTransport | None = None,
+    ) -> None:
+        """Initialize the service."""
+        super().__init__(transport, auth)
 
     def recently_played(
-        self, user_pk: int, items: int = 10, all: bool = False
+        self,
+        user_pk: int,
+        items: int = 10,
+        all: bool = False,
+        after: datetime.datetime | None = None,
     ) -> typing.Iterable[dict]:
-        """Get the user's recently played track."""
+        """Get the user's recently played track.
+
+        With ``after``, only the tracks played after it are fetched.
+        """
         try:
             user = self.get_user(user_pk)
-            yield from self._recently_played(user, items, all)
+
+            if after is not None:
+                yield from self._recently_played_after(user, after)
+            else:
+                yield from self._recently_played(user, items, all)
         except AppUser.DoesNotExist:
             logger.error(f"User {user_pk} does not exist.")
             yield from []
-        except SpotifyExpiredTokenError:
-            logger.error(f"User {user_pk} has an expired token.")
-            self.auth_service.refresh_access_token(user.refresh_token)
-            user.refresh_from_db()
-
-            yield from self._recently_played(user, items, all)
 
     def now_playing(self) -> dict:
         """Get the user's currently playing track."""
@@ -76,30 +69,45 @@ class SpotifyPlaybackService:
     ) -> typing.Iterable[dict]:
         """Get the user's recently played track."""
         yielded = 0
-        next = f"{SpotifyAPIEndpoints.RecentlyPlayed}"
+        next: str | None = f"{SpotifyAPIEndpoints.RecentlyPlayed}"
+        params: dict | None = {"limit": 50 if all else min(items, 50)}
+
+        while next:
+            if not all and yielded >= items:
+                break
 
-        with httpx.Client(base_url=SpotifyAPIEndpoints.BASE_URL) as client:
-            while next:
-                if not all and yielded >= items:
-                    break
+            resp = self.fetch(next, user, params)
 
-                response = client.get(
-                    url=SpotifyAPIEndpoints.RecentlyPlayed,
-                    headers={"Authorization": f"Bearer {user.access_token}"},
-                    params={"limit": items},
-                )
+            # The next link carries its own limit & before cursor.
+            next, params = resp.get("next"), None
+            page = resp.get("items") or []
 
-                if response.is_error:
-                    self.handle_error(response)
+            if not all:
+                yielded += len(page)
+
+            yield from page
+
+    def _recently_played_after(
+        self, user: "AppUser", after: datetime.datetime
+    ) -> typing.Iterable[dict]:
+        """Get the tracks played after a point in time.
 
-                resp = response.json()
+        Pages are requested forward in time with the ``after`` cursor, so a
+        poll where nothing new was played costs one (empty) response.
+        """
+        cursor: str | None = str(int(after.timestamp() * 1000))
 
-                next = resp.get("next")
+        while cursor:
+            resp = self.fetch(
+                SpotifyAPIEndpoints.RecentlyPlayed,
+                user,
+                {"limit": self.page_size, "after": cursor},
+            )
+            page = resp.get("items") or []
 
-                if next is not None:
-                    next = next.replace(f"{SpotifyAPIEndpoints.BASE_URL}/", "")
+            yield from page
 
-                if not all:
-                    yielded += len(resp.get("items"))
+            if len(page) < self.page_size:
+                break
 
-                yield from resp.get("items")
+            cursor = (resp.get("cursors") or {}).get("after")
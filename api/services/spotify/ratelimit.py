@@ -0,0 +1,579 @@
+"""Client-side rate limiting for the Spotify API.
+
+Spotify doesn't publish a fixed quota; it answers with a ``429`` and a
+``Retry-After`` header once an app goes over its (rolling) budget. The
+limiter is an adaptive token bucket: it slowly raises its rate while
+responses are healthy, halves it on a ``429``, and holds every request
+until the ``Retry-After`` window has passed.
+
+``AdaptiveRateLimiter`` paces a single process. ``RedisRateLimiter`` keeps
+the buckets in Redis so every worker shares one app-wide budget, plus a
+sub-budget per user, and falls back to the local limiter when Redis is
+unreachable.
+"""
+
+import asyncio
+import dataclasses
+import email.utils
+import threading
+import time
+import typing
+
+import httpx
+import redis
+from loguru import logger
+
+from server import settings
+
+if typing.TYPE_CHECKING:
+    from redis.commands.core import Script
+
+
+@dataclasses.dataclass
+class RateLimiterState:
+    """Snapshot of a limiter, for logging & monitoring."""
+
+    rate: float
+    tokens: float
+    burst: int
+    blocked_for: float
+    requests: int
+    throttled: int
+
+    @property
+    def as_dict(self) -> dict:
+        """Return the dataclass as a dictionary."""
+        return dataclasses.asdict(self)
+
+
+def parse_retry_after(response: httpx.Response) -> float | None:
+    """Get the number of seconds to wait from a Retry-After header.
+
+    The header is either a number of seconds or an HTTP date.
+    """
+    value = response.headers.get("Retry-After")
+
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class AdaptiveRateLimiter:
+    """Thread-safe token bucket with an additive-increase/multiplicative-decrease rate.
+
+    Args:
+        rate: Initial number of requests per second.
+        min_rate: Floor for the rate after repeated 429s.
+        max_rate: Ceiling for the rate while responses are healthy.
+        burst: Bucket size, i.e. requests that can be sent back to back.
+        increase: Requests per second added after a healthy streak.
+        decrease: Factor the rate is multiplied by on a 429.
+        clock: Monotonic clock, injectable for tests.
+        sleep: Sleep function, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        rate: float = 5.0,
+        min_rate: float = 1.0,
+        max_rate: float = 20.0,
+        burst: int = 10,
+        increase: float = 0.5,
+        decrease: float = 0.5,
+        clock: typing.Callable[[], float] = time.monotonic,
+        sleep: typing.Callable[[float], None] = time.sleep,
+    ) -> None:
+        """Create a limiter with a full bucket."""
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.clock = clock
+        self.sleep = sleep
+
+        self._rate = min(max(rate, min_rate), max_rate)
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._streak = 0
+        self._requests = 0
+        self._throttled = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls: type["AdaptiveRateLimiter"]) -> "AdaptiveRateLimiter":
+        """Create a limiter from the SPOTIFY_RATE_LIMIT setting."""
+        config = settings.SPOTIFY_RATE_LIMIT
+
+        return cls(
+            rate=config["rate"],
+            min_rate=config["min_rate"],
+            max_rate=config["max_rate"],
+            burst=config["burst"],
+        )
+
+    @property
+    def rate(self) -> float:
+        """Current number of requests per second."""
+        return self._rate
+
+    @property
+    def state(self) -> RateLimiterState:
+        """Snapshot of the limiter."""
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+
+            return RateLimiterState(
+                rate=round(self._rate, 3),
+                tokens=round(self._tokens, 3),
+                burst=self.burst,
+                blocked_for=round(max(self._updated - now, 0.0), 3),
+                requests=self._requests,
+                throttled=self._throttled,
+            )
+
+    def _refill(self, now: float) -> None:
+        # While blocked by a Retry-After, _updated is in the future and
+        # the bucket doesn't refill.
+        if now > self._updated:
+            elapsed = now - self._updated
+            self._tokens = min(float(self.burst), self._tokens + elapsed * self._rate)
+            self._updated = now
+
+    def reserve(self, key: str | None = None) -> float:
+        """Take a token and return how long to wait before using it.
+
+        Args:
+            key: Ignored, per-user budgets are only kept by the shared limiter.
+        """
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            self._tokens -= 1
+            self._requests += 1
+
+            deficit = max(-self._tokens, 0.0)
+
+            return max(self._updated - now, 0.0) + deficit / self._rate
+
+    def acquire(self, key: str | None = None) -> float:
+        """Block until a request may be sent. Returns the time waited."""
+        wait = self.reserve(key)
+
+        if wait > 0:
+            self.sleep(wait)
+
+        return wait
+
+    async def areserve(self, key: str | None = None) -> float:
+        """Like ``reserve``, for the event loop. The bucket is in memory."""
+        return self.reserve(key)
+
+    def record(self, response: httpx.Response, key: str | None = None) -> float | None:
+        """Adapt the rate to a response.
+
+        Returns:
+            The number of seconds the API asked to wait, for a 429.
+        """
+        if response.status_code == httpx.codes.TOO_MANY_REQUESTS:
+            return self.throttle(parse_retry_after(response))
+
+        if response.status_code < 500:
+            self.recover()
+
+        return None
+
+    async def arecord(
+        self, response: httpx.Response, key: str | None = None
+    ) -> float | None:
+        """Like ``record``, for the event loop. The bucket is in memory."""
+        return self.record(response, key)
+
+    def recover(self) -> None:
+        """Speed up after roughly a second's worth of healthy responses."""
+        with self._lock:
+            self._streak += 1
+
+            if self._streak >= self._rate:
+                self._streak = 0
+                self._rate = min(self._rate + self.increase, self.max_rate)
+
+    def throttle(self, retry_after: float | None = None) -> float:
+        """Slow down and block until the Retry-After window has passed."""
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+
+            self._streak = 0
+            self._throttled += 1
+            self._rate = max(self._rate * self.decrease, self.min_rate)
+
+            wait = retry_after if retry_after is not None else 1 / self._rate
+
+            self._tokens = min(self._tokens, 0.0)
+            self._updated = max(self._updated, now + wait)
+
+        logger.warning(
+            f"Spotify API rate limit hit, waiting {wait:.2f}s "
+            f"(rate now {self._rate:.2f} req/s)."
+        )
+
+        return wait
+
+
+# Reserve a token from the app-wide bucket (whose rate creeps up with every
+# granted request) and, optionally, from a user's bucket. Buckets may go
+# negative: the returned wait is the caller's place in the queue.
+#
+# KEYS: app bucket, [user bucket]
+# ARGV: initial rate, min rate, max rate, burst, increase, user rate, user burst
+RESERVE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+
+local function take(key, rate, burst)
+    local bucket = redis.call('HMGET', key, 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or burst
+    local updated = tonumber(bucket[2]) or now
+
+    if now > updated then
+        tokens = math.min(burst, tokens + (now - updated) * rate)
+        updated = now
+    end
+
+    tokens = tokens - 1
+
+    redis.call('HSET', key, 'tokens', tokens, 'updated', updated)
+    redis.call('EXPIRE', key, 3600)
+
+    return (updated - now) + math.max(-tokens, 0) / rate
+end
+
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate')) or tonumber(ARGV[1])
+local wait = take(KEYS[1], rate, tonumber(ARGV[4]))
+
+rate = math.min(tonumber(ARGV[3]), rate + tonumber(ARGV[5]) / rate)
+redis.call('HSET', KEYS[1], 'rate', rate)
+redis.call('HINCRBY', KEYS[1], 'requests', 1)
+
+if #KEYS > 1 then
+    wait = math.max(wait, take(KEYS[2], tonumber(ARGV[6]), tonumber(ARGV[7])))
+end
+
+return tostring(wait)
+"""
+
+# Slow the app-wide bucket down and block it for the Retry-After window.
+#
+# KEYS: app bucket
+# ARGV: initial rate, min rate, burst, decrease, retry after (< 0 if unknown)
+THROTTLE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated', 'rate')
+local rate = tonumber(bucket[3]) or tonumber(ARGV[1])
+local tokens = tonumber(bucket[1]) or tonumber(ARGV[3])
+local updated = tonumber(bucket[2]) or now
+
+if now > updated then
+    tokens = math.min(tonumber(ARGV[3]), tokens + (now - updated) * rate)
+    updated = now
+end
+
+rate = math.max(tonumber(ARGV[2]), rate * tonumber(ARGV[4]))
+
+local wait = tonumber(ARGV[5])
+if wait < 0 then
+    wait = 1 / rate
+end
+
+redis.call(
+    'HSET', KEYS[1],
+    'tokens', math.min(tokens, 0),
+    'updated', math.max(updated, now + wait),
+    'rate', rate
+)
+redis.call('HINCRBY', KEYS[1], 'throttled', 1)
+redis.call('EXPIRE', KEYS[1], 3600)
+
+return tostring(wait)
+"""
+
+
+class RedisRateLimiter:
+    """Token buckets shared by every process through Redis.
+
+    Each request takes a token from the app-wide bucket and from the
+    bucket of the user it's made for, so one large library can't use up
+    the whole budget. The app-wide rate adapts like the local limiter's;
+    per-user rates are fixed.
+
+    When Redis can't be reached the limiter fails open to a local
+    ``AdaptiveRateLimiter`` and retries Redis after ``retry_interval``.
+
+    Args:
+        url: Redis connection URL.
+        rate: Initial app-wide requests per second.
+        min_rate: Floor for the app-wide rate.
+        max_rate: Ceiling for the app-wide rate.
+        burst: App-wide bucket size.
+        user_rate: Requests per second for a single user.
+        user_burst: Bucket size for a single user.
+        increase: Requests per second added per second's worth of requests.
+        decrease: Factor the app-wide rate is multiplied by on a 429.
+        prefix: Prefix for the Redis keys.
+        retry_interval: Seconds to use the local limiter after a Redis error.
+        sleep: Sleep function, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        rate: float = 5.0,
+        min_rate: float = 1.0,
+        max_rate: float = 20.0,
+        burst: int = 10,
+        user_rate: float = 5.0,
+        user_burst: int = 10,
+        increase: float = 0.5,
+        decrease: float = 0.5,
+        prefix: str = "spotify:ratelimit",
+        retry_interval: float = 30.0,
+        sleep: typing.Callable[[float], None] = time.sleep,
+    ) -> None:
+        """Configure the limiter, the connection is opened on first use."""
+        self.url = url
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.increase = increase
+        self.decrease = decrease
+        self.prefix = prefix
+        self.retry_interval = retry_interval
+        self.sleep = sleep
+
+        self.fallback = AdaptiveRateLimiter(
+            rate=rate,
+            min_rate=min_rate,
+            max_rate=max_rate,
+            burst=burst,
+            increase=increase,
+            decrease=decrease,
+            sleep=sleep,
+        )
+
+        self._client: redis.Redis | None = None
+        self._scripts: dict[str, Script] = {}
+        self._unavailable_until = 0.0
+
+    @classmethod
+    def from_settings(cls: type["RedisRateLimiter"]) -> "RedisRateLimiter":
+        """Create a limiter from the SPOTIFY_RATE_LIMIT setting."""
+        config = settings.SPOTIFY_RATE_LIMIT
+
+        return cls(
+            url=config["redis_url"],
+            rate=config["rate"],
+            min_rate=config["min_rate"],
+            max_rate=config["max_rate"],
+            burst=config["burst"],
+            user_rate=config["user_rate"],
+            user_burst=config["user_burst"],
+        )
+
+    @property
+    def client(self) -> redis.Redis:
+        """Redis client (redis-py reconnects after a fork)."""
+        if self._client is None:
+            client = redis.Redis.from_url(
+                self.url, socket_timeout=0.5, socket_connect_timeout=0.5
+            )
+
+            self._scripts = {
+                "reserve": client.register_script(RESERVE_SCRIPT),
+                "throttle": client.register_script(THROTTLE_SCRIPT),
+            }
+            self._client = client
+
+        return self._client
+
+    def script(self, name: str) -> "Script":
+        """Get one of the limiter's Lua scripts."""
+        if self._client is None:
+            _ = self.client
+
+        return self._scripts[name]
+
+    @property
+    def available(self) -> bool:
+        """Whether Redis should be tried."""
+        return time.monotonic() >= self._unavailable_until
+
+    @property
+    def app_key(self) -> str:
+        """Key of the app-wide bucket."""
+        return f"{self.prefix}:app"
+
+    def user_key(self, key: str) -> str:
+        """Key of a user's bucket."""
+        return f"{self.prefix}:user:{key}"
+
+    def _fail_open(self, exc: Exception) -> None:
+        logger.warning(
+            f"Shared rate limiter unavailable ({exc}), pacing locally for "
+            f"{self.retry_interval:.0f}s."
+        )
+
+        self._unavailable_until = time.monotonic() + self.retry_interval
+
+    def reserve(self, key: str | None = None) -> float:
+        """Take a token and return how long to wait before using it.
+
+        Args:
+            key: Identifies the user the request is made for.
+        """
+        if not self.available:
+            return self.fallback.reserve(key)
+
+        keys = [self.app_key] if key is None else [self.app_key, self.user_key(key)]
+
+        try:
+            wait = self.script("reserve")(
+                keys=keys,
+                args=[
+                    self.rate,
+                    self.min_rate,
+                    self.max_rate,
+                    self.burst,
+                    self.increase,
+                    self.user_rate,
+                    self.user_burst,
+                ],
+            )
+        except redis.RedisError as exc:
+            self._fail_open(exc)
+
+            return self.fallback.reserve(key)
+
+        return max(float(wait), 0.0)
+
+    def acquire(self, key: str | None = None) -> float:
+        """Block until a request may be sent. Returns the time waited."""
+        wait = self.reserve(key)
+
+        if wait > 0:
+            self.sleep(wait)
+
+        return wait
+
+    async def areserve(self, key: str | None = None) -> float:
+        """Like ``reserve``, with the Redis round trip off the event loop."""
+        if not self.available:
+            return self.fallback.reserve(key)
+
+        return await asyncio.to_thread(self.reserve, key)
+
+    def record(self, response: httpx.Response, key: str | None = None) -> float | None:
+        """Slow every worker down on a 429.
+
+        Returns:
+            The number of seconds the API asked to wait, for a 429.
+        """
+        if response.status_code != httpx.codes.TOO_MANY_REQUESTS:
+            return None
+
+        return self.throttle(parse_retry_after(response))
+
+    async def arecord(
+        self, response: httpx.Response, key: str | None = None
+    ) -> float | None:
+        """Like ``record``, with the Redis round trip off the event loop."""
+        if response.status_code != httpx.codes.TOO_MANY_REQUESTS:
+            return None
+
+        return await asyncio.to_thread(self.record, response, key)
+
+    def throttle(self, retry_after: float | None = None) -> float:
+        """Slow down and block every worker for the Retry-After window."""
+        if not self.available:
+            return self.fallback.throttle(retry_after)
+
+        try:
+            wait = float(
+                self.script("throttle")(
+                    keys=[self.app_key],
+                    args=[
+                        self.rate,
+                        self.min_rate,
+                        self.burst,
+                        self.decrease,
+                        -1 if retry_after is None else retry_after,
+                    ],
+                )
+            )
+        except redis.RedisError as exc:
+            self._fail_open(exc)
+
+            return self.fallback.throttle(retry_after)
+
+        logger.warning(f"Spotify API rate limit hit, all workers waiting {wait:.2f}s.")
+
+        return wait
+
+    @property
+    def state(self) -> RateLimiterState:
+        """Snapshot of the app-wide bucket."""
+        if not self.available:
+            return self.fallback.state
+
+        try:
+            seconds, microseconds = self.client.time()
+            bucket = self.client.hgetall(self.app_key)
+        except redis.RedisError as exc:
+            self._fail_open(exc)
+
+            return self.fallback.state
+
+        now = seconds + microseconds / 1_000_000
+        rate = float(bucket.get(b"rate", self.rate))
+        tokens = float(bucket.get(b"tokens", self.burst))
+        updated = float(bucket.get(b"updated", now))
+
+        if now > updated:
+            tokens = min(float(self.burst), tokens + (now - updated) * rate)
+
+        return RateLimiterState(
+            rate=round(rate, 3),
+            tokens=round(tokens, 3),
+            burst=self.burst,
+            blocked_for=round(max(updated - now, 0.0), 3),
+            requests=int(bucket.get(b"requests", 0)),
+            throttled=int(bucket.get(b"throttled", 0)),
+        )
+
+
+RateLimiter = AdaptiveRateLimiter | RedisRateLimiter
+
+
+def build_limiter() -> RateLimiter:
+    """Create the limiter selected by the SPOTIFY_RATE_LIMIT setting."""
+    if settings.SPOTIFY_RATE_LIMIT["backend"] == "redis":
+        return RedisRateLimiter.from_settings()
+
+    return AdaptiveRateLimiter.from_settings()
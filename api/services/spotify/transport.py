@@ -0,0 +1,250 @@
+"""Shared HTTP transport for the Spotify API.
+
+Every service routes its requests through a single, process-wide
+``httpx.Client`` so connections (and their TLS sessions) are kept alive
+and reused instead of being re-established for each request.
+
+The client is created lazily, once per process, which keeps it safe to
+import in Celery's prefork parent before the workers are forked.
+
+Requests are paced by a rate limiter; throttled (429) requests are
+retried once their Retry-After window has passed.
+"""
+
+import importlib.util
+import os
+import threading
+import typing
+from http import HTTPMethod
+
+import httpx
+from asgiref.sync import sync_to_async
+from loguru import logger
+
+from api.libs.constants import SpotifyAPIEndpoints
+from api.services.spotify.ratelimit import RateLimiter, build_limiter
+from server import settings
+
+if typing.TYPE_CHECKING:
+    from core.models import AppUser
+
+H2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+# Refreshes a user's token set in place. Takes the user and the token a
+# request was rejected with (if any), which is refreshed even if not expired.
+TokenRefresher = typing.Callable[["AppUser", str | None], typing.Any]
+
+
+def is_expired_token_response(response: httpx.Response) -> bool:
+    """Check whether the API rejected a request's access token as expired."""
+    return (
+        response.status_code == httpx.codes.UNAUTHORIZED
+        and "The access token expired" in response.text
+    )
+
+
+class BearerAuth(httpx.Auth):
+    """Attach a static access token to a request."""
+
+    def __init__(self, access_token: str) -> None:
+        """Create the auth flow from an access token."""
+        self.access_token = access_token
+
+    def auth_flow(
+        self, request: httpx.Request
+    ) -> typing.Generator[httpx.Request, httpx.Response, None]:
+        """Set the Authorization header."""
+        request.headers["Authorization"] = f"Bearer {self.access_token}"
+
+        yield request
+
+
+class SpotifyUserAuth(httpx.Auth):
+    """Attach a user's current access token to a request.
+
+    The token is read from the user when the request is sent, so a
+    token refreshed mid-sync is picked up by the following requests.
+
+    With a ``refresh`` callable, a token that is (about to be) expired is
+    refreshed before the request goes out, and a request rejected with an
+    expired token is refreshed & retried once.
+    """
+
+    def __init__(self, user: "AppUser", refresh: TokenRefresher | None = None) -> None:
+        """Create the auth flow for a user."""
+        self.user = user
+        self.refresh = refresh
+
+    def authorize(self, request: httpx.Request) -> httpx.Request:
+        """Set the Authorization header."""
+        request.headers["Authorization"] = f"Bearer {self.user.access_token}"
+
+        return request
+
+    def sync_auth_flow(
+        self, request: httpx.Request
+    ) -> typing.Generator[httpx.Request, httpx.Response, None]:
+        """Refresh the token when needed, then send the request."""
+        if self.refresh is not None and self.user.token_expired:
+            self.refresh(self.user, None)
+
+        token = self.user.access_token
+        response = yield self.authorize(request)
+
+        if self.refresh is None or response.status_code != httpx.codes.UNAUTHORIZED:
+            return
+
+        response.read()
+
+        if is_expired_token_response(response):
+            self.refresh(self.user, token)
+
+            yield self.authorize(request)
+
+    async def async_auth_flow(
+        self, request: httpx.Request
+    ) -> typing.AsyncGenerator[httpx.Request, httpx.Response]:
+        """Refresh the token (off the event loop) when needed, then send."""
+        refresh = sync_to_async(self.refresh) if self.refresh is not None else None
+
+        if refresh is not None and self.user.token_expired:
+            await refresh(self.user, None)
+
+        token = self.user.access_token
+        response = yield self.authorize(request)
+
+        if refresh is None or response.status_code != httpx.codes.UNAUTHORIZED:
+            return
+
+        await response.aread()
+
+        if is_expired_token_response(response):
+            await refresh(self.user, token)
+
+            yield self.authorize(request)
+
+
+class SpotifyTransport:
+    """Process-wide, pooled HTTP client for the Spotify Web API.
+
+    Relative URLs are resolved against the API's base URL; absolute URLs
+    (e.g. ``next`` links or the accounts service) are used as-is.
+    """
+
+    base_url: str
+    limits: httpx.Limits
+    timeout: httpx.Timeout
+    http2: bool
+    limiter: RateLimiter
+    max_retries: int
+    max_retry_after: float
+
+    def __init__(
+        self,
+        base_url: str = SpotifyAPIEndpoints.BASE_URL,
+        limits: httpx.Limits | None = None,
+        timeout: float | None = None,
+        http2: bool | None = None,
+        limiter: RateLimiter | None = None,
+    ) -> None:
+        """Configure the transport, the client itself is created lazily."""
+        self.base_url = base_url
+        self.limits = limits or httpx.Limits(**settings.SPOTIFY_HTTP_POOL)
+        self.timeout = httpx.Timeout(
+            timeout if timeout is not None else settings.SPOTIFY_HTTP_TIMEOUT
+        )
+        self.http2 = (settings.SPOTIFY_HTTP2 if http2 is None else http2) and (
+            H2_AVAILABLE
+        )
+        self.limiter = limiter or build_limiter()
+        self.max_retries = settings.SPOTIFY_RATE_LIMIT["max_retries"]
+        self.max_retry_after = settings.SPOTIFY_RATE_LIMIT["max_retry_after"]
+
+        self._client: httpx.Client | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.Client:
+        """The pooled client for the current process."""
+        pid = os.getpid()
+
+        if self._client is None or self._pid != pid:
+            with self._lock:
+                if self._client is None or self._pid != pid:
+                    self._client = self.build_client()
+                    self._pid = pid
+
+        return self._client
+
+    def build_client(self) -> httpx.Client:
+        """Create a new keep-alive client."""
+        return httpx.Client(
+            base_url=self.base_url,
+            limits=self.limits,
+            timeout=self.timeout,
+            http2=self.http2,
+        )
+
+    def request(
+        self,
+        method: str,
+        url: str | httpx.URL,
+        *,
+        user: "AppUser | None" = None,
+        access_token: str | None = None,
+        refresh: TokenRefresher | None = None,
+        **kwargs,
+    ) -> httpx.Response:
+        """Send a request, authenticated as a user or with a bare token.
+
+        A user's token is kept fresh with ``refresh``, when given.
+
+        Throttled requests are retried up to ``max_retries`` times, unless
+        the API asks to wait longer than ``max_retry_after`` seconds; the
+        429 response is then returned to the caller.
+        """
+        if user is not None:
+            kwargs.setdefault("auth", SpotifyUserAuth(user, refresh))
+        elif access_token is not None:
+            kwargs.setdefault("auth", BearerAuth(access_token))
+
+        key = str(user.pk) if user is not None else None
+        attempt = 0
+
+        while True:
+            self.limiter.acquire(key)
+
+            response = self.client.request(method, url, **kwargs)
+            retry_after = self.limiter.record(response, key)
+
+            if retry_after is None:
+                return response
+
+            if attempt >= self.max_retries or retry_after > self.max_retry_after:
+                logger.error(f"Giving up on throttled request to {response.url}.")
+
+                return response
+
+            attempt += 1
+
+    def get(self, url: str | httpx.URL, **kwargs) -> httpx.Response:
+        """Send a GET request."""
+        return self.request(HTTPMethod.GET, url, **kwargs)
+
+    def post(self, url: str | httpx.URL, **kwargs) -> httpx.Response:
+        """Send a POST request."""
+        return self.request(HTTPMethod.POST, url, **kwargs)
+
+    def close(self) -> None:
+        """Close the pooled client (a new one is created on next use)."""
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+
+            self._client = None
+            self._pid = None
+
+
+TRANSPORT = SpotifyTransport()
@@ -0,0 +1,816 @@
+import asyncio
+import datetime
+import threading
+import time
+import typing
+import unittest
+import uuid
+from unittest import mock
+
+import httpx
+import redis
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from faker import Faker
+
+from api.libs.exceptions import SpotifyAPIError, SpotifyExpiredTokenError
+from api.libs.fields import FieldProjection
+from api.libs.helpers import TestHelpers
+from api.models import Track, TrackFeatures
+from api.services.spotify.aio import AsyncSpotifyLibraryService, AsyncSpotifyTransport
+from api.services.spotify.auth import SpotifyAuthService
+from api.services.spotify.base import SpotifyService
+from api.services.spotify.cache import ResponseCache
+from api.services.spotify.coalesce import SingleFlight
+from api.services.spotify.data import SpotifyDataService
+from api.services.spotify.features import FeatureStore
+from api.services.spotify.library import SpotifyLibraryService
+from api.services.spotify.ratelimit import AdaptiveRateLimiter, RedisRateLimiter
+from api.services.spotify.transport import SpotifyTransport
+from core.models import AppUser
+from server import settings
+
+faker = Faker()
+
+
+class MockSpotifyTransport(SpotifyTransport):
+    """Transport backed by an in-memory handler instead of the network."""
+
+    def __init__(
+        self, handler: typing.Callable[[httpx.Request], httpx.Response], **kwargs
+    ) -> None:
+        super().__init__(**kwargs)
+
+        self.handler = handler
+
+    def build_client(self) -> httpx.Client:
+        return httpx.Client(
+            base_url=self.base_url,
+            transport=httpx.MockTransport(self.handler),
+        )
+
+
+class FakeClock:
+    """Monotonic clock that only moves when slept on."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.slept: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class AdaptiveRateLimiterTestCase(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def limiter(self, **kwargs) -> AdaptiveRateLimiter:
+        return AdaptiveRateLimiter(clock=self.clock, sleep=self.clock.sleep, **kwargs)
+
+    def test_burst_is_not_delayed(self):
+        limiter = self.limiter(rate=2, burst=3)
+
+        waits = [limiter.acquire() for _ in range(3)]
+
+        self.assertEqual(waits, [0, 0, 0])
+        self.assertEqual(self.clock.slept, [])
+
+    def test_requests_are_paced_once_bucket_is_empty(self):
+        limiter = self.limiter(rate=2, burst=1)
+
+        limiter.acquire()
+        limiter.acquire()
+        limiter.acquire()
+
+        self.assertEqual(self.clock.slept, [0.5, 0.5])
+
+    def test_rate_increases_while_healthy(self):
+        limiter = self.limiter(rate=2, max_rate=3, increase=1)
+
+        for _ in range(10):
+            limiter.record(httpx.Response(200))
+
+        self.assertEqual(limiter.rate, 3)
+
+    def test_throttle_honours_retry_after(self):
+        limiter = self.limiter(rate=4, burst=5)
+
+        wait = limiter.record(httpx.Response(429, headers={"Retry-After": "3"}))
+
+        self.assertEqual(wait, 3)
+        self.assertEqual(limiter.rate, 2)
+        self.assertEqual(limiter.state.blocked_for, 3)
+        self.assertEqual(limiter.state.throttled, 1)
+        self.assertAlmostEqual(limiter.acquire(), 3.5)
+
+    def test_rate_does_not_drop_below_minimum(self):
+        limiter = self.limiter(rate=2, min_rate=1)
+
+        for _ in range(3):
+            limiter.throttle(0)
+
+        self.assertEqual(limiter.rate, 1)
+
+
+def redis_available() -> bool:
+    try:
+        return redis.Redis.from_url(
+            settings.SPOTIFY_RATE_LIMIT["redis_url"], socket_connect_timeout=0.5
+        ).ping()
+    except redis.RedisError:
+        return False
+
+
+class RedisRateLimiterTestCase(TestCase):
+    def limiter(self, **kwargs) -> RedisRateLimiter:
+        limiter = RedisRateLimiter(
+            settings.SPOTIFY_RATE_LIMIT["redis_url"],
+            prefix=f"test:ratelimit:{uuid.uuid4()}",
+            sleep=lambda _: None,
+            **kwargs,
+        )
+
+        self.addCleanup(self.cleanup, limiter)
+
+        return limiter
+
+    def cleanup(self, limiter: RedisRateLimiter) -> None:
+        if limiter.available and limiter._client is not None:
+            keys = limiter.client.keys(f"{limiter.prefix}:*")
+
+            if keys:
+                limiter.client.delete(*keys)
+
+    def test_falls_back_to_local_limiter(self):
+        limiter = RedisRateLimiter("redis://localhost:1", retry_interval=60)
+
+        self.assertEqual(limiter.reserve("1"), 0)
+        self.assertFalse(limiter.available)
+        self.assertEqual(limiter.state.requests, 1)
+        self.assertEqual(limiter.fallback.state.requests, 1)
+
+    @unittest.skipUnless(redis_available(), "Redis is not available")
+    def test_budget_is_shared_between_limiters(self):
+        first = self.limiter(rate=2, burst=1)
+        second = RedisRateLimiter(first.url, rate=2, burst=1, prefix=first.prefix)
+
+        self.assertEqual(first.reserve(), 0)
+        self.assertGreater(second.reserve(), 0)
+        self.assertEqual(first.state.requests, 2)
+
+    @unittest.skipUnless(redis_available(), "Redis is not available")
+    def test_user_budget_is_enforced(self):
+        limiter = self.limiter(burst=10, user_rate=1, user_burst=1)
+
+        self.assertEqual(limiter.reserve("1"), 0)
+        self.assertGreater(limiter.reserve("1"), 0.5)
+        self.assertEqual(limiter.reserve("2"), 0)
+
+    @unittest.skipUnless(redis_available(), "Redis is not available")
+    def test_throttle_blocks_every_limiter(self):
+        first = self.limiter(rate=4)
+        second = RedisRateLimiter(first.url, rate=4, prefix=first.prefix)
+
+        first.record(httpx.Response(429, headers={"Retry-After": "5"}))
+
+        self.assertEqual(second.state.rate, 2)
+        self.assertEqual(second.state.throttled, 1)
+        self.assertGreater(second.reserve(), 4)
+
+
+class SpotifyTransportTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.token = faker.uuid4()
+        self.requests = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+
+        return httpx.Response(200, json={"items": [], "next": None})
+
+    def test_client_is_shared(self):
+        transport = MockSpotifyTransport(self.handler)
+
+        self.assertIs(transport.client, transport.client)
+
+        transport.close()
+
+        self.assertIsNone(transport._client)
+
+    def test_user_auth_is_injected(self):
+        transport = MockSpotifyTransport(self.handler)
+
+        transport.get("me/playlists", user=self.user)
+
+        request = self.requests[0]
+
+        self.assertEqual(
+            request.headers["Authorization"], f"Bearer {self.user.access_token}"
+        )
+        self.assertEqual(str(request.url), "https://api.spotify.com/v1/me/playlists")
+
+    def test_user_auth_reads_current_token(self):
+        transport = MockSpotifyTransport(self.handler)
+
+        transport.get("me", user=self.user)
+
+        self.user.access_token = faker.uuid4()
+
+        transport.get("me", user=self.user)
+
+        self.assertEqual(
+            self.requests[1].headers["Authorization"],
+            f"Bearer {self.user.access_token}",
+        )
+
+    def test_absolute_urls_are_used_as_is(self):
+        transport = MockSpotifyTransport(self.handler)
+        url = "https://api.spotify.com/v1/me/tracks?offset=50&limit=50"
+
+        transport.get(url, access_token=self.token)
+
+        self.assertEqual(str(self.requests[0].url), url)
+        self.assertEqual(
+            self.requests[0].headers["Authorization"], f"Bearer {self.token}"
+        )
+
+
+class SpotifyServiceTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+
+    @mock.patch.object(SpotifyAuthService, "refresh_access_token")
+    def test_fetch_raises_expired_token_error(self, mock_refresh: mock.MagicMock):
+        mock_refresh.return_value = self.user
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(
+                401,
+                json={"error": {"status": 401, "message": "The access token expired"}},
+            )
+
+        service = SpotifyService(MockSpotifyTransport(handler))
+
+        with self.assertRaises(SpotifyExpiredTokenError):
+            service.fetch("me", self.user)
+
+        mock_refresh.assert_called_once_with(self.user.refresh_token)
+
+    def test_fetch_raises_api_error_without_json_body(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(502, text="Bad Gateway")
+
+        service = SpotifyService(MockSpotifyTransport(handler))
+
+        with self.assertRaises(SpotifyAPIError):
+            service.fetch("me", self.user)
+
+
+class SpotifyTransportRetryTestCase(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = AdaptiveRateLimiter(clock=self.clock, sleep=self.clock.sleep)
+        self.token = faker.uuid4()
+        self.responses = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        return self.responses.pop(0)
+
+    def test_throttled_request_is_retried(self):
+        self.responses = [
+            httpx.Response(429, headers={"Retry-After": "2"}),
+            httpx.Response(200, json={}),
+        ]
+        transport = MockSpotifyTransport(self.handler, limiter=self.limiter)
+
+        response = transport.get("me", access_token=self.token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(self.clock.slept[0], 2)
+
+    def test_long_retry_after_is_not_waited_on(self):
+        self.responses = [httpx.Response(429, headers={"Retry-After": "3600"})]
+        transport = MockSpotifyTransport(self.handler, limiter=self.limiter)
+
+        response = transport.get("me", access_token=self.token)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.clock.slept, [])
+
+
+class MockAsyncSpotifyTransport(AsyncSpotifyTransport):
+    """Async transport backed by an in-memory handler."""
+
+    def __init__(
+        self,
+        handler: typing.Callable[
+            [httpx.Request], typing.Coroutine[None, None, httpx.Response]
+        ],
+    ) -> None:
+        super().__init__(
+            SpotifyTransport(limiter=AdaptiveRateLimiter(rate=1000, burst=1000))
+        )
+
+        self.mock = httpx.AsyncClient(
+            base_url=self.transport.base_url,
+            transport=httpx.MockTransport(handler),
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self.mock
+
+
+class AsyncSpotifyLibraryServiceTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.total = 230
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.offsets = []
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        offset = int(request.url.params["offset"])
+        limit = int(request.url.params["limit"])
+
+        self.offsets.append(offset)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        # Later pages answer first.
+        await asyncio.sleep(0.01 * (self.total - offset) / limit)
+
+        self.in_flight -= 1
+
+        items = [{"index": i} for i in range(offset, min(offset + limit, self.total))]
+
+        return httpx.Response(200, json={"items": items, "total": self.total})
+
+    async def test_all_pages_are_yielded_in_order(self):
+        service = AsyncSpotifyLibraryService(
+            transport=MockAsyncSpotifyTransport(self.handler), concurrency=3
+        )
+
+        items = [item async for item in service.library_tracks(self.user.pk, all=True)]
+
+        self.assertEqual([item["index"] for item in items], list(range(self.total)))
+        self.assertEqual(sorted(self.offsets), list(range(0, self.total, 50)))
+        self.assertLessEqual(self.max_in_flight, 3)
+        self.assertGreater(self.max_in_flight, 1)
+
+    async def test_limit_and_offset(self):
+        service = AsyncSpotifyLibraryService(
+            transport=MockAsyncSpotifyTransport(self.handler)
+        )
+
+        items = [
+            item
+            async for item in service.library_albums(self.user.pk, limit=20, offset=40)
+        ]
+
+        self.assertEqual([item["index"] for item in items], list(range(40, 60)))
+
+    async def test_shared_limiter_is_used_off_the_event_loop(self):
+        transport = MockAsyncSpotifyTransport(self.handler)
+        transport.transport.limiter = RedisRateLimiter("redis://localhost:1")
+        service = AsyncSpotifyLibraryService(transport=transport)
+        threads = []
+
+        def reserve(key: str | None = None) -> float:
+            threads.append(threading.get_ident())
+
+            return 0.0
+
+        with mock.patch.object(
+            transport.transport.limiter, "reserve", side_effect=reserve
+        ):
+            items = [
+                item async for item in service.library_tracks(self.user.pk, limit=100)
+            ]
+
+        self.assertEqual(len(items), 100)
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.get_ident(), threads)
+
+
+class TokenRefreshTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.stale, self.dead, self.fresh = faker.uuid4(), faker.uuid4(), faker.uuid4()
+        self.requests = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request.headers["Authorization"])
+
+        if request.headers["Authorization"] == f"Bearer {self.dead}":
+            return httpx.Response(
+                401,
+                json={"error": {"status": 401, "message": "The access token expired"}},
+            )
+
+        return httpx.Response(200, json={})
+
+    def refresh(self, user: AppUser, rejected_token: str | None) -> AppUser:
+        self.refreshed = (user.access_token, rejected_token)
+
+        user.access_token = self.fresh
+        user.token_expiry = timezone.now() + datetime.timedelta(hours=1)
+
+        return user
+
+    def test_expired_token_is_refreshed_before_sending(self):
+        self.user.access_token = self.stale
+        self.user.token_expiry = timezone.now() + datetime.timedelta(seconds=10)
+
+        transport = MockSpotifyTransport(self.handler)
+        transport.get("me", user=self.user, refresh=self.refresh)
+
+        self.assertEqual(self.requests, [f"Bearer {self.fresh}"])
+        self.assertEqual(self.refreshed, (self.stale, None))
+
+    def test_rejected_token_is_refreshed_and_retried(self):
+        self.user.access_token = self.dead
+
+        transport = MockSpotifyTransport(self.handler)
+        response = transport.get("me", user=self.user, refresh=self.refresh)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.requests, [f"Bearer {self.dead}", f"Bearer {self.fresh}"])
+        self.assertEqual(self.refreshed, (self.dead, self.dead))
+
+    @mock.patch.object(SpotifyAuthService, "refresh_access_token")
+    def test_fresh_token_is_not_refreshed(self, mock_refresh: mock.MagicMock):
+        SpotifyAuthService().ensure_fresh_token(self.user)
+
+        mock_refresh.assert_not_called()
+
+
+class SingleFlightTokenRefreshTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+
+        AppUser.objects.filter(pk=self.user.pk).update(
+            token_expiry=timezone.now() - datetime.timedelta(minutes=1)
+        )
+
+    def test_concurrent_refreshes_are_single_flighted(self):
+        fresh = faker.uuid4()
+        calls = []
+
+        def refresh_access_token(refresh_token: str) -> AppUser:
+            calls.append(refresh_token)
+            time.sleep(0.1)
+
+            user = AppUser.objects.get(refresh_token=refresh_token)
+            user.access_token = fresh
+            user.token_expiry = timezone.now() + datetime.timedelta(hours=1)
+            user.save()
+
+            return user
+
+        auth = SpotifyAuthService()
+        tokens = []
+
+        def worker() -> None:
+            try:
+                user = AppUser.objects.get(pk=self.user.pk)
+                tokens.append(auth.ensure_fresh_token(user).access_token)
+            finally:
+                connection.close()
+
+        with mock.patch.object(
+            auth, "refresh_access_token", side_effect=refresh_access_token
+        ):
+            threads = [threading.Thread(target=worker) for _ in range(5)]
+
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(tokens, [fresh] * 5)
+
+
+class ResponseCacheTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.etag = f'"{faker.uuid4()}"'
+        self.requests = []
+        self.cache = ResponseCache(alias="default", ttl=30)
+        self.cache.backend.clear()
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+
+        if request.headers.get("If-None-Match") == self.etag:
+            return httpx.Response(304)
+
+        return httpx.Response(
+            200, json={"snapshot_id": "abc", "items": []}, headers={"ETag": self.etag}
+        )
+
+    def test_fresh_response_is_served_from_cache(self):
+        service = SpotifyService(MockSpotifyTransport(self.handler), cache=self.cache)
+
+        first = service.fetch("playlists/1", self.user)
+        second = service.fetch("playlists/1", self.user)
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.requests), 1)
+
+    def test_stale_response_is_revalidated(self):
+        service = SpotifyService(MockSpotifyTransport(self.handler), cache=self.cache)
+
+        service.fetch("playlists/1", self.user)
+
+        key = self.cache.key(self.user, "playlists/1")
+        entry = self.cache.get(key)
+        entry.stored_at -= 60
+        self.cache.set(key, entry)
+
+        body = service.fetch("playlists/1", self.user)
+
+        self.assertEqual(body["snapshot_id"], "abc")
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(self.requests[1].headers["If-None-Match"], self.etag)
+        self.assertTrue(self.cache.is_fresh(self.cache.get(key)))
+
+    def test_versioned_response_does_not_expire(self):
+        service = SpotifyService(
+            MockSpotifyTransport(self.handler), cache=ResponseCache("default", ttl=0)
+        )
+
+        service.fetch("playlists/1/tracks", self.user, version="abc")
+        service.fetch("playlists/1/tracks", self.user, version="abc")
+        service.fetch("playlists/1/tracks", self.user, version="def")
+
+        self.assertEqual(len(self.requests), 2)
+
+    def test_params_are_part_of_the_key(self):
+        service = SpotifyService(MockSpotifyTransport(self.handler), cache=self.cache)
+
+        service.fetch("me/tracks", self.user, {"offset": 0})
+        service.fetch("me/tracks", self.user, {"offset": 50})
+
+        self.assertEqual(len(self.requests), 2)
+
+
+class SingleFlightTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.requests = []
+        self.release = threading.Event()
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        self.release.wait(timeout=5)
+
+        return httpx.Response(200, json={"total": 3, "items": []})
+
+    def fetch_concurrently(
+        self, service: SpotifyService, calls: list[tuple[str, dict]]
+    ) -> list[dict]:
+        results: list[dict] = [{}] * len(calls)
+
+        def run(i: int, url: str, params: dict) -> None:
+            results[i] = service.fetch(url, self.user, params)
+
+        threads = [
+            threading.Thread(target=run, args=(i, *call))
+            for i, call in enumerate(calls)
+        ]
+
+        for thread in threads:
+            thread.start()
+
+        flight = service.single_flight
+
+        while sum(c.waiters + 1 for c in list(flight._calls.values())) < len(calls):
+            time.sleep(0.01)
+
+        self.release.set()
+
+        for thread in threads:
+            thread.join()
+
+        return results
+
+    def test_identical_calls_share_one_request(self):
+        service = SpotifyService(MockSpotifyTransport(self.handler))
+        service.single_flight = SingleFlight()
+
+        results = self.fetch_concurrently(service, [("me/playlists", {"limit": 1})] * 5)
+
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(results, [{"total": 3, "items": []}] * 5)
+        self.assertEqual(len({id(r) for r in results}), 5)
+
+    def test_different_calls_are_not_coalesced(self):
+        service = SpotifyService(MockSpotifyTransport(self.handler))
+        service.single_flight = SingleFlight()
+
+        self.fetch_concurrently(
+            service, [("me/playlists", {"limit": 1}), ("me/tracks", {"limit": 1})]
+        )
+
+        self.assertEqual(len(self.requests), 2)
+
+    def test_error_is_shared_with_waiters(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        def fail() -> None:
+            started.set()
+            self.release.wait(timeout=5)
+
+            raise SpotifyAPIError("Bad Gateway")
+
+        def call(fn: typing.Callable[[], None]) -> None:
+            try:
+                flight.do("key", fn)
+            except SpotifyAPIError as exc:
+                errors.append(exc)
+
+        leader = threading.Thread(target=call, args=(fail,))
+        leader.start()
+        started.wait(timeout=5)
+
+        waiter = threading.Thread(target=call, args=(lambda: None,))
+        waiter.start()
+
+        while flight._calls["key"].waiters == 0:
+            time.sleep(0.01)
+
+        self.release.set()
+        leader.join()
+        waiter.join()
+
+        self.assertEqual(len(errors), 2)
+        self.assertIs(errors[0], errors[1])
+
+
+def audio_features(spotify_id: str) -> dict:
+    return {
+        "id": spotify_id,
+        "danceability": 0.5,
+        "energy": 0.5,
+        "key": 1,
+        "loudness": -5.0,
+        "mode": 1,
+        "speechiness": 0.1,
+        "acousticness": 0.1,
+        "instrumentalness": 0.0,
+        "liveness": 0.1,
+        "valence": 0.5,
+        "tempo": 120.0,
+        "duration_ms": 200000,
+        "time_signature": 4,
+    }
+
+
+class FeatureStoreTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.requests = []
+
+        for spotify_id in ("stored", "fetched"):
+            Track.objects.create(spotify_id=spotify_id, name=spotify_id, duration=1)
+
+        feature_data = audio_features("stored")
+        feature_data.pop("id")
+        TrackFeatures.objects.create(
+            track=Track.objects.get(spotify_id="stored"), **feature_data
+        )
+
+        data = SpotifyDataService(
+            auth=SpotifyAuthService(),
+            transport=MockSpotifyTransport(self.handler),
+        )
+        self.store = FeatureStore(data=data, alias="default", maxsize=10)
+        self.store.backend.clear()
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        ids = request.url.params["ids"].split(",")
+
+        return httpx.Response(
+            200, json={"audio_features": [audio_features(i) for i in ids]}
+        )
+
+    def test_only_missing_features_are_fetched(self):
+        features = self.store.audio_features(["stored", "fetched"], self.user.pk)
+
+        self.assertEqual([f["id"] for f in features], ["stored", "fetched"])
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.requests[0].url.params["ids"], "fetched")
+
+    def test_known_features_are_not_fetched_again(self):
+        self.store.audio_features(["stored", "fetched"], self.user.pk)
+        self.store.memory.clear()
+
+        with self.assertNumQueries(0):
+            features = self.store.audio_features(["fetched", "stored"], self.user.pk)
+
+        self.assertEqual([f["id"] for f in features], ["fetched", "stored"])
+        self.assertEqual(len(self.requests), 1)
+
+    def test_missing_features_are_fetched_in_batches(self):
+        track_ids = [f"track-{i}" for i in range(250)]
+
+        features = self.store.audio_features(track_ids, self.user.pk)
+
+        self.assertEqual(len(features), 250)
+        self.assertEqual(
+            [len(r.url.params["ids"].split(",")) for r in self.requests],
+            [100, 100, 50],
+        )
+        self.assertEqual(len(self.store.memory), 10)
+
+
+class LibraryPlaylistSnapshotTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.requests = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+
+        return httpx.Response(200, json={"snapshot_id": "abc"})
+
+    def test_snapshot_is_fetched_without_items(self):
+        library = SpotifyLibraryService(transport=MockSpotifyTransport(self.handler))
+
+        snapshot_id = library.library_playlist_snapshot(self.user.pk, "playlist")
+
+        self.assertEqual(snapshot_id, "abc")
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.requests[0].url.path, "/v1/playlists/playlist")
+        self.assertEqual(self.requests[0].url.params["fields"], "snapshot_id")
+
+
+class FieldProjectionTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.requests = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+
+        if request.url.path.endswith("/tracks"):
+            offset = int(request.url.params.get("offset", 0))
+            next_url = (
+                f"https://api.spotify.com/v1/playlists/p/tracks?offset={offset + 50}"
+                if offset == 0
+                else None
+            )
+
+            return httpx.Response(200, json={"items": [{}], "next": next_url})
+
+        return httpx.Response(200, json={"id": "p", "snapshot_id": "abc"})
+
+    def test_projection_is_rendered(self):
+        projection = FieldProjection(
+            "id", album=("id", "name"), artists=FieldProjection("id")
+        )
+
+        self.assertEqual(str(projection), "id,album(id,name),artists(id)")
+        self.assertEqual(
+            str(projection.page()),
+            "next,total,offset,limit,items(id,album(id,name),artists(id))",
+        )
+
+    def test_projections_are_merged(self):
+        merged = FieldProjection("id", album=("id",)) | FieldProjection(
+            "name", album=("name",)
+        )
+
+        self.assertEqual(str(merged), "id,name,album(id,name)")
+        self.assertEqual(
+            str(FieldProjection("album") | FieldProjection(album=("id",))), "album"
+        )
+
+    def test_playlist_requests_carry_projections(self):
+        library = SpotifyLibraryService(transport=MockSpotifyTransport(self.handler))
+        fields = FieldProjection("id", "snapshot_id")
+        item_fields = FieldProjection(track=("id",))
+
+        data = library.library_playlist(
+            self.user.pk, "p", fields=fields, item_fields=item_fields
+        )
+
+        self.assertEqual(len(data["tracks"]), 2)
+        self.assertEqual(
+            [r.url.params["fields"] for r in self.requests],
+            [str(fields), str(item_fields.page()), str(item_fields.page())],
+        )
+        self.assertEqual(self.requests[2].url.params["offset"], "50")
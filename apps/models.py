@@ -1,6 +1,7 @@
 """Spotify data access models."""
 
 import datetime
+import typing
 import uuid
 
 import pytz
@@ -9,6 +10,7 @@ from django_stubs_ext.db.models import TypedModelMeta
 from pydantic import BaseModel
 
 from api.models import Album, Artist, Track
+from api.serializers import validation
 
 
 class ListeningHistorySerializer(BaseModel):
@@ -47,6 +49,7 @@ class ListeningHistorySerializer(BaseModel):
         name: str
         release_date: str
         image_url: str | None
+        album_type: str = ""
 
         @classmethod
         def from_api(
@@ -58,6 +61,7 @@ class ListeningHistorySerializer(BaseModel):
                 name=item["name"],
                 release_date=item["release_date"].split("-")[0],
                 image_url=item["images"][0]["url"] if item.get("images") else None,
+                album_type=item.get("album_type", ""),
             )
 
         @classmethod
@@ -70,6 +74,7 @@ class ListeningHistorySerializer(BaseModel):
                 name=data.name,
                 release_date=str(data.release_year),
                 image_url=data.image_url,
+                album_type=data.album_type,
             )
 
     class NestedTrack(BaseModel):
@@ -169,70 +174,83 @@ class ListeningHistoryManager(models.Manager["ListeningHistory"]):
 
         return qs.get(pk=pk)
 
-    def create_artist(self, artist: ListeningHistorySerializer.NestedArtist) -> Artist:
-        """Create an artist."""
-        obj, _ = Artist.objects.update_or_create(
-            spotify_id=artist.spotify_id,
-            defaults={"name": artist.name},
+    def with_catalog(self) -> models.QuerySet["ListeningHistory"]:
+        """History records, with their track, album & artist data."""
+        return self.select_related("track", "track__album").prefetch_related(
+            "track__album__artists"
         )
 
-        return obj
-
-    def create_album(self, album: ListeningHistorySerializer.NestedAlbum) -> Album:
-        """Create an album."""
-        obj, _ = Album.objects.update_or_create(
-            spotify_id=album.spotify_id,
-            defaults={
-                "name": album.name,
-                "image_url": album.image_url,
-                "release_year": album.release_date,
-            },
+    def recent(self, user_pk: int, limit: int) -> list["ListeningHistory"]:
+        """The user's latest history records."""
+        return list(
+            self.with_catalog().filter(user_id=user_pk).order_by("-played_at")[:limit]
         )
 
-        return obj
+    def watermark(self, user_pk: int) -> datetime.datetime | None:
+        """When the user's latest recorded play happened."""
+        return self.filter(user_id=user_pk).aggregate(models.Max("played_at"))[
+            "played_at__max"
+        ]
 
-    def create_track(self, track: ListeningHistorySerializer.NestedTrack) -> Track:
-        """Create a track."""
-        obj, _ = Track.objects.update_or_create(
-            spotify_id=track.spotify_id,
-            defaults={
-                "name": track.name,
-                "duration": track.duration,
-            },
-        )
-
-        return obj
-
-    def build(
-        self,
-        serialized: "ListeningHistorySerializer",
-        user_pk: int,
-        *args,
-        **kwargs,
-    ) -> "ListeningHistory":
-        """Create a history record.
+    def ingest(
+        self, serialized: typing.Iterable["ListeningHistorySerializer"], user_pk: int
+    ) -> list["ListeningHistory"]:
+        """Create the history records of a page of recently played items.
 
-        Also creates the track, album, and artist records if they don't exist.
+        The tracks, albums & artists are upserted in bulk, then the history
+        records are inserted with a single statement, skipping plays that
+        are already recorded. Returns the records that were inserted.
         """
-        track = self.create_track(serialized.track)
-        history_item, _ = self.model.objects.get_or_create(
-            user_id=user_pk,
-            track=track,
-            played_at=datetime.datetime.strptime(
-                serialized.played_at, "%Y-%m-%dT%H:%M:%S.%fZ"
-            ).replace(tzinfo=pytz.UTC),
+        items = list(serialized)
+        synced = Track.sync.do(
+            [
+                validation.SyncTrackData(
+                    track=validation.SyncTrack(
+                        name=item.track.name,
+                        spotify_id=item.track.spotify_id,
+                        duration=item.track.duration,
+                        album_id=item.album.spotify_id,
+                    ),
+                    album=validation.SyncTrackAlbum(
+                        name=item.album.name,
+                        spotify_id=item.album.spotify_id,
+                        image_url=item.album.image_url or "",
+                        artist_ids=[artist.spotify_id for artist in item.artists],
+                        album_type=item.album.album_type,
+                        release_year=int(item.album.release_date),
+                    ),
+                    artists=[
+                        validation.SyncTrackArtist(
+                            spotify_id=artist.spotify_id, name=artist.name
+                        )
+                        for artist in item.artists
+                    ],
+                )
+                for item in items
+            ]
+        )
+        track_pks = {spotify_id: track_pk for track_pk, spotify_id in synced}
+
+        # Primary keys are generated here, so the records that weren't
+        # skipped as conflicts can be read back.
+        records = self.bulk_create(
+            [
+                self.model(
+                    id=uuid.uuid4(),
+                    user_id=user_pk,
+                    track_id=track_pks[item.track.spotify_id],
+                    played_at=datetime.datetime.strptime(
+                        item.played_at, "%Y-%m-%dT%H:%M:%S.%fZ"
+                    ).replace(tzinfo=pytz.UTC),
+                )
+                for item in items
+            ],
+            ignore_conflicts=True,
         )
 
-        album = self.create_album(serialized.album)
-        for artist_obj in serialized.artists:
-            artist = self.create_artist(artist_obj)
-            album.artists.add(artist)
-            artist.save()
-
-        album.tracks.add(history_item.track)
-        album.save()
-
-        return history_item
+        return list(
+            self.with_catalog().filter(pk__in=[record.pk for record in records])
+        )
 
 
 class ListeningHistory(models.Model):
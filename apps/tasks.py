@@ -0,0 +1,46 @@
+"""Listening history polling tasks."""
+
+from celery import shared_task
+from loguru import logger
+
+from api.services.spotify import PLAYBACK
+from apps.models import ListeningHistory, ListeningHistorySerializer
+from core.models import AppUser
+
+
+@shared_task
+def poll_recently_played(user_id: int) -> int:
+    """Record the tracks a user played since the last poll.
+
+    Only the plays after the user's latest recorded play are requested, the
+    first poll records the latest page. Returns the number of new records.
+    """
+    after = ListeningHistory.history.watermark(user_id)
+    items = (
+        PLAYBACK.recently_played(user_id, after=after)
+        if after is not None
+        else PLAYBACK.recently_played(user_id, PLAYBACK.page_size)
+    )
+
+    records = ListeningHistory.history.ingest(
+        (ListeningHistorySerializer.from_api(item) for item in items), user_id
+    )
+
+    logger.info(f"Recorded {len(records)} plays for user {user_id} (after {after}).")
+
+    return len(records)
+
+
+@shared_task
+def poll_listening_history() -> int:
+    """Schedule a recently played poll for every active user."""
+    user_ids = list(
+        AppUser.objects.filter(is_active=True)
+        .exclude(refresh_token="")
+        .values_list("pk", flat=True)
+    )
+
+    for user_id in user_ids:
+        poll_recently_played.s(user_id).apply_async()
+
+    return len(user_ids)
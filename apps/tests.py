@@ -1,18 +1,23 @@
 import logging
 from unittest import mock
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from api.libs.helpers import (
     SpotifyPlaybackServiceMock,
     TestHelpers,
+    open_fixture_file,
 )
 from api.models import Album, Artist, Track
 from api.services.spotify import (
+    PLAYBACK,
     SpotifyPlaybackService,
 )
-from apps.models import ListeningHistory
+from apps.models import ListeningHistory, ListeningHistorySerializer
+from apps.tasks import poll_listening_history, poll_recently_played
 from core.serializers import TokenSerializer
 
 logging.disable(logging.ERROR)
@@ -41,3 +46,107 @@ class ListeningHistoryViewTestCase(TestCase):
         self.assertGreaterEqual(Track.objects.count(), 1)
         self.assertGreaterEqual(Artist.objects.count(), 1)
         self.assertGreaterEqual(Album.objects.count(), 1)
+
+    @mock.patch.object(SpotifyPlaybackService, "recently_played")
+    def test_post_recently_played(self, mock_get_recently_played: mock.MagicMock):
+        mock_get_recently_played.return_value = (
+            SpotifyPlaybackServiceMock.recently_played()
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                f"{reverse('listening-history')}?limit=50",
+                headers={"Authorization": f"Bearer {self.jwt}"},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json().get("data")), 10)
+        self.assertEqual(ListeningHistory.objects.count(), 10)
+        self.assertLess(len(queries), 20)
+
+
+class ListeningHistoryManagerTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.items = [
+            ListeningHistorySerializer.from_api(item)
+            for item in SpotifyPlaybackServiceMock.recently_played()
+        ]
+
+    def test_ingest(self):
+        records = ListeningHistory.history.ingest(self.items, self.user.pk)
+
+        self.assertEqual(len(records), len(self.items))
+        self.assertEqual(
+            {(r.track.spotify_id, r.played_at) for r in records},
+            {(r.track.spotify_id, r.played_at) for r in self.history()},
+        )
+
+    def test_ingest_skips_recorded_plays(self):
+        ListeningHistory.history.ingest(self.items[:4], self.user.pk)
+
+        records = ListeningHistory.history.ingest(self.items, self.user.pk)
+
+        self.assertEqual(len(records), len(self.items) - 4)
+        self.assertEqual(ListeningHistory.objects.count(), len(self.items))
+
+    def test_ingest_constant_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            ListeningHistory.history.ingest(self.items[:2], self.user.pk)
+
+        with self.assertNumQueries(len(queries)):
+            ListeningHistory.history.ingest(self.items[2:], self.user.pk)
+
+    def history(self) -> list[ListeningHistory]:
+        return list(ListeningHistory.objects.select_related("track"))
+
+
+class PollRecentlyPlayedTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.page = open_fixture_file("playback__recently_played.json")
+
+    @mock.patch.object(SpotifyPlaybackService, "fetch")
+    def test_first_poll_records_latest_page(self, mock_fetch: mock.MagicMock):
+        mock_fetch.return_value = {**self.page, "next": None}
+
+        self.assertEqual(poll_recently_played(self.user.pk), 10)
+
+        mock_fetch.assert_called_once()
+        self.assertEqual(mock_fetch.call_args.args[2], {"limit": 50})
+
+    @mock.patch.object(SpotifyPlaybackService, "fetch")
+    def test_poll_after_watermark(self, mock_fetch: mock.MagicMock):
+        ListeningHistory.history.ingest(
+            [ListeningHistorySerializer.from_api(i) for i in self.page["items"]],
+            self.user.pk,
+        )
+        mock_fetch.return_value = {"items": [], "next": None, "cursors": None}
+
+        watermark = ListeningHistory.objects.latest("played_at").played_at
+
+        self.assertEqual(poll_recently_played(self.user.pk), 0)
+
+        mock_fetch.assert_called_once()
+        self.assertEqual(
+            mock_fetch.call_args.args[2],
+            {"limit": 50, "after": str(int(watermark.timestamp() * 1000))},
+        )
+
+    @mock.patch.object(SpotifyPlaybackService, "fetch")
+    def test_recently_played_follows_next(self, mock_fetch: mock.MagicMock):
+        next_url = self.page["next"]
+        mock_fetch.side_effect = [self.page, {**self.page, "next": None}]
+
+        items = list(PLAYBACK.recently_played(self.user.pk, 20))
+
+        self.assertEqual(len(items), 20)
+        self.assertEqual(mock_fetch.call_args.args[0], next_url)
+        self.assertIsNone(mock_fetch.call_args.args[2])
+
+    @mock.patch("apps.tasks.poll_recently_played.s")
+    def test_poll_listening_history(self, mock_poll: mock.MagicMock):
+        self.assertEqual(poll_listening_history(), 1)
+
+        mock_poll.assert_called_once_with(self.user.pk)
+        mock_poll.return_value.apply_async.assert_called_once()
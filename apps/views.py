@@ -52,24 +52,29 @@ class ListeningHistoryView(GetUserMixin, APIView):
         self._playback = playback
 
     def serialize(
-        self, items: typing.Iterable[dict], user_pk: int
+        self, items: typing.Iterable[dict], user_pk: int, limit: int
     ) -> list["ListeningHistorySerializer"]:
         """Serialize the data.
 
         Before saving the data to the database, we need to
-        validate the data and build a ListeningHistory object.
+        validate the data and build the ListeningHistory objects,
+        which are written in bulk. The user's latest ``limit``
+        records are returned.
         """
-        for item in items:
-            record = ListeningHistorySerializer.from_api(item)
-            obj = ListeningHistory.history.build(record, user_pk)
+        ListeningHistory.history.ingest(
+            (ListeningHistorySerializer.from_api(item) for item in items), user_pk
+        )
 
-        return [ListeningHistorySerializer.from_db(obj)]
+        return [
+            ListeningHistorySerializer.from_db(obj)
+            for obj in ListeningHistory.history.recent(user_pk, limit)
+        ]
 
     def get(self, request: Request) -> Response:
         """Get the user's listening history."""
         user = self.get_user(request)
         items = self._playback.recently_played(user.pk, 1)
-        data = self.serialize(items, user.pk)
+        data = self.serialize(items, user.pk, 1)
 
         return Response({"data": data[0].model_dump()})
 
@@ -80,7 +85,7 @@ class ListeningHistoryView(GetUserMixin, APIView):
         """
         user = self.get_user(request)
         items = self._playback.recently_played(user.pk, 5)
-        data = self.serialize(items, user.pk)
+        data = self.serialize(items, user.pk, 5)
 
         return Response({"data": [item.model_dump() for item in data]})
 
@@ -89,10 +94,10 @@ class ListeningHistoryView(GetUserMixin, APIView):
 
         It also syncs a larger batch of data.
         """
-        limit = request.query_params.get("limit", 50)
+        limit = int(request.query_params.get("limit", 50))
         user = self.get_user(request)
-        items = self._playback.recently_played(user.pk, int(limit))
-        data = self.serialize(items, user.pk)
+        items = self._playback.recently_played(user.pk, limit)
+        data = self.serialize(items, user.pk, limit)
 
         return Response({"data": [item.model_dump() for item in data]})
 
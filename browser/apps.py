@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BrowserConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "browser"
+
+    def ready(self) -> None:
+        """Ensure signals are connected when the app is ready."""
+        from browser import signals  # noqa: F401
@@ -63,25 +63,19 @@ class PlaylistFilterSet(FilterSet):
         self, qs: models.QuerySet, value: int, *args, **kwargs
     ) -> models.QuerySet:
         """Filter by number of tracks."""
-        return qs.annotate(num_tracks=models.Count("tracks")).filter(
-            num_tracks__gte=value
-        )
+        return qs.filter(num_tracks__gte=value)
 
     def filter_num_tracks_gt(
         self, qs: models.QuerySet, value: int, *args, **kwargs
     ) -> models.QuerySet:
         """Filter by number of tracks greater than."""
-        return qs.annotate(num_tracks=models.Count("tracks")).filter(
-            num_tracks__gt=value
-        )
+        return qs.filter(num_tracks__gt=value)
 
     def filter_num_tracks_lt(
         self, qs: models.QuerySet, value: int, *args, **kwargs
     ) -> models.QuerySet:
         """Filter by number of tracks less than."""
-        return qs.annotate(num_tracks=models.Count("tracks")).filter(
-            num_tracks__lt=value
-        )
+        return qs.filter(num_tracks__lt=value)
 
     def filter_track_name(
         self, qs: models.QuerySet, value: str, *args, **kwargs
@@ -191,11 +185,7 @@ class AlbumFilterSet(FilterSet):
     def get_queryset(self, request: Request, *args, **kwargs) -> models.QuerySet:
         """Access initial queryset."""
         user = self.get_user(request)
-        return (
-            self.Meta.default_queryset.filter(libraries__user=user)
-            .prefetch_related("artists")
-            .prefetch_related("genres")
-        )
+        return self.Meta.default_queryset.filter(libraries__user=user)
 
     class Meta(FilterMeta):
         """Meta options."""
@@ -0,0 +1,22 @@
+"""Generated by Django 5.1.15 on 2026-10-18 02:25."""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("browser", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="library",
+            name="albums_saved_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="library",
+            name="tracks_saved_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+"""Generated by Django 5.1.15 on 2026-10-18 02:36."""
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("browser", "0002_library_saved_watermarks"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LibraryStats",
+            fields=[
+                (
+                    "library",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="browser.library",
+                    ),
+                ),
+                ("playlists_synced", models.PositiveIntegerField(default=0)),
+                ("playlists_analyzed", models.PositiveIntegerField(default=0)),
+                ("playlist_tracks", models.PositiveIntegerField(default=0)),
+                ("playlist_tracks_synced", models.PositiveIntegerField(default=0)),
+                ("playlist_tracks_analyzed", models.PositiveIntegerField(default=0)),
+                ("playlist_tracks_unanalyzed", models.PositiveIntegerField(default=0)),
+                ("albums_synced", models.PositiveIntegerField(default=0)),
+                ("albums_analyzed", models.PositiveIntegerField(default=0)),
+                ("album_tracks_synced", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "library stats",
+            },
+        ),
+    ]
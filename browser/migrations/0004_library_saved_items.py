@@ -0,0 +1,37 @@
+"""Generated by Django 5.1.15 on 2026-10-18 03:07."""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0008_track_counts"),
+        ("browser", "0003_library_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="library",
+            name="saved_albums",
+            field=models.ManyToManyField(
+                related_name="saved_in_libraries", to="api.album"
+            ),
+        ),
+        migrations.AddField(
+            model_name="library",
+            name="saved_tracks",
+            field=models.ManyToManyField(
+                related_name="saved_in_libraries", to="api.track"
+            ),
+        ),
+        migrations.AddField(
+            model_name="library",
+            name="albums_saved_skipped",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="library",
+            name="tracks_saved_skipped",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,7 +1,12 @@
 """Browser app models."""
 
+import uuid
+
 from django.db import models
+from django.db.models import Count, Q, Sum
 
+from api.models import Album, Playlist
+from core.membership import MembershipWriter
 from core.mixins import Model
 
 
@@ -18,3 +23,155 @@ class Library(Model):
     albums = models.ManyToManyField("api.Album", related_name="libraries")
     genres = models.ManyToManyField("api.Genre", related_name="libraries")
     playlists = models.ManyToManyField("api.Playlist", related_name="libraries")
+
+    # Tracks & albums saved to the user's Spotify library (also members of
+    # tracks & albums, which are added to from other sources too)
+    saved_tracks = models.ManyToManyField(
+        "api.Track", related_name="saved_in_libraries"
+    )
+    saved_albums = models.ManyToManyField(
+        "api.Album", related_name="saved_in_libraries"
+    )
+
+    # When the latest saved track/album was added (incremental sync watermarks)
+    tracks_saved_until = models.DateTimeField(null=True, blank=True)
+    albums_saved_until = models.DateTimeField(null=True, blank=True)
+    # Saved tracks/albums that couldn't be stored (e.g. invalid data)
+    tracks_saved_skipped = models.PositiveIntegerField(default=0)
+    albums_saved_skipped = models.PositiveIntegerField(default=0)
+
+
+LIBRARY_ARTISTS = MembershipWriter(Library.artists.through, "library", "artist")
+LIBRARY_TRACKS = MembershipWriter(Library.tracks.through, "library", "track")
+LIBRARY_ALBUMS = MembershipWriter(Library.albums.through, "library", "album")
+LIBRARY_SAVED_TRACKS = MembershipWriter(
+    Library.saved_tracks.through, "library", "track"
+)
+LIBRARY_SAVED_ALBUMS = MembershipWriter(
+    Library.saved_albums.through, "library", "album"
+)
+LIBRARY_GENRES = MembershipWriter(Library.genres.through, "library", "genre")
+LIBRARY_PLAYLISTS = MembershipWriter(Library.playlists.through, "library", "playlist")
+
+
+class LibraryStatsManager(models.Manager["LibraryStats"]):
+    """Compute & read the statistics of libraries."""
+
+    def compute(self, library_pk: uuid.UUID) -> "LibraryStats":
+        """Compute a library's statistics, a query per resource.
+
+        Track totals are sums of the maintained track counts of the
+        playlists & albums, so the tracks aren't joined.
+        """
+        synced, analyzed = Q(is_synced=True), Q(is_analyzed=True)
+
+        playlists = Playlist.objects.filter(libraries=library_pk).aggregate(
+            playlists_synced=Count("pk", filter=synced),
+            playlists_analyzed=Count("pk", filter=analyzed),
+            playlist_tracks=Sum("num_tracks", default=0),
+            playlist_tracks_synced=Sum("num_tracks", filter=synced, default=0),
+            playlist_tracks_analyzed=Sum("num_tracks", filter=analyzed, default=0),
+            playlist_tracks_unanalyzed=Sum(
+                "num_tracks", filter=Q(is_analyzed=False), default=0
+            ),
+        )
+        albums = Album.objects.filter(libraries=library_pk).aggregate(
+            albums_synced=Count("pk", filter=synced),
+            albums_analyzed=Count("pk", filter=analyzed),
+            album_tracks_synced=Sum("num_tracks", filter=synced, default=0),
+        )
+
+        return self.model(library_id=library_pk, **playlists, **albums)
+
+    def refresh(self, library_pk: uuid.UUID) -> "LibraryStats":
+        """Compute & store a library's statistics."""
+        stats = self.compute(library_pk)
+
+        self.bulk_create(
+            [stats],
+            update_conflicts=True,
+            unique_fields=["library"],
+            update_fields=[*self.model.counts, "updated_at"],
+        )
+
+        return stats
+
+    def for_user(self, user_pk: int) -> "LibraryStats":
+        """The stored statistics of a user's library.
+
+        They're computed (and stored) when the library has none yet.
+        """
+        if stats := self.filter(library__user_id=user_pk).first():
+            return stats
+
+        library, _ = Library.objects.get_or_create(user_id=user_pk)
+
+        return self.refresh(library.pk)
+
+
+class LibraryStats(models.Model):
+    """Statistics of the playlists & albums of a library.
+
+    Stored so the meta endpoints are a single read, they're refreshed when
+    the library's sync & analysis tasks complete (see ``browser.signals``).
+    """
+
+    library = models.OneToOneField(
+        Library, on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+
+    playlists_synced = models.PositiveIntegerField(default=0)
+    playlists_analyzed = models.PositiveIntegerField(default=0)
+    playlist_tracks = models.PositiveIntegerField(default=0)
+    playlist_tracks_synced = models.PositiveIntegerField(default=0)
+    playlist_tracks_analyzed = models.PositiveIntegerField(default=0)
+    playlist_tracks_unanalyzed = models.PositiveIntegerField(default=0)
+    albums_synced = models.PositiveIntegerField(default=0)
+    albums_analyzed = models.PositiveIntegerField(default=0)
+    album_tracks_synced = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    counts = (
+        "playlists_synced",
+        "playlists_analyzed",
+        "playlist_tracks",
+        "playlist_tracks_synced",
+        "playlist_tracks_analyzed",
+        "playlist_tracks_unanalyzed",
+        "albums_synced",
+        "albums_analyzed",
+        "album_tracks_synced",
+    )
+
+    objects = LibraryStatsManager()
+
+    class Meta:
+        """Meta options."""
+
+        verbose_name_plural = "library stats"
+
+    def __str__(self) -> str:
+        """String representation."""
+        return f"Stats of library {self.library_id}"
+
+    @property
+    def playlists(self) -> dict:
+        """Playlist statistics (as returned by the playlists meta endpoint)."""
+        return {
+            "total_synced": self.playlists_synced,
+            "total_analyzed": self.playlists_analyzed,
+            "total_synced_tracks": self.playlist_tracks_synced,
+            "total_analyzed_tracks": self.playlist_tracks_analyzed,
+            "total_unanalyzed_tracks": self.playlist_tracks_unanalyzed,
+            "total_tracks": self.playlist_tracks,
+        }
+
+    @property
+    def albums(self) -> dict:
+        """Album statistics (as returned by the albums meta endpoint)."""
+        return {
+            "total_synced": self.albums_synced,
+            "total_analyzed": self.albums_analyzed,
+            "total_tracks": self.album_tracks_synced,
+        }
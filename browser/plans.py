@@ -0,0 +1,70 @@
+"""Query plans of the browser serializers.
+
+Each response shape declares the related objects it reads, so they're
+loaded with a fixed number of queries (joins & prefetches) rather than a
+query per serialized object. Serializers apply their plan to the queryset
+they're given.
+"""
+
+import dataclasses
+
+from django.db import models
+from django.db.models import Prefetch
+
+from api.models.track import Track
+
+
+@dataclasses.dataclass(frozen=True)
+class QueryPlan:
+    """Related objects to join (``select_related``) & prefetch."""
+
+    select_related: tuple[str, ...] = ()
+    prefetch_related: tuple[str | Prefetch, ...] = ()
+
+    @property
+    def as_dict(self) -> dict:
+        """Return the dataclass as a dictionary."""
+        return {
+            "select_related": list(self.select_related),
+            "prefetch_related": [
+                getattr(lookup, "prefetch_to", lookup)
+                for lookup in self.prefetch_related
+            ],
+        }
+
+    def apply(self, qs: models.QuerySet) -> models.QuerySet:
+        """Load the related objects of the queryset's rows with the plan."""
+        if self.select_related:
+            qs = qs.select_related(*self.select_related)
+
+        if self.prefetch_related:
+            qs = qs.prefetch_related(*self.prefetch_related)
+
+        return qs
+
+
+def playlist_tracks() -> models.QuerySet[Track]:
+    """Tracks with what ``PlaylistTrackSerializer`` reads of them."""
+    return Track.objects.select_related("album", "features").prefetch_related(
+        "album__artists"
+    )
+
+
+# ListPlaylistSerializer only reads the playlists' columns
+PLAYLIST_LIST = QueryPlan()
+
+# RetrievePlaylistSerializer reads the tracks of the playlist when it isn't
+# analyzed (the missing analysis is joined so it's known without a query),
+# otherwise the analysis (& its computation) and its tracks.
+PLAYLIST_DETAIL = QueryPlan(
+    select_related=("analysis",),
+    prefetch_related=(Prefetch("tracks", queryset=playlist_tracks()),),
+)
+PLAYLIST_DETAIL_ANALYZED = QueryPlan(
+    select_related=("analysis", "analysis__data"),
+    prefetch_related=(Prefetch("analysis__tracks", queryset=playlist_tracks()),),
+)
+
+# ListAlbumSerializer & RetrieveAlbumSerializer read the artists & tracks
+ALBUM_LIST = QueryPlan(prefetch_related=("artists", "tracks"))
+ALBUM_DETAIL = ALBUM_LIST
@@ -14,6 +14,15 @@ from api.models.analysis import Computation, TrackFeatures
 from api.models.music import Artist
 from api.models.playlist import Playlist
 from api.models.track import Track
+from browser.plans import (
+    ALBUM_DETAIL,
+    ALBUM_LIST,
+    PLAYLIST_DETAIL,
+    PLAYLIST_DETAIL_ANALYZED,
+    PLAYLIST_LIST,
+    QueryPlan,
+)
+from core.pagination import KeysetPaginator
 
 #########################################
 # Constants, Mixins, & Base Classes     #
@@ -35,10 +44,39 @@ class TaskState(enum.StrEnum):
 
 
 class PaginationParams(BaseModel):
-    """Pagination parameters."""
+    """Pagination parameters.
+
+    Pages are numbered unless a cursor is given (an empty cursor is the
+    first page), see ``core.pagination``.
+    """
 
     page: int
     page_size: int
+    cursor: str | None = None
+    approximate_total: bool = False
+
+
+class Serializer(BaseModel):
+    """Base Serializer class."""
+
+    pass
+
+
+class Pagination(Serializer):
+    """Pagination attributes for list serializers."""
+
+    total: int
+    per_page: int
+    page: int
+    num_pages: int
+
+
+class CursorPagination(Serializer):
+    """Cursor pagination attributes for list serializers."""
+
+    per_page: int
+    next_cursor: str | None = None
+    approximate_total: int | None = None
 
 
 class ListResponseMixin:
@@ -53,20 +91,35 @@ class ListResponseMixin:
         """Convert data to a response."""
         raise NotImplementedError
 
+    @classmethod
+    def paginate(
+        cls: type[typing.Self],
+        qs: models.QuerySet,
+        params: PaginationParams,
+    ) -> tuple[typing.Iterable, Pagination | CursorPagination]:
+        """The objects of a page and its pagination attributes.
+
+        Raises a ValueError when the cursor is invalid.
+        """
+        if params.cursor is not None:
+            page = KeysetPaginator(qs, params.page_size).page(
+                params.cursor, approximate=params.approximate_total
+            )
 
-class Serializer(BaseModel):
-    """Base Serializer class."""
-
-    pass
-
+            return page.items, CursorPagination(
+                per_page=params.page_size,
+                next_cursor=page.next_cursor,
+                approximate_total=page.approximate_total,
+            )
 
-class Pagination(Serializer):
-    """Pagination attributes for list serializers."""
+        paginator = Paginator(qs.all(), per_page=params.page_size)
 
-    total: int
-    per_page: int
-    page: int
-    num_pages: int
+        return paginator.page(params.page), Pagination(
+            total=paginator.count,
+            per_page=params.page_size,
+            page=params.page,
+            num_pages=paginator.num_pages,
+        )
 
 
 #########################################
@@ -95,8 +148,6 @@ class PlaylistBaseSerializer(Serializer):
         cls: type["PlaylistBaseSerializer"], model: Playlist
     ) -> "PlaylistBaseSerializer":
         """Create a model serializer from a model."""
-        num_tracks = Playlist.objects.get(id=model.id).tracks.count()
-
         return cls(
             id=str(model.id),
             name=model.name,
@@ -109,7 +160,7 @@ class PlaylistBaseSerializer(Serializer):
             image_url=model.image_url,
             public=model.public,
             shared=model.shared,
-            num_tracks=num_tracks,
+            num_tracks=model.num_tracks,
         )
 
 
@@ -117,7 +168,9 @@ class ListPlaylistSerializer(ListResponseMixin, Serializer):
     """Serializer for listing Playlist objects in the browser context."""
 
     data: list[PlaylistBaseSerializer]
-    pagination: Pagination
+    pagination: Pagination | CursorPagination
+
+    plan: typing.ClassVar[QueryPlan] = PLAYLIST_LIST
 
     @classmethod
     def to_response(
@@ -126,11 +179,11 @@ class ListPlaylistSerializer(ListResponseMixin, Serializer):
         params: PaginationParams,
     ) -> dict:
         """Convert data to a response."""
-        paginator = Paginator(qs.all(), per_page=params.page_size)
+        objects, pagination = cls.paginate(cls.plan.apply(qs), params)
 
         data = []
 
-        for obj in paginator.page(params.page):
+        for obj in objects:
             _cls = PlaylistBaseSerializer
             _data = _cls.model_construct()
             _data.id = str(obj.id)
@@ -138,6 +191,7 @@ class ListPlaylistSerializer(ListResponseMixin, Serializer):
             _data.spotify_id = obj.spotify_id
             _data.is_analyzed = obj.is_analyzed
             _data.is_synced = obj.is_synced
+            _data.num_tracks = obj.num_tracks
             _data.description = obj.description
             _data.owner_id = obj.owner_id
             _data.version = obj.version
@@ -149,13 +203,6 @@ class ListPlaylistSerializer(ListResponseMixin, Serializer):
 
             data.append(_data)
 
-        pagination = Pagination(
-            total=paginator.count,
-            per_page=params.page_size,
-            page=params.page,
-            num_pages=paginator.num_pages,
-        )
-
         return cls(data=data, pagination=pagination).model_dump()
 
 
@@ -227,7 +274,9 @@ class ListAlbumSerializer(ListResponseMixin, Serializer):
     """Serializes a collection of filtered Album objects in the browser context."""
 
     data: list[AlbumBaseSerializer]
-    pagination: Pagination
+    pagination: Pagination | CursorPagination
+
+    plan: typing.ClassVar[QueryPlan] = ALBUM_LIST
 
     @classmethod
     def to_response(
@@ -236,11 +285,11 @@ class ListAlbumSerializer(ListResponseMixin, Serializer):
         params: PaginationParams,
     ) -> dict:
         """Convert data to a response."""
-        paginator = Paginator(qs.all(), per_page=params.page_size)
+        objects, pagination = cls.paginate(cls.plan.apply(qs), params)
 
         data = []
 
-        for obj in paginator.page(params.page):
+        for obj in objects:
             _cls = AlbumBaseSerializer
             _data = _cls.model_construct()
             _data.id = str(obj.id)
@@ -266,19 +315,14 @@ class ListAlbumSerializer(ListResponseMixin, Serializer):
 
             data.append(_data)
 
-        pagination = Pagination(
-            total=paginator.count,
-            per_page=params.page_size,
-            page=params.page,
-            num_pages=paginator.num_pages,
-        )
-
         return cls(data=data, pagination=pagination).model_dump()
 
 
 class RetrieveAlbumSerializer(AlbumBaseSerializer):
     """Serializes an Album object in the browser context."""
 
+    plan: typing.ClassVar[QueryPlan] = ALBUM_DETAIL
+
     @classmethod
     def get(
         cls: type["RetrieveAlbumSerializer"], model: Album
@@ -532,6 +576,14 @@ class RetrievePlaylistSerializer(Serializer):
     computations: PlaylistComputationSerializer | None = None
     tracks: list[PlaylistTrackSerializer] | None = None
 
+    plan: typing.ClassVar[QueryPlan] = PLAYLIST_DETAIL
+    analyzed_plan: typing.ClassVar[QueryPlan] = PLAYLIST_DETAIL_ANALYZED
+
+    @classmethod
+    def plan_for(cls, analyzed: bool) -> QueryPlan:
+        """Query plan of a playlist, whether it's analyzed or not."""
+        return cls.analyzed_plan if analyzed else cls.plan
+
     @classmethod
     def get(
         cls: type["RetrievePlaylistSerializer"], model: Playlist
@@ -540,6 +592,7 @@ class RetrievePlaylistSerializer(Serializer):
         if hasattr(model, "analysis") and model.analysis is not None:
             analysis = model.analysis
             tracks = analysis.tracks.all()
+            computations = None
 
             if hasattr(analysis, "data") and analysis.data is not None:
                 computations = analysis.data
@@ -0,0 +1,57 @@
+"""Library statistics signals and receiver functions.
+
+The stored statistics of a library (see ``LibraryStats``) are refreshed
+when a task that syncs or analyzes its playlists or albums completes.
+"""
+
+import inspect
+import typing
+
+from celery import Task as CeleryTask
+from celery import states
+from celery.signals import task_postrun
+from loguru import logger
+
+from browser import tasks
+from browser.models import Library, LibraryStats
+from library.tasks import sync_and_add_playlists_to_library, sync_saved_albums
+
+library_tasks = (
+    tasks.sync_playlist,
+    tasks.analyze_playlist,
+    tasks.sync_and_analyze_playlist,
+    tasks.analyze_playlists,
+    tasks.sync_albums,
+    tasks.sync_album,
+    tasks.analyze_album,
+    sync_and_add_playlists_to_library,
+    sync_saved_albums,
+)
+
+
+def refresh_library_stats_handler(
+    sender: typing.Callable,
+    task_id: str,
+    task: CeleryTask,
+    args: tuple = (),
+    kwargs: dict | None = None,
+    state: str | None = None,
+    **extra,
+) -> None:
+    """Refresh the statistics of the library of the task's user."""
+    if state != states.SUCCESS:
+        return
+
+    arguments = inspect.signature(task.run).bind_partial(*args, **(kwargs or {}))
+    user_id = arguments.arguments.get("user_id")
+
+    library = Library.objects.filter(user_id=user_id).values_list("pk", flat=True)
+
+    if library_pk := library.first():
+        LibraryStats.objects.refresh(library_pk)
+
+        logger.debug(f"Refreshed the stats of library {library_pk} ({task_id}).")
+
+
+for library_task in library_tasks:
+    task_postrun.connect(refresh_library_stats_handler, sender=library_task, weak=False)
@@ -5,7 +5,6 @@ Tasks for syncing and analyzing playlists and their tracks.
 Any task with user_id as an argument makes an API call.
 """
 
-import time
 import typing
 import uuid
 
@@ -19,8 +18,10 @@ from api.models import Playlist
 from api.models.album import Album
 from api.models.analysis import Analysis, Computation
 from api.models.music import Artist
+from api.models.playlist import PlaylistEntry, PlaylistItem
 from api.models.track import Track
 from api.services.spotify import (
+    FEATURES,
     SpotifyAuthService,
     SpotifyDataService,
     SpotifyLibraryService,
@@ -85,11 +86,11 @@ class PlaylistSync(PlaylistTask):
         playlist = Playlist.objects.get(id=self.playlist_id)
 
         if playlist.is_synced:
-            response = LIBRARY.library_playlist(self.user_id, playlist.spotify_id)
+            snapshot_id = LIBRARY.library_playlist_snapshot(
+                self.user_id, playlist.spotify_id
+            )
 
-            if (
-                snapshot_id := response.get("snapshot_id")
-            ) and snapshot_id == playlist.version:
+            if not Playlist.sync.stale({playlist.spotify_id: snapshot_id}):
                 logger.info(
                     f"Playlist {self.playlist_id} has already been synced. Skipping."
                 )
@@ -98,36 +99,56 @@ class PlaylistSync(PlaylistTask):
 
         return True
 
-    def sync(self) -> tuple[list[dict], uuid.UUID]:
-        """Dispatch playlist sync."""
+    def sync(self) -> Playlist:
+        """Dispatch playlist sync (metadata only).
+
+        The playlist stays unsynced until its items are written.
+        """
         library, _ = Library.objects.get_or_create(user_id=self.user_id)
         playlist = Playlist.objects.get(id=self.playlist_id)
-        response = LIBRARY.library_playlist(self.user_id, playlist.spotify_id)
+        data = LIBRARY.library_playlist_metadata(
+            self.user_id, playlist.spotify_id, fields=Playlist.sync.api_fields
+        )
 
-        if data := response.get("playlist"):
+        if data:
             cleaned = Playlist.sync.clean_playlist(data)
             playlist = Playlist.sync.sync_playlist(cleaned.model_dump(), self.user_id)
             library.playlists.add(playlist)
 
-            pk = Playlist.sync.complete_playlist_sync(playlist)
-
-            return response.get("tracks", []), pk
+            return playlist
 
         raise ValueError(f"Failed to sync playlist {self.playlist_id}.")
 
-    def track_sync(self, data: tuple[list[dict], uuid.UUID]) -> uuid.UUID:
-        """Dispatch track analysis."""
-        response, playlist_id = data
-        cleaned = Track.sync.pre_sync(response)
-        synced = Track.sync.do(cleaned)
-        complete = Track.sync.complete_sync(playlist_id, synced)
-        return complete
+    def track_sync(self, playlist: Playlist) -> uuid.UUID:
+        """Sync the playlist's tracks, a page at a time.
+
+        Each page is cleaned, written & diffed against the playlist's stored
+        items before the next one is requested, so memory use doesn't grow
+        with the size of the playlist. Only the page's new tracks & the
+        changed items are written.
+        """
+        pages = LIBRARY.library_playlist_pages(
+            self.user_id,
+            playlist.spotify_id,
+            snapshot_id=playlist.version,
+            fields=Track.sync.api_item_fields,
+        )
+
+        def entries() -> typing.Iterator[list[PlaylistEntry]]:
+            for page in pages:
+                yield PlaylistItem.sync.entries(page, Track.sync.sync_new(page))
+
+        changes = PlaylistItem.sync.resync(playlist.pk, entries())
+
+        logger.debug(f"Synced the items of playlist {playlist.pk}: {changes.as_dict}")
+
+        return playlist.pk
 
     def complete(self, playlist_id: uuid.UUID) -> uuid.UUID:
-        """Mark the playlist as analyzed."""
+        """Mark the playlist as synced."""
         playlist = Playlist.objects.get(id=playlist_id)
-        playlist.is_synced = True
-        playlist.save()
+
+        Playlist.sync.complete_playlist_sync(playlist)
 
         logger.info(f"Marked {playlist_id} as synced.")
 
@@ -138,9 +159,8 @@ class PlaylistSync(PlaylistTask):
         if not self.pre_flight():
             return
 
-        time.sleep(1)  # Pause after the preflight API call
-        sync_result = self.sync()
-        track_result = self.track_sync(sync_result)
+        playlist = self.sync()
+        track_result = self.track_sync(playlist)
 
         self.complete(track_result)
 
@@ -166,9 +186,7 @@ class PlaylistAnalysis(PlaylistTask):
         """Dispatch playlist analysis."""
         logger.info(f"Analyzing playlist {self.playlist_id}.")
         track_ids = Analysis.sync.pre_analysis(self.playlist_id, self.user_id)
-        data = DATA.fetch_audio_features(track_ids, self.user_id)
-
-        time.sleep(1)
+        data = FEATURES.audio_features(track_ids, self.user_id)
 
         analyzed = Analysis.sync.analyze(self.playlist_id, self.user_id, data)
 
@@ -207,6 +225,78 @@ class PlaylistAnalysis(PlaylistTask):
         self.complete(computation_result)
 
 
+class BatchPlaylistAnalysis(Task):
+    """Analyze a set of playlists together.
+
+    The playlists' tracks are unioned, so the features of a track shared
+    by many playlists are only looked up (and fetched) once.
+    """
+
+    user_id: int
+    playlist_ids: list[uuid.UUID]
+
+    def __init__(self, user_id: int, playlist_ids: typing.Iterable[uuid.UUID]) -> None:
+        """Create a new task for a set of playlists."""
+        self.user_id = user_id
+        self.playlist_ids = list(playlist_ids)
+
+    def analysis(self) -> dict[uuid.UUID, uuid.UUID]:
+        """Dispatch the analysis of every playlist."""
+        playlist_tracks = Analysis.sync.pre_batch_analysis(
+            self.playlist_ids, self.user_id
+        )
+        track_ids = {t for ids in playlist_tracks.values() for t in ids}
+
+        logger.info(
+            f"Analyzing {len(playlist_tracks)} playlists "
+            f"({len(track_ids)} unique tracks)."
+        )
+
+        data = FEATURES.audio_features(track_ids, self.user_id)
+
+        return Analysis.sync.analyze_batch(playlist_tracks, self.user_id, data)
+
+    def computation(
+        self, analyses: dict[uuid.UUID, uuid.UUID]
+    ) -> dict[uuid.UUID, uuid.UUID]:
+        """Compute every analysis from the shared dataset."""
+        computations = Analysis.sync.compute_batch(list(analyses.values()))
+
+        return {
+            playlist_id: Analysis.sync.set_computation(analysis_id, data)
+            for playlist_id, analysis_id in analyses.items()
+            if (data := computations.get(analysis_id)) is not None
+        }
+
+    def complete(self, computed: dict[uuid.UUID, uuid.UUID]) -> None:
+        """Mark the computed playlists as analyzed."""
+        Playlist.objects.filter(pk__in=computed.keys()).update(is_analyzed=True)
+
+        logger.info(f"Marked {len(computed)} playlists as analyzed.")
+
+    def _run(self) -> None:
+        """Run the batch analysis chain."""
+        analyses = self.analysis()
+        computed = self.computation(analyses)
+
+        self.complete(computed)
+
+
+@shared_task
+def analyze_playlists(playlist_ids: list[str], user_id: int) -> tuple[int, list[str]]:
+    """Analyze a set of playlists in one batch.
+
+    1. Union the playlists' tracks & get their features once.
+    2. Write the features and the playlists' analyses.
+    3. Compute each playlist's analysis from the shared dataset.
+    """
+    runner = BatchPlaylistAnalysis(user_id, [uuid.UUID(pk) for pk in playlist_ids])
+
+    runner.__call__()
+
+    return (user_id, [str(pk) for pk in playlist_ids])
+
+
 @shared_task
 def analyze_playlist(playlist_id: uuid.UUID, user_id: int) -> tuple[int, str]:
     """Analyze a playlist.
@@ -316,7 +406,6 @@ class AlbumSync(AlbumTask):
         album = Album.objects.get(id=self.album_id)
 
         response = LIBRARY.library_album(self.user_id, album.spotify_id)
-        time.sleep(1)
 
         if data := response.get("album"):
             self.cleaned_album = Album.sync.clean_data(data)
@@ -361,6 +450,8 @@ class AlbumSync(AlbumTask):
         album.is_synced = True
         album.save()
 
+        Album.sync.recount([album_id])
+
         logger.info(f"Marked {album_id} as synced.")
 
         return None
@@ -396,9 +487,7 @@ class AlbumAnalysis(AlbumTask):
 
         logger.info(f"Analyzing album {self.album_id}.")
         track_ids = Analysis.sync.prep_album(self.album_id, self.user_id)
-        data = DATA.fetch_audio_features(track_ids, self.user_id)
-
-        time.sleep(1)
+        data = FEATURES.audio_features(track_ids, self.user_id)
 
         analyzed = Analysis.sync.analyze_album(self.album_id, self.user_id, data)
 
@@ -1,19 +1,25 @@
 import random
+import typing
 import unittest
 from unittest import mock
 
-from django.db import models
+from celery import states
+from celery.signals import task_postrun
+from django.db import connection, models
 from django.http import HttpRequest
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from faker import Faker
 from rest_framework.request import Request
 
+from api.libs.exceptions import SpotifyAPIError
 from api.libs.helpers import TestHelpers
-from api.models import Album, Artist, Playlist, Track, TrackFeatures
+from api.models import Album, Artist, Playlist, PlaylistItem, Track, TrackFeatures
 from api.models.analysis import Analysis
 from browser.filters import AlbumFilterSet, PlaylistFilterSet, TrackFilterSet
-from browser.models import Library
+from browser.models import Library, LibraryStats
+from browser.tasks import LIBRARY, PlaylistSync, sync_playlist
 from core.models import AppUser
 from core.permissions import TokenSerializer
 
@@ -62,6 +68,7 @@ def create_library_with_albume(user: AppUser, count: int = 10):
                 )
             )
 
+        Album.sync.recount([album.pk])
         library.albums.add(album)
 
         create_analysis_from_album(album, library, force=(i < 2))
@@ -83,6 +90,7 @@ def create_library_with_playlists(user: AppUser, count: int = 10):
         playlist.tracks.add(
             *[create_track_with_features() for _ in range(fake.random_int(7, 10))]
         )
+        Playlist.sync.recount([playlist.pk])
 
         library.playlists.add(playlist)
 
@@ -246,6 +254,53 @@ class PlaylistViewSetTestCase(TestCase):
         self.assertEqual(len(data["data"]), 10)
         self.assertEqual(data["pagination"]["total"], 10)
 
+        for playlist in data["data"]:
+            self.assertEqual(
+                playlist["num_tracks"],
+                PlaylistItem.objects.filter(playlist_id=playlist["id"]).count(),
+            )
+
+    def test_list_playlists_view_constant_queries(self):
+        path = reverse("browser__playlists")
+        headers = {"Authorization": f"Bearer {self.jwt}"}
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(f"{path}?page_size=2", headers=headers)
+
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(f"{path}?page_size=10", headers=headers)
+
+        self.assertEqual(len(small), len(large))
+
+    def test_list_playlists_view_cursor(self):
+        path = reverse("browser__playlists")
+        headers = {"Authorization": f"Bearer {self.jwt}"}
+        cursor, ids = "", []
+
+        while cursor is not None:
+            response = self.client.get(
+                path,
+                {"cursor": cursor, "page_size": 3, "total": "approximate"},
+                headers=headers,
+            )
+            data = response.json()
+
+            self.assertEqual(response.status_code, 200)
+            self.assertIsInstance(data["pagination"]["approximate_total"], int)
+
+            ids.extend(playlist["id"] for playlist in data["data"])
+            cursor = data["pagination"]["next_cursor"]
+
+        self.assertEqual(len(ids), 10)
+        self.assertEqual(
+            set(ids),
+            {str(pk) for pk in self.library.playlists.values_list("pk", flat=True)},
+        )
+
+        response = self.client.get(path, {"cursor": "invalid"}, headers=headers)
+
+        self.assertEqual(response.status_code, 400)
+
     @mock.patch("browser.tasks.sync_playlist.s")
     @mock.patch("celery.group.apply_async")
     def test_create_playlists_view(
@@ -265,6 +320,24 @@ class PlaylistViewSetTestCase(TestCase):
         self.assertEqual(response.status_code, 202)
         self.assertEqual(data["status"], "PENDING")
 
+    @mock.patch("browser.tasks.analyze_playlists.apply_async")
+    def test_create_playlists_view_analyze(
+        self, mock_analyze_playlists: mock.MagicMock
+    ):
+        mock_analyze_playlists.return_value = FakeTaskResult.new()
+        path = reverse("browser__playlists")
+        response = self.client.post(
+            f"{path}?page_size=5",
+            content_type="application/json",
+            headers={"Authorization": f"Bearer {self.jwt}"},
+            data={"operation": "analyze"},
+        )
+        data = response.json()
+
+        self.assertEqual(mock_analyze_playlists.call_count, 1)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(data["status"], "PENDING")
+
     @mock.patch("browser.tasks.analyze_playlist.apply_async")
     @mock.patch("browser.tasks.sync_playlist.apply_async")
     def test_partial_update_playlists_view(
@@ -348,6 +421,134 @@ class PlaylistMetadataViewSetTestCase(TestCase):
         )
 
 
+class LibraryStatsTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.library = create_library_with_playlists(self.user, count=3)
+        self.library = create_library_with_albume(self.user, count=3)
+        self.jwt = TokenSerializer.from_user(user=self.user).encode()
+
+    def test_compute_uses_a_query_per_resource(self):
+        with self.assertNumQueries(2):
+            stats = LibraryStats.objects.compute(self.library.pk)
+
+        self.assertEqual(stats.playlists_synced, 3)
+        self.assertEqual(
+            stats.playlist_tracks,
+            PlaylistItem.objects.filter(playlist__libraries=self.library).count(),
+        )
+        self.assertEqual(
+            stats.album_tracks_synced,
+            Track.objects.filter(
+                album__libraries=self.library, album__is_synced=True
+            ).count(),
+        )
+
+    def test_meta_reads_stored_stats(self):
+        LibraryStats.objects.refresh(self.library.pk)
+
+        with self.assertNumQueries(1):
+            stats = LibraryStats.objects.for_user(self.user.pk)
+
+        self.assertEqual(stats.playlists["total_synced"], 3)
+
+        Playlist.objects.filter(libraries=self.library).update(is_synced=False)
+
+        response = self.client.get(
+            reverse("browser__playlists-meta"),
+            headers={"Authorization": f"Bearer {self.jwt}"},
+        )
+
+        self.assertEqual(response.json()["total_synced"], 3)
+
+    def test_refreshed_when_a_task_succeeds(self):
+        LibraryStats.objects.refresh(self.library.pk)
+        Playlist.objects.filter(libraries=self.library).update(is_synced=False)
+
+        def postrun(state: str) -> int:
+            task_postrun.send(
+                sender=sync_playlist,
+                task_id=str(fake.uuid4()),
+                task=sync_playlist,
+                args=(str(fake.uuid4()), self.user.pk),
+                kwargs={},
+                state=state,
+            )
+
+            return LibraryStats.objects.get(library=self.library).playlists_synced
+
+        self.assertEqual(postrun(states.FAILURE), 3)
+        self.assertEqual(postrun(states.SUCCESS), 0)
+
+
+class QueryBudgetTestCase(TestCase):
+    """Query count budgets of the browser endpoints.
+
+    The related objects of the serialized rows are loaded by the query plans
+    of the serializers, so a budget holds for any page size.
+    """
+
+    budgets = {
+        "browser__playlists": 3,
+        "browser__playlist": 5,
+        "browser__playlists-meta": 2,
+        "browser__albums": 5,
+        "browser__album": 4,
+        "browser__albums-meta": 2,
+    }
+
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.library = create_library_with_playlists(self.user, count=20)
+        self.library = create_library_with_albume(self.user, count=20)
+        self.jwt = TokenSerializer.from_user(user=self.user).encode()
+
+        # the tracks of the playlists are on an album, with artists
+        Track.objects.filter(album__isnull=True).update(
+            album=self.library.albums.first()
+        )
+        LibraryStats.objects.refresh(self.library.pk)
+
+    def get_within_budget(self, name: str, params: dict | None = None, **kwargs) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse(name, kwargs=kwargs or None),
+                params or {},
+                headers={"Authorization": f"Bearer {self.jwt}"},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries),
+            self.budgets[name],
+            "\n".join(query["sql"] for query in queries.captured_queries),
+        )
+
+        return len(queries)
+
+    def test_list_budgets(self):
+        for name in ("browser__playlists", "browser__albums"):
+            small = self.get_within_budget(name, {"page_size": 2})
+            large = self.get_within_budget(name, {"page_size": 20})
+            cursor = self.get_within_budget(name, {"page_size": 20, "cursor": ""})
+
+            self.assertEqual(small, large)
+            self.assertLess(cursor, large)
+
+    def test_retrieve_budgets(self):
+        analyzed = self.library.playlists.filter(analysis__isnull=False).first()
+        playlist = self.library.playlists.filter(analysis__isnull=True).first()
+        album = self.library.albums.first()
+
+        self.get_within_budget("browser__playlist", playlist_pk=str(analyzed.pk))
+        self.get_within_budget("browser__playlist", playlist_pk=str(playlist.pk))
+        self.get_within_budget("browser__album", album_pk=str(album.pk))
+
+    def test_meta_budgets(self):
+        self.get_within_budget("browser__playlists-meta")
+        self.get_within_budget("browser__albums-meta")
+
+
 class PlaylistFilterSetTestCase(TestCase):
     """Test PlaylistFilterSet."""
 
@@ -388,6 +589,7 @@ class PlaylistFilterSetTestCase(TestCase):
                 )
 
             playlist.save()
+            Playlist.sync.recount([playlist.pk])
 
             self.library.playlists.add(playlist)
 
@@ -590,3 +792,141 @@ class AlbumFilterSetTestCase(TestCase):
         queryset = self.filters.search_name(Album.objects.all(), name)
         filtered_queryset = self.filters.filter_released_after(queryset, self.year)
         self.assertEqual(filtered_queryset.count(), 5)
+
+
+def playlist_track_item() -> dict:
+    artist = {"id": str(fake.uuid4()), "name": fake.name()}
+
+    return {
+        "track": {
+            "id": str(fake.uuid4()),
+            "name": fake.name(),
+            "type": "track",
+            "duration_ms": fake.random_int(60_000, 600_000),
+            "album": {
+                "id": str(fake.uuid4()),
+                "name": fake.name(),
+                "album_type": "album",
+                "release_date": "2020-01-01",
+                "images": [{"url": fake.image_url()}],
+                "artists": [artist],
+            },
+            "artists": [artist],
+        }
+    }
+
+
+class PlaylistSyncTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.playlist = Playlist.objects.create(
+            name=fake.name(),
+            spotify_id=str(fake.uuid4()),
+            owner_id=self.user.spotify_id,
+            version=str(fake.uuid4()),
+        )
+        self.pages = [[playlist_track_item() for _ in range(3)] for _ in range(2)]
+        self.linked_before_page = []
+        self.snapshot_id = self.playlist.version
+
+    def metadata(self, *args, **kwargs) -> dict:
+        return {
+            "id": self.playlist.spotify_id,
+            "name": self.playlist.name,
+            "snapshot_id": self.snapshot_id,
+            "owner": {"id": self.user.spotify_id},
+            "images": [{"url": fake.image_url()}],
+        }
+
+    def playlist_pages(self, *args, **kwargs) -> typing.Iterator[list[dict]]:
+        for page in self.pages:
+            self.linked_before_page.append(self.playlist.tracks.count())
+
+            yield page
+
+    def test_tracks_are_synced_a_page_at_a_time(self):
+        with (
+            mock.patch.object(
+                LIBRARY, "library_playlist_metadata", side_effect=self.metadata
+            ),
+            mock.patch.object(
+                LIBRARY, "library_playlist_pages", side_effect=self.playlist_pages
+            ),
+        ):
+            runner = PlaylistSync(self.user.pk, self.playlist.pk)()
+
+        self.playlist.refresh_from_db()
+
+        self.assertEqual(runner.status, "SUCCESS")
+        self.assertTrue(self.playlist.is_synced)
+        self.assertEqual(self.linked_before_page, [0, 3])
+        self.assertEqual(self.playlist.tracks.count(), 6)
+
+    def test_resync_only_writes_new_tracks(self):
+        sync = PlaylistSync(self.user.pk, self.playlist.pk)
+
+        with mock.patch.object(
+            LIBRARY, "library_playlist_pages", side_effect=self.playlist_pages
+        ):
+            sync.track_sync(self.playlist)
+
+        stored = dict(Track.objects.values_list("pk", "updated_at"))
+        albums = dict(Album.objects.values_list("pk", "updated_at"))
+        self.pages[1].extend(playlist_track_item() for _ in range(2))
+
+        with (
+            mock.patch.object(
+                LIBRARY, "library_playlist_pages", side_effect=self.playlist_pages
+            ),
+            CaptureQueriesContext(connection) as queries,
+        ):
+            sync.track_sync(self.playlist)
+
+        updated = [
+            q["sql"] for q in queries if q["sql"].startswith('UPDATE "api_track"')
+        ]
+
+        self.assertEqual(Track.objects.count(), len(stored) + 2)
+        self.assertEqual(self.playlist.tracks.count(), 8)
+        self.assertEqual(
+            dict(Track.objects.filter(pk__in=stored).values_list("pk", "updated_at")),
+            stored,
+        )
+        self.assertEqual(
+            dict(Album.objects.filter(pk__in=albums).values_list("pk", "updated_at")),
+            albums,
+        )
+        self.assertEqual(updated, [])
+
+    def test_failed_page_leaves_the_playlist_unsynced(self):
+        self.playlist.is_synced = True
+        self.playlist.save()
+        self.snapshot_id = str(fake.uuid4())
+
+        def failing_pages(*args, **kwargs) -> typing.Iterator[list[dict]]:
+            yield self.pages[0]
+
+            raise SpotifyAPIError("Internal Server Error")
+
+        with (
+            mock.patch.object(
+                LIBRARY, "library_playlist_snapshot", return_value=self.snapshot_id
+            ),
+            mock.patch.object(
+                LIBRARY, "library_playlist_metadata", side_effect=self.metadata
+            ),
+            mock.patch.object(
+                LIBRARY, "library_playlist_pages", side_effect=failing_pages
+            ),
+        ):
+            self.assertRaises(
+                SpotifyAPIError, PlaylistSync(self.user.pk, self.playlist.pk)
+            )
+
+        self.playlist.refresh_from_db()
+
+        self.assertFalse(self.playlist.is_synced)
+        self.assertEqual(
+            Playlist.sync.stale({self.playlist.spotify_id: self.snapshot_id}),
+            {self.playlist.spotify_id},
+        )
@@ -18,9 +18,9 @@ from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 
-from api.models.playlist import Playlist
+from api.models.analysis import Analysis
 from browser.filters import AlbumFilterSet, PlaylistFilterSet
-from browser.models import Library
+from browser.models import Library, LibraryStats
 from browser.serializers import (
     ListAlbumSerializer,
     ListPlaylistSerializer,
@@ -31,6 +31,7 @@ from browser.serializers import (
 )
 from browser.tasks import (
     analyze_playlist,
+    analyze_playlists,
     sync_and_analyze_playlist,
     sync_playlist,
 )
@@ -67,11 +68,19 @@ class PaginationParamsMixin:
     """Pagination parameters mixin."""
 
     def get_params(self: typing.Self, request: Request) -> PaginationParams:
-        """Get pagination parameters."""
+        """Get pagination parameters.
+
+        Example: ?page=2&page_size=10 or, with cursors, ?cursor=&total=approximate
+        """
         page = request.query_params.get("page", 1)
         page_size = request.query_params.get("page_size", 10)
 
-        return PaginationParams(page=int(page), page_size=int(page_size))
+        return PaginationParams(
+            page=int(page),
+            page_size=int(page_size),
+            cursor=request.query_params.get("cursor"),
+            approximate_total=request.query_params.get("total") == "approximate",
+        )
 
 
 class BaseBrowserViewSet(
@@ -108,30 +117,8 @@ class PlaylistMetaViewSet(BaseBrowserViewSet):
         Filters and returns a paginated list of playlists based
         on query parameters.
         """
-        qs = Playlist.objects.filter(libraries__user_id=request.user.id)
-
-        data = {
-            "total_synced": qs.filter(is_synced=True).count(),
-            "total_analyzed": qs.filter(is_analyzed=True).count(),
-            "total_synced_tracks": qs.filter(is_synced=True)
-            .aggregate(
-                track_count=models.Count("tracks"),
-            )
-            .get("track_count"),
-            "total_analyzed_tracks": qs.filter(is_analyzed=True)
-            .aggregate(
-                track_count=models.Count("tracks"),
-            )
-            .get("track_count"),
-            "total_unanalyzed_tracks": qs.filter(is_analyzed=False)
-            .aggregate(
-                track_count=models.Count("tracks"),
-            )
-            .get("track_count"),
-            "total_tracks": qs.aggregate(
-                track_count=models.Count("tracks"),
-            ).get("track_count"),
-        }
+        stats = LibraryStats.objects.for_user(typing.cast("int", request.user.id))
+        data = stats.playlists
 
         logger.debug(f"Playlist metadata: {data}")
 
@@ -158,16 +145,21 @@ class PlaylistViewSet(BaseBrowserViewSet):
         """GET /playlists.
 
         Filters and returns a paginated list of playlists based
-        on query parameters.
+        on query parameters. With a cursor, pages are read after the cursor
+        rather than by number (see ``PaginationParamsMixin``).
         """
         qs = self.get_queryset(request)
-        return Response(
-            data=ListPlaylistSerializer.to_response(
-                qs.all(),
-                self.get_params(request),
-            ),
-            status=status.HTTP_200_OK,
-        )
+
+        try:
+            data = ListPlaylistSerializer.to_response(
+                qs.all(), self.get_params(request)
+            )
+        except ValueError as e:
+            return Response(
+                data={"message": str(e)}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(data=data, status=status.HTTP_200_OK)
 
     def update(self, request: Request, playlist_pk: str, *args, **kwargs) -> Response:
         """PUT /playlists/{pk}.
@@ -205,7 +197,8 @@ class PlaylistViewSet(BaseBrowserViewSet):
         """POST /playlists.
 
         Based on params (filtered queryset), this view dispatches
-        a batch of celery tasks to analyze the playlists.
+        a batch of celery tasks to sync the playlists. With the "analyze"
+        operation, the playlists are analyzed together in a single task.
         """
         qs = self.get_queryset(request)
         params = self.get_params(request)
@@ -216,6 +209,17 @@ class PlaylistViewSet(BaseBrowserViewSet):
             )
             .object_list
         )
+        data = request.data if isinstance(request.data, dict) else {}
+
+        if data.get("operation") == "analyze":
+            result = analyze_playlists.s(
+                [str(playlist.id) for playlist in objects], request.user.id
+            ).apply_async()
+
+            return Response(
+                data=TaskResultSerializer.from_result(result).model_dump(),
+                status=status.HTTP_202_ACCEPTED,
+            )
 
         result = group(
             *(
@@ -240,16 +244,10 @@ class PlaylistViewSet(BaseBrowserViewSet):
             - tracks (paginated)
             - computation
         """
-        playlist = (
-            self.get_queryset(request)
-            .prefetch_related(
-                "tracks",
-                "analysis",
-                "tracks__album",
-                "tracks__album__artists",
-            )
-            .get(id=uuid.UUID(playlist_pk))
-        )
+        qs = self.get_queryset(request)
+        pk = uuid.UUID(playlist_pk)
+        analyzed = Analysis.objects.filter(playlist_id=pk).exists()
+        playlist = RetrievePlaylistSerializer.plan_for(analyzed).apply(qs).get(id=pk)
 
         return Response(
             data={**RetrievePlaylistSerializer.to_response(playlist)},
@@ -275,17 +273,8 @@ class AlbumMetaViewSet(BaseBrowserViewSet):
         Filters and returns a paginated list of albums based
         on query parameters.
         """
-        qs = self.get_library(request).albums.all()
-
-        data = {
-            "total_synced": qs.filter(is_synced=True).count(),
-            "total_analyzed": qs.filter(is_analyzed=True).count(),
-            "total_tracks": qs.filter(is_synced=True)
-            .aggregate(
-                track_count=models.Count("tracks"),
-            )
-            .get("track_count"),
-        }
+        stats = LibraryStats.objects.for_user(typing.cast("int", request.user.id))
+        data = stats.albums
 
         logger.debug(f"Album metadata: {data}")
 
@@ -304,28 +293,27 @@ class AlbumViewSet(BaseBrowserViewSet):
         """GET /albums.
 
         Filters and returns a paginated list of albums based
-        on query parameters.
+        on query parameters. With a cursor, pages are read after the cursor
+        rather than by number (see ``PaginationParamsMixin``).
         """
         qs = self.get_queryset(request)
-        return Response(
-            data=ListAlbumSerializer.to_response(
-                qs.all(),
-                self.get_params(request),
-            ),
-            status=status.HTTP_200_OK,
-        )
+
+        try:
+            data = ListAlbumSerializer.to_response(qs.all(), self.get_params(request))
+        except ValueError as e:
+            return Response(
+                data={"message": str(e)}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(data=data, status=status.HTTP_200_OK)
 
     def retrieve(self, request: Request, album_pk: str) -> Response:
         """GET /albums/{pk}.
 
         Retrieves a single album by its primary key.
         """
-        album = (
-            self.get_queryset(request)
-            .prefetch_related("tracks", "artists")
-            .get(
-                id=uuid.UUID(album_pk),
-            )
+        album = RetrieveAlbumSerializer.plan.apply(self.get_queryset(request)).get(
+            id=uuid.UUID(album_pk)
         )
         return Response(
             data={"data": RetrieveAlbumSerializer.get(album).model_dump()},
@@ -0,0 +1,113 @@
+"""Bulk writes of many-to-many memberships.
+
+Adding members one at a time through a related manager costs a query (or
+more) per row. A membership writer works on the through table directly:
+it reads the current members of an owner once, then applies the inserts
+and the deletes with one statement each.
+
+    LIBRARY_TRACKS = MembershipWriter(Library.tracks.through, "library", "track")
+    LIBRARY_TRACKS.set(library.pk, track_pks)
+
+Writes don't send ``m2m_changed`` signals.
+"""
+
+import dataclasses
+import typing
+import uuid
+
+from django.db import models, transaction
+
+PK = int | str | uuid.UUID
+
+
+@dataclasses.dataclass
+class MembershipDiff:
+    """Members added to & removed from an owner."""
+
+    added: set[PK] = dataclasses.field(default_factory=set)
+    removed: set[PK] = dataclasses.field(default_factory=set)
+
+    @property
+    def as_dict(self) -> dict:
+        """Return the dataclass as a dictionary."""
+        return dataclasses.asdict(self)
+
+
+class MembershipWriter:
+    """Bulk writer for the members of a many-to-many relation.
+
+    Args:
+        through: The relation's through model.
+        owner: Name of the through model's foreign key to the owner.
+        member: Name of the through model's foreign key to the members.
+    """
+
+    def __init__(self, through: type[models.Model], owner: str, member: str) -> None:
+        """Configure the writer for a through model."""
+        self.through = through
+        self.owner = self.foreign_key(owner).attname
+        self.member = self.foreign_key(member).attname
+
+    def foreign_key(self, name: str) -> models.ForeignKey:
+        """A foreign key of the through model."""
+        field = self.through._meta.get_field(name)
+
+        if not isinstance(field, models.ForeignKey):
+            raise ValueError(f"{self.through.__name__}.{name} isn't a foreign key.")
+
+        return field
+
+    def members(self, owner_pk: PK) -> set[PK]:
+        """Primary keys of an owner's members."""
+        return set(
+            self.through._default_manager.filter(**{self.owner: owner_pk}).values_list(
+                self.member, flat=True
+            )
+        )
+
+    def add(self, owner_pk: PK, member_pks: typing.Iterable[PK]) -> None:
+        """Link members to an owner, in a single insert."""
+        self.through._default_manager.bulk_create(
+            [self.row(owner_pk, pk) for pk in dict.fromkeys(member_pks)],
+            ignore_conflicts=True,
+        )
+
+    def remove(self, owner_pk: PK, member_pks: typing.Iterable[PK]) -> None:
+        """Unlink members from an owner, in a single delete."""
+        self.through._default_manager.filter(
+            **{self.owner: owner_pk, f"{self.member}__in": list(member_pks)}
+        ).delete()
+
+    def prune(self, owner_pk: PK, keep: typing.Iterable[PK]) -> int:
+        """Unlink every member of an owner that isn't kept."""
+        deleted, _ = (
+            self.through._default_manager.filter(**{self.owner: owner_pk})
+            .exclude(**{f"{self.member}__in": list(keep)})
+            .delete()
+        )
+
+        return deleted
+
+    def set(self, owner_pk: PK, member_pks: typing.Iterable[PK]) -> MembershipDiff:
+        """Make the given members the owner's only members.
+
+        The desired members are diffed against the current ones, so only
+        the changes are written.
+        """
+        desired = set(member_pks)
+
+        with transaction.atomic():
+            current = self.members(owner_pk)
+            diff = MembershipDiff(added=desired - current, removed=current - desired)
+
+            if diff.removed:
+                self.remove(owner_pk, diff.removed)
+
+            if diff.added:
+                self.add(owner_pk, diff.added)
+
+        return diff
+
+    def row(self, owner_pk: PK, member_pk: PK) -> models.Model:
+        """Through model instance linking a member to an owner."""
+        return self.through(**{self.owner: owner_pk, self.member: member_pk})
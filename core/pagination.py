@@ -0,0 +1,190 @@
+"""Keyset (cursor) pagination.
+
+A page is read after the sort keys of the last row of the previous page
+(the cursor) instead of at an offset, so every page costs the same however
+deep it is, and no ``COUNT(*)`` is needed to know whether there's a next
+page. The primary key breaks ties, which makes the ordering stable.
+"""
+
+import base64
+import binascii
+import dataclasses
+import json
+
+from django.db import connections, models
+
+
+@dataclasses.dataclass
+class OrderKey:
+    """A sort key of a paginated queryset."""
+
+    field: models.Field
+    descending: bool = False
+
+    @property
+    def name(self) -> str:
+        """Name of the field."""
+        return self.field.name
+
+    @property
+    def ordering(self) -> models.OrderBy:
+        """Order by expression, nulls are last in either direction."""
+        expression = models.F(self.name)
+        nulls_last = True if self.field.null else None
+
+        if self.descending:
+            return expression.desc(nulls_last=nulls_last)
+
+        return expression.asc(nulls_last=nulls_last)
+
+    @property
+    def as_dict(self) -> dict:
+        """Return the dataclass as a dictionary."""
+        return {"name": self.name, "descending": self.descending}
+
+    def equal(self, value: object) -> models.Q:
+        """Rows with the key's value."""
+        if value is None:
+            return models.Q(**{f"{self.name}__isnull": True})
+
+        return models.Q(**{self.name: value})
+
+    def beyond(self, value: object) -> models.Q | None:
+        """Rows that are ordered after the key's value, if any can be."""
+        if value is None:
+            return None
+
+        lookup = "lt" if self.descending else "gt"
+        condition = models.Q(**{f"{self.name}__{lookup}": value})
+
+        if self.field.null:
+            condition |= models.Q(**{f"{self.name}__isnull": True})
+
+        return condition
+
+
+@dataclasses.dataclass
+class KeysetPage:
+    """A page of rows, with the cursor of the next page."""
+
+    items: list
+    next_cursor: str | None = None
+    approximate_total: int | None = None
+
+    @property
+    def as_dict(self) -> dict:
+        """Return the dataclass as a dictionary."""
+        return dataclasses.asdict(self)
+
+
+class KeysetPaginator:
+    """Paginate a queryset by its ordering.
+
+    The ordering is the queryset's (or its model's default), it can only
+    be made of the model's fields.
+    """
+
+    def __init__(self, qs: models.QuerySet, per_page: int) -> None:
+        """Read the sort keys of the queryset."""
+        self.qs = qs
+        self.per_page = per_page
+        self.keys = self.order_keys(qs)
+
+    @staticmethod
+    def order_keys(qs: models.QuerySet) -> list[OrderKey]:
+        """Sort keys of a queryset, ending with its primary key."""
+        opts = qs.model._meta
+        keys = []
+
+        for ordering in qs.query.order_by or opts.ordering:
+            if not isinstance(ordering, str) or "__" in ordering or ordering == "?":
+                raise ValueError(f"Can't paginate by {ordering}.")
+
+            name = ordering.lstrip("-")
+            field = opts.pk if name == "pk" else opts.get_field(name)
+
+            keys.append(OrderKey(field=field, descending=ordering.startswith("-")))
+
+            if field.primary_key:
+                return keys
+
+        return [*keys, OrderKey(field=opts.pk)]
+
+    def encode(self, obj: models.Model) -> str:
+        """Cursor of the position after a row."""
+        payload = {
+            "k": [key.as_dict for key in self.keys],
+            "v": [getattr(obj, key.field.attname) for key in self.keys],
+        }
+        data = json.dumps(payload, default=str, separators=(",", ":")).encode()
+
+        return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+    def decode(self, cursor: str) -> list:
+        """Sort key values of a cursor."""
+        try:
+            data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            payload = json.loads(data)
+        except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+            raise ValueError("Invalid cursor.") from e
+
+        if payload.get("k") != [key.as_dict for key in self.keys]:
+            raise ValueError("The cursor doesn't match the ordering.")
+
+        try:
+            return [
+                None if value is None else key.field.to_python(value)
+                for key, value in zip(self.keys, payload["v"], strict=True)
+            ]
+        except Exception as e:
+            raise ValueError("Invalid cursor.") from e
+
+    def after(self, values: list) -> models.Q | None:
+        """Rows ordered after the sort key values."""
+        condition: models.Q | None = None
+
+        for key, value in reversed(list(zip(self.keys, values, strict=True))):
+            beyond = key.beyond(value)
+            tied = None if condition is None else key.equal(value) & condition
+
+            if beyond is not None and tied is not None:
+                condition = beyond | tied
+            else:
+                condition = beyond if beyond is not None else tied
+
+        return condition
+
+    def page(self, cursor: str | None = None, approximate: bool = False) -> KeysetPage:
+        """Read the page after a cursor (or the first page).
+
+        With ``approximate``, the planner's estimate of the number of rows
+        is included rather than counting them.
+        """
+        qs = self.qs.order_by(*[key.ordering for key in self.keys])
+
+        if cursor:
+            after = self.after(self.decode(cursor))
+            qs = qs.filter(after) if after is not None else qs.none()
+
+        rows = list(qs[: self.per_page + 1])
+        items = rows[: self.per_page]
+
+        return KeysetPage(
+            items=items,
+            next_cursor=self.encode(items[-1]) if len(rows) > self.per_page else None,
+            approximate_total=approximate_count(self.qs) if approximate else None,
+        )
+
+
+def approximate_count(qs: models.QuerySet) -> int | None:
+    """The planner's estimate of the number of rows of a queryset.
+
+    Only available with PostgreSQL, it's read from the query plan rather
+    than counting the rows.
+    """
+    if connections[qs.db].vendor != "postgresql":
+        return None
+
+    plan = json.loads(qs.order_by().explain(format="json"))
+
+    return int(plan[0]["Plan"]["Plan Rows"])
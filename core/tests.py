@@ -2,12 +2,15 @@ import unittest
 from http import HTTPStatus
 from unittest.mock import MagicMock, patch
 
+from django.db.models import QuerySet
 from django.test import TestCase
 from django.urls import reverse
 from loguru import logger
 
 from api.libs.helpers import SpotifyAuthServiceMock, TestHelpers
+from api.models import Playlist
 from api.services.spotify import SpotifyAuthService
+from core.pagination import KeysetPaginator
 from core.serializers import TokenSerializer
 
 logger.remove(0)
@@ -96,3 +99,65 @@ class AppUserTestCase(TestCase):
     def test_should_refresh_token(self) -> None:
         """Test should_refresh_token method."""
         pass
+
+
+class KeysetPaginatorTestCase(TestCase):
+    def setUp(self):
+        # nullable sort keys & ties, broken by the primary key
+        self.playlists = [
+            Playlist.objects.create(
+                name=f"playlist {i % 3}",
+                spotify_id=f"playlist-{i}",
+                owner_id="owner",
+                is_synced=[True, False, None][i % 3],
+            )
+            for i in range(10)
+        ]
+
+    def walk(self, qs: QuerySet, per_page: int = 3) -> list:
+        paginator = KeysetPaginator(qs, per_page)
+        page = paginator.page()
+        items = list(page.items)
+
+        while page.next_cursor:
+            page = paginator.page(page.next_cursor)
+            items.extend(page.items)
+
+        return items
+
+    def test_walks_every_row_in_order(self):
+        for ordering in (["-is_synced", "name"], ["is_synced", "-name"], ["name"]):
+            qs = Playlist.objects.order_by(*ordering)
+            keys = KeysetPaginator.order_keys(qs)
+            expected = list(Playlist.objects.order_by(*[k.ordering for k in keys]))
+
+            self.assertEqual(self.walk(qs), expected)
+
+    def test_deep_pages_use_constant_queries(self):
+        paginator = KeysetPaginator(Playlist.objects.order_by("name"), 2)
+        cursor = paginator.page().next_cursor
+
+        with self.assertNumQueries(1):
+            page = paginator.page(cursor)
+
+        for _ in range(3):
+            page = paginator.page(page.next_cursor)
+
+        with self.assertNumQueries(1):
+            paginator.page(page.next_cursor)
+
+    def test_cursor_must_match_ordering(self):
+        cursor = KeysetPaginator(Playlist.objects.order_by("name"), 3).page()
+
+        with self.assertRaises(ValueError):
+            KeysetPaginator(Playlist.objects.order_by("-name"), 3).page(
+                cursor.next_cursor
+            )
+
+        with self.assertRaises(ValueError):
+            KeysetPaginator(Playlist.objects.order_by("name"), 3).page("not-a-cursor")
+
+    def test_approximate_total(self):
+        page = KeysetPaginator(Playlist.objects.all(), 3).page(approximate=True)
+
+        self.assertIsInstance(page.approximate_total, int)
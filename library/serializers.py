@@ -2,9 +2,11 @@
 
 import typing
 
+from django.utils import timezone
 from pydantic import BaseModel
 
 from api.models import Artist, Playlist, Track
+from api.serializers import validation
 from browser.models import Library
 
 
@@ -222,6 +224,7 @@ class TrackAPISerializer(APISerializer):
     image_url: str
     duration_ms: int
     link: str
+    album_type: str = "album"
     id: str | None = None
     is_synced: bool = False
     is_analyzed: bool = False
@@ -240,6 +243,7 @@ class TrackAPISerializer(APISerializer):
             "image_url": "track.album.images.0.url",
             "duration_ms": "track.duration_ms",
             "link": "track.external_urls.spotify",
+            "album_type": "track.album.album_type",
         }
 
     @classmethod
@@ -261,6 +265,32 @@ class TrackAPISerializer(APISerializer):
 
         return cls(**data)
 
+    def sync_data(self) -> validation.SyncTrackData:
+        """Track, album & artist data for a bulk sync."""
+        release_year = self.album_release_date.split("-")[0]
+
+        return validation.SyncTrackData(
+            track=validation.SyncTrack(
+                name=self.name,
+                spotify_id=self.spotify_id,
+                duration=self.duration_ms,
+                album_id=self.album_id,
+            ),
+            album=validation.SyncTrackAlbum(
+                name=self.album_name,
+                spotify_id=self.album_id,
+                image_url=self.image_url,
+                artist_ids=[self.artist_id],
+                album_type=self.album_type or "album",
+                release_year=int(release_year) if release_year else timezone.now().year,
+            ),
+            artists=[
+                validation.SyncTrackArtist(
+                    spotify_id=self.artist_id, name=self.artist_name
+                )
+            ],
+        )
+
 
 class ArtistAPISerializer(APISerializer):
     """Artist API response data."""
@@ -1,5 +1,14 @@
-from library.tasks.artists import sync_artists_from_request, sync_genres_from_artist
+from library.tasks.artists import (
+    sync_artists_from_request,
+    sync_genres_from_artist,
+    sync_genres_from_artists,
+)
 from library.tasks.playlists import sync_and_add_playlists_to_library
+from library.tasks.saved import (
+    refresh_saved_libraries,
+    sync_saved_albums,
+    sync_saved_tracks,
+)
 from library.tasks.track import (
     sync_track_features_from_request,
     sync_tracks_from_request,
@@ -3,11 +3,11 @@
 import uuid
 
 from celery import shared_task
+from django.db import transaction
 from loguru import logger
 
 from api.models import Artist
-from api.models.music import Genre
-from browser.models import Library
+from browser.models import LIBRARY_ARTISTS, LIBRARY_GENRES, Library
 from library.serializers import ArtistAPISerializer
 
 
@@ -23,17 +23,44 @@ def sync_artists_from_request(user_id: int, api_artists: list[dict]) -> None:
         logger.info(f"Artists already exist and are synced in library {library.id}")
         return
 
-    for count, item in enumerate(data):
-        artist, _ = Artist.objects.get_or_create(
-            spotify_id=item.spotify_id,
-            defaults={"name": item.name},
+    with transaction.atomic():
+        Artist.objects.bulk_create(
+            [
+                Artist(spotify_id=spotify_id, name=name)
+                for spotify_id, name in {a.spotify_id: a.name for a in data}.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["spotify_id"],
+            update_fields=["name", "updated_at"],
         )
 
-        sync_genres_from_artist.s((artist.id), item.genres).apply_async()
+        artist_pks = list(
+            Artist.objects.filter(spotify_id__in=exists).values_list("pk", flat=True)
+        )
+
+        LIBRARY_ARTISTS.add(library.pk, artist_pks)
+
+    sync_genres_from_artists.s(
+        user_id, {item.spotify_id: item.genres for item in data}
+    ).apply_async()
+
+    logger.info(
+        f"Synced {len(artist_pks)} / {len(data)} artists to library {library.id}"
+    )
+
 
-        library.artists.add(artist)
-        library.save()
-        logger.info(f"Synced {count + 1} / {len(data)} artists to library {library.id}")
+@shared_task
+def sync_genres_from_artists(user_id: int, artist_genres: dict[str, list[str]]) -> None:
+    """Sync the genres of artists (by Spotify ID) to the user's library."""
+    library, _ = Library.objects.get_or_create(user_id=user_id)
+    genre_pks = Artist.sync.sync_genres(artist_genres)
+
+    LIBRARY_GENRES.add(library.pk, genre_pks)
+
+    logger.info(
+        f"Synced {len(genre_pks)} genres of {len(artist_genres)} artists to "
+        f"library {library.id}"
+    )
 
 
 @shared_task
@@ -41,11 +68,6 @@ def sync_genres_from_artist(artist_id: uuid.UUID, genres: list[str]) -> None:
     """Sync genres from an artist."""
     artist = Artist.objects.get(id=artist_id)
 
-    for g in genres:
-        genre, _ = Genre.objects.get_or_create(name=g)
-        artist.genres.add(genre)
-
-    artist.is_synced = True
-    artist.save()
+    Artist.sync.sync_genres({artist.spotify_id: genres})
 
     logger.info(f"Synced {len(genres)} genres to artist {artist.id}")
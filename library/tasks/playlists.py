@@ -1,6 +1,5 @@
 """Syncing of library data from real-time endpoints."""
 
-import time
 import typing
 
 from celery import Task, shared_task, states
@@ -8,20 +7,16 @@ from celery.signals import task_postrun, task_prerun
 from django.db.models import Q
 from loguru import logger
 
-from api.models import Playlist, Track
-from api.services.spotify import (
-    SpotifyAuthService,
-    SpotifyDataService,
-    SpotifyLibraryService,
-)
-from browser.models import Library
+from api.models import Playlist
+from api.services.spotify import SpotifyAuthService, SpotifyLibraryService
+from browser.models import LIBRARY_PLAYLISTS, Library
+from browser.tasks import PlaylistSync
 from core.models import AppUser
 from library.serializers import PlaylistAPISerializer
 from live.models import Notification
 from live.signals import notify_failure, notify_success
 
 user_service = SpotifyAuthService()
-data_service = SpotifyDataService()
 library_service = SpotifyLibraryService(user_service)
 
 
@@ -48,41 +43,44 @@ def sync_and_add_playlists_to_library(
             [(str(playlist.id), playlist.spotify_id) for playlist in qs.all()],
         )
 
-    synced = {"count": 0}
+    # The listing carries each playlist's snapshot, so unchanged playlists
+    # can be told apart before their tracks are downloaded.
+    stale = Playlist.sync.stale({p.spotify_id: p.version for p in models})
+
+    # A stale playlist is stored with its new snapshot before its items are
+    # synced, it's only marked synced once they're written.
+    for model in models:
+        if model.spotify_id in stale:
+            model.is_synced = False
 
     logger.debug(f"User: {user.pk} | {user.spotify_id}, Library: {library.id}")
 
     playlists: list[Playlist] = [playlist.to_db() for playlist in models]
-    for i, playlist in enumerate(playlists):
-        logger.info(f"Syncing playlist {playlist.name} to library {library.id}")
-        logger.debug(f"Playlist ({i + 1}): {playlist.pk} | {playlist.spotify_id}")
-        library.playlists.add(playlist)
-
-        synced["count"] = i
 
-    library.save()
+    LIBRARY_PLAYLISTS.add(library.pk, [playlist.pk for playlist in playlists])
 
     logger.info(
-        f"Synced {synced['count'] + 1} / {len(api_playlists)} playlists to "
+        f"Synced {len(playlists)} / {len(api_playlists)} playlists to "
         f"library {library.id}"
     )
 
     for playlist in playlists:
         spotify_id = playlist.spotify_id
 
+        if spotify_id not in stale:
+            logger.info(f"Playlist {playlist.pk} is unchanged, skipping its tracks")
+
+            playlist.is_synced = True
+            playlist.save()
+
+            continue
+
         logger.info(
             f"Syncing playlist tracks for {playlist.pk} | {playlist.spotify_id}"
         )
 
-        time.sleep(0.5)
-        response = data_service.fetch_playlist_tracks(spotify_id, user_id)
-        time.sleep(0.5)
-
-        cleaned = Track.sync.pre_sync(response)
-        data = Track.sync.do(cleaned)
-        result = Track.sync.complete_sync(playlist.pk, data)
-
-        logger.debug(f"Synced {str(result)}")
+        # The items are streamed a page at a time, like a single playlist's
+        PlaylistSync(user_id, playlist.pk).track_sync(playlist)
 
         playlist.is_synced = True
         playlist.save()
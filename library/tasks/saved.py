@@ -0,0 +1,172 @@
+"""Incremental syncing of saved tracks & albums.
+
+Saved items are listed newest first with the time they were added, so
+a sync only requests the items saved since the library's watermark. It's
+usually a single request, the first page also carries the total count.
+When that count doesn't match the library's saved items (and the saved
+items that couldn't be stored), items were removed (or missed) and the
+whole collection is walked again to reconcile the library.
+"""
+
+import datetime
+
+from celery import shared_task
+from loguru import logger
+
+from api.models import Album, Track
+from api.services.spotify import SpotifyAuthService, SpotifyLibraryService
+from api.services.spotify.library import SavedItems
+from browser.models import (
+    LIBRARY_ALBUMS,
+    LIBRARY_SAVED_ALBUMS,
+    LIBRARY_SAVED_TRACKS,
+    LIBRARY_TRACKS,
+    Library,
+)
+
+library_service = SpotifyLibraryService(SpotifyAuthService())
+
+
+def added_at(item: dict) -> datetime.datetime:
+    """When a saved item was added."""
+    return datetime.datetime.fromisoformat(item["added_at"])
+
+
+def watermark(saved: SavedItems) -> datetime.datetime | None:
+    """When the latest of the saved items was added."""
+    if not saved.items:
+        return None
+
+    return max(added_at(item) for item in saved.items)
+
+
+def skipped(
+    saved: SavedItems, key: str, stored: set[str], after: datetime.datetime | None
+) -> int:
+    """Number of the items saved after ``after`` that weren't stored.
+
+    Items saved at the watermark itself are listed again by the next sync,
+    so they're only counted once.
+    """
+    return sum(
+        1
+        for item in saved.items
+        if (after is None or added_at(item) > after)
+        and (item.get(key) or {}).get("id") not in stored
+    )
+
+
+@shared_task
+def sync_saved_tracks(user_id: int, full: bool = False) -> int:
+    """Sync the tracks saved since the last sync.
+
+    With ``full``, every saved track is synced and the library's saved
+    tracks are replaced. Returns the number of synced tracks.
+    """
+    library, _ = Library.objects.get_or_create(user_id=user_id)
+    after = None if full else library.tracks_saved_until
+    saved = library_service.library_tracks_after(user_id, after)
+
+    synced = Track.sync.do(Track.sync.pre_sync(saved.items))
+    track_pks = [pk for pk, _ in synced]
+    missing = skipped(saved, "track", {spotify_id for _, spotify_id in synced}, after)
+
+    Track.objects.filter(pk__in=track_pks).update(is_synced=True)
+
+    if full:
+        diff = LIBRARY_SAVED_TRACKS.set(library.pk, track_pks)
+
+        if diff.removed:
+            LIBRARY_TRACKS.remove(library.pk, diff.removed)
+    else:
+        LIBRARY_SAVED_TRACKS.add(library.pk, track_pks)
+
+        missing += library.tracks_saved_skipped
+
+    LIBRARY_TRACKS.add(library.pk, track_pks)
+
+    Library.objects.filter(pk=library.pk).update(
+        tracks_saved_until=watermark(saved) or library.tracks_saved_until,
+        tracks_saved_skipped=missing,
+    )
+
+    logger.info(f"Synced {len(track_pks)} saved tracks to library {library.id}.")
+
+    count = library.saved_tracks.count()
+
+    if not full and count + missing != saved.total:
+        logger.info(
+            f"Library {library.id} has {count} (and {missing} skipped) of "
+            f"{saved.total} saved tracks, reconciling."
+        )
+
+        return sync_saved_tracks(user_id, full=True)
+
+    return len(track_pks)
+
+
+@shared_task
+def sync_saved_albums(user_id: int, full: bool = False) -> int:
+    """Sync the albums saved since the last sync.
+
+    With ``full``, every saved album is synced and the library's saved
+    albums are replaced. Returns the number of synced albums.
+    """
+    library, _ = Library.objects.get_or_create(user_id=user_id)
+    after = None if full else library.albums_saved_until
+    saved = library_service.library_albums_after(user_id, after)
+
+    cleaned = []
+
+    for item in saved.items:
+        try:
+            cleaned.append(Album.sync.clean_data(item.get("album", {})))
+        except ValueError as e:
+            logger.error(f"Skipping saved album: {e}")
+
+    synced = Track.sync.do_albums(cleaned)
+    album_pks = [pk for pk, _ in synced]
+    missing = skipped(saved, "album", {spotify_id for _, spotify_id in synced}, after)
+
+    if full:
+        diff = LIBRARY_SAVED_ALBUMS.set(library.pk, album_pks)
+
+        if diff.removed:
+            LIBRARY_ALBUMS.remove(library.pk, diff.removed)
+    else:
+        LIBRARY_SAVED_ALBUMS.add(library.pk, album_pks)
+
+        missing += library.albums_saved_skipped
+
+    LIBRARY_ALBUMS.add(library.pk, album_pks)
+
+    Library.objects.filter(pk=library.pk).update(
+        albums_saved_until=watermark(saved) or library.albums_saved_until,
+        albums_saved_skipped=missing,
+    )
+
+    logger.info(f"Synced {len(album_pks)} saved albums to library {library.id}.")
+
+    count = library.saved_albums.count()
+
+    if not full and count + missing != saved.total:
+        logger.info(
+            f"Library {library.id} has {count} (and {missing} skipped) of "
+            f"{saved.total} saved albums, reconciling."
+        )
+
+        return sync_saved_albums(user_id, full=True)
+
+    return len(album_pks)
+
+
+@shared_task
+def refresh_saved_libraries() -> int:
+    """Schedule a saved tracks & albums sync for every library."""
+    user_ids = list(Library.objects.values_list("user_id", flat=True))
+
+    for user_id in user_ids:
+        sync_saved_tracks.s(user_id).apply_async()
+        sync_saved_albums.s(user_id).apply_async()
+
+    return len(user_ids)
@@ -1,16 +1,17 @@
 """Track tasks."""
 
 from celery import shared_task
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
 from loguru import logger
 
-from api.models import Album, Artist, Track, TrackFeatures
+from api.models import Track, TrackFeatures
 from api.services.spotify import (
+    FEATURES,
     SpotifyAuthService,
     SpotifyDataService,
     SpotifyLibraryService,
 )
-from browser.models import Library
+from browser.models import LIBRARY_TRACKS, Library
 from core.models import AppUser
 from library.serializers import TrackAPISerializer, TrackFeaturesAPISerializer
 
@@ -21,7 +22,12 @@ LIBRARY = SpotifyLibraryService(auth_service=AUTH)
 
 @shared_task
 def sync_tracks_from_request(user_id: int, api_tracks: list[dict]) -> None:
-    """Sync tracks from a request."""
+    """Sync tracks from a request.
+
+    The page of tracks is ingested in bulk: artists, albums & tracks are
+    upserted together, linked to the library with one insert, and the
+    missing audio features are written with a single upsert.
+    """
     models = [TrackAPISerializer(**t) for t in api_tracks]
     user = AppUser.objects.get(id=user_id)
     library, _ = Library.objects.get_or_create(user_id=user_id)
@@ -32,70 +38,32 @@ def sync_tracks_from_request(user_id: int, api_tracks: list[dict]) -> None:
     exist = Q(spotify_id__in=spotify_ids)
     has_audio_features = Q(features__isnull=False)
 
-    qs = library.tracks.filter(exist & has_audio_features)
-
-    if qs.exists() and qs.count() == len(models):
+    if library.tracks.filter(exist & has_audio_features).count() == len(
+        set(spotify_ids)
+    ):
         logger.info(f"Tracks already added to library {library.id}")
 
         return
 
-    counts = {"synced": 0, "analyzed": 0}
-
-    audio_features = {
-        t["id"]: t for t in DATA.fetch_audio_features(spotify_ids, user_id)
-    }
-
-    for i, tr in enumerate(models):
-        artist, _ = Artist.objects.get_or_create(
-            spotify_id=tr.artist_id, defaults={"name": tr.artist_name}
-        )
-
-        album, _ = Album.objects.get_or_create(
-            spotify_id=tr.album_id,
-            defaults={
-                "name": tr.album_name,
-                "release_year": int(tr.album_release_date[:4]),
-            },
-        )
-        album.artists.add(artist)
-        album.save()
-
-        track, _ = Track.objects.update_or_create(
-            spotify_id=tr.spotify_id,
-            defaults={
-                "album": album,
-                "name": tr.name,
-                "duration": int(tr.duration_ms),
-                "is_synced": True,
-                "is_analyzed": False,
-            },
-        )
-
-        library.tracks.add(track)
-        library.save()
-
-        counts["synced"] += i
+    synced = Track.sync.do([track.sync_data() for track in models])
+    track_pks = [track_pk for track_pk, _ in synced]
 
-        if ft := audio_features.get(track.spotify_id):
-            cleaned = TrackFeaturesAPISerializer(**ft)
-            features = cleaned.model_dump()
+    LIBRARY_TRACKS.add(library.pk, track_pks)
 
-            del features["id"]
-
-            track_features, _ = TrackFeatures.objects.update_or_create(
-                track=track,
-                defaults=features,
-            )
-
-            track.is_analyzed = True
-            track.save()
+    missing = TrackFeatures.sync.missing(spotify_ids)
+    analyzed = TrackFeatures.sync.bulk_upsert(
+        FEATURES.audio_features(missing, user_id) if missing else []
+    )
 
-            counts["analyzed"] += i
+    Track.objects.filter(pk__in=track_pks).update(
+        is_synced=True,
+        is_analyzed=Exists(TrackFeatures.objects.filter(track=OuterRef("pk"))),
+    )
 
-            logger.info(
-                f"Recorded features {track_features.id} for track {track.id} |"
-                f" {track.spotify_id}"
-            )
+    logger.info(
+        f"Synced {len(track_pks)} tracks to library {library.id}, "
+        f"recorded features for {analyzed}."
+    )
 
 
 @shared_task
@@ -118,6 +86,8 @@ def sync_track_features_from_request(
     track.is_analyzed = True
     track.save()
 
+    TrackFeatures.sync.recount([track.pk])
+
     logger.info(
         f"Recorded features {track_features.id} for track {track.id} |"
         f" {track.spotify_id}"
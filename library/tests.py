@@ -0,0 +1,455 @@
+import datetime
+import typing
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from faker import Faker
+
+from api.libs.exceptions import SpotifyAPIError
+from api.libs.helpers import TestHelpers
+from api.models import Album, Artist, Genre, Playlist, Track, TrackFeatures
+from api.services.spotify import SpotifyLibraryService
+from browser.models import Library
+from browser.tasks import LIBRARY
+from core.models import AppUser
+from library.tasks import (
+    sync_and_add_playlists_to_library,
+    sync_artists_from_request,
+    sync_genres_from_artists,
+    sync_saved_albums,
+    sync_saved_tracks,
+    sync_tracks_from_request,
+)
+from library.tasks.track import FEATURES
+
+fake = Faker()
+
+
+def api_track() -> dict:
+    return {
+        "spotify_id": str(fake.uuid4()),
+        "name": fake.name(),
+        "artist_name": fake.name(),
+        "artist_id": str(fake.uuid4()),
+        "album_name": fake.name(),
+        "album_id": str(fake.uuid4()),
+        "album_release_date": "2020-01-01",
+        "image_url": fake.image_url(),
+        "duration_ms": fake.random_int(60_000, 600_000),
+        "link": fake.url(),
+        "album_type": "single",
+    }
+
+
+def audio_features(spotify_id: str) -> dict:
+    return {
+        "id": spotify_id,
+        "danceability": fake.pyfloat(min_value=0, max_value=1),
+        "energy": fake.pyfloat(min_value=0, max_value=1),
+        "key": fake.random_int(0, 11),
+        "loudness": fake.pyfloat(min_value=-60, max_value=0),
+        "mode": fake.random_int(0, 1),
+        "speechiness": fake.pyfloat(min_value=0, max_value=1),
+        "acousticness": fake.pyfloat(min_value=0, max_value=1),
+        "instrumentalness": fake.pyfloat(min_value=0, max_value=1),
+        "liveness": fake.pyfloat(min_value=0, max_value=1),
+        "valence": fake.pyfloat(min_value=0, max_value=1),
+        "tempo": fake.pyfloat(min_value=50, max_value=200),
+        "duration_ms": fake.random_int(60_000, 600_000),
+        "time_signature": 4,
+    }
+
+
+class SyncTracksFromRequestTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.library, _ = Library.objects.get_or_create(user=self.user)
+        self.fetched: list[list[str]] = []
+
+    def audio_features(self, track_ids: list[str], user_pk: int) -> list[dict]:
+        self.fetched.append(list(track_ids))
+
+        return [audio_features(spotify_id) for spotify_id in track_ids]
+
+    def sync(self, api_tracks: list[dict]) -> int:
+        with (
+            mock.patch.object(FEATURES, "audio_features", self.audio_features),
+            CaptureQueriesContext(connection) as queries,
+        ):
+            sync_tracks_from_request(self.user.pk, api_tracks)
+
+        return len(queries)
+
+    def test_sync_tracks_from_request(self):
+        api_tracks = [api_track() for _ in range(5)]
+
+        self.sync(api_tracks)
+
+        spotify_ids = {t["spotify_id"] for t in api_tracks}
+        tracks = self.library.tracks.filter(spotify_id__in=spotify_ids)
+
+        self.assertEqual(tracks.count(), 5)
+        self.assertEqual(tracks.filter(is_synced=True, is_analyzed=True).count(), 5)
+        self.assertEqual(
+            TrackFeatures.objects.filter(track__spotify_id__in=spotify_ids).count(), 5
+        )
+        self.assertEqual(
+            set(
+                Album.objects.filter(
+                    spotify_id__in=[t["album_id"] for t in api_tracks]
+                ).values_list("album_type", flat=True)
+            ),
+            {"single"},
+        )
+
+    def test_sync_tracks_from_request_only_fetches_missing_features(self):
+        api_tracks = [api_track() for _ in range(5)]
+
+        self.sync(api_tracks[:2])
+        self.sync(api_tracks)
+
+        self.assertEqual(self.fetched[1], [t["spotify_id"] for t in api_tracks[2:]])
+        self.assertEqual(
+            Track.objects.filter(
+                spotify_id__in=[t["spotify_id"] for t in api_tracks],
+                is_analyzed=True,
+            ).count(),
+            5,
+        )
+
+    def test_sync_tracks_from_request_constant_queries(self):
+        small = self.sync([api_track() for _ in range(2)])
+        large = self.sync([api_track() for _ in range(20)])
+
+        self.assertEqual(small, large)
+
+    def test_sync_tracks_from_request_skips_synced_page(self):
+        api_tracks = [api_track() for _ in range(3)]
+
+        self.sync(api_tracks)
+        self.sync(api_tracks)
+
+        self.assertEqual(len(self.fetched), 1)
+
+
+def api_artist(genres: list[str]) -> dict:
+    return {
+        "genres": genres,
+        "spotify_id": str(fake.uuid4()),
+        "name": fake.name(),
+        "link": fake.url(),
+        "image_url": fake.image_url(),
+    }
+
+
+class SyncArtistsFromRequestTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.library, _ = Library.objects.get_or_create(user=self.user)
+        self.genres = [fake.unique.word() for _ in range(5)]
+        self.api_artists = [
+            api_artist(self.genres[i : i + 3]) for i in range(len(self.genres) - 2)
+        ]
+
+    @mock.patch("library.tasks.artists.sync_genres_from_artists.s")
+    def test_sync_artists_from_request(self, mock_task: mock.MagicMock):
+        sync_artists_from_request(self.user.pk, self.api_artists)
+
+        self.assertEqual(self.library.artists.count(), len(self.api_artists))
+        mock_task.assert_called_once_with(
+            self.user.pk, {a["spotify_id"]: a["genres"] for a in self.api_artists}
+        )
+        mock_task.return_value.apply_async.assert_called_once()
+
+    @mock.patch("library.tasks.artists.sync_genres_from_artists.s")
+    def test_sync_genres_from_artists(self, _: mock.MagicMock):
+        sync_artists_from_request(self.user.pk, self.api_artists)
+
+        artist_genres = {a["spotify_id"]: a["genres"] for a in self.api_artists}
+
+        with self.assertNumQueries(9):
+            sync_genres_from_artists(self.user.pk, artist_genres)
+
+        self.assertEqual(Genre.objects.count(), len(self.genres))
+        self.assertEqual(
+            set(self.library.genres.values_list("name", flat=True)), set(self.genres)
+        )
+
+        for spotify_id, genres in artist_genres.items():
+            artist = Artist.objects.get(spotify_id=spotify_id)
+
+            self.assertTrue(artist.is_synced)
+            self.assertEqual(
+                set(artist.genres.values_list("name", flat=True)), set(genres)
+            )
+
+
+def saved_track(added_at: datetime.datetime) -> dict:
+    artist = {"id": str(fake.uuid4()), "name": fake.name()}
+
+    return {
+        "added_at": added_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "track": {
+            "id": str(fake.uuid4()),
+            "name": fake.name(),
+            "type": "track",
+            "duration_ms": fake.random_int(60_000, 600_000),
+            "album": {
+                "id": str(fake.uuid4()),
+                "name": fake.name(),
+                "album_type": "album",
+                "release_date": "2020-01-01",
+                "images": [{"url": fake.image_url()}],
+                "artists": [artist],
+            },
+            "artists": [artist],
+        },
+    }
+
+
+def saved_album(added_at: datetime.datetime) -> dict:
+    artist = {"id": str(fake.uuid4()), "name": fake.name()}
+
+    return {
+        "added_at": added_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "album": {
+            "id": str(fake.uuid4()),
+            "name": fake.name(),
+            "album_type": "album",
+            "release_date": "2020-01-01",
+            "images": [{"url": fake.image_url()}],
+            "label": fake.company(),
+            "copyrights": [{"text": fake.company()}],
+            "genres": [],
+            "artists": [artist],
+            "tracks": {
+                "items": [
+                    {
+                        "id": str(fake.uuid4()),
+                        "name": fake.name(),
+                        "duration_ms": fake.random_int(60_000, 600_000),
+                    }
+                    for _ in range(3)
+                ]
+            },
+        },
+    }
+
+
+class SavedItemsTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.library, _ = Library.objects.get_or_create(user=self.user)
+        self.now = timezone.now().replace(microsecond=0)
+        self.saved: list[dict] = []
+        self.requests: list[int] = []
+
+    def fetch(self, url: str, user: AppUser, params: dict | None = None) -> dict:
+        offset = int(url.split("offset=")[1]) if "offset=" in url else 0
+        items = self.saved[offset : offset + 50]
+
+        self.requests.append(offset)
+
+        return {
+            "items": items,
+            "total": len(self.saved),
+            "next": f"me/tracks?offset={offset + 50}"
+            if offset + 50 < len(self.saved)
+            else None,
+        }
+
+
+class SyncSavedTracksTestCase(SavedItemsTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.saved = [
+            saved_track(self.now - datetime.timedelta(hours=i)) for i in range(120)
+        ]
+
+    def sync(self) -> int:
+        with mock.patch.object(SpotifyLibraryService, "fetch", self.fetch):
+            return sync_saved_tracks(self.user.pk)
+
+    def test_first_sync_walks_collection(self):
+        self.assertEqual(self.sync(), 120)
+        self.assertEqual(self.requests, [0, 50, 100])
+        self.assertEqual(self.library.tracks.count(), 120)
+
+        self.library.refresh_from_db()
+
+        self.assertEqual(self.library.tracks_saved_until, self.now)
+
+    def test_incremental_sync_stops_at_watermark(self):
+        self.sync()
+        self.requests.clear()
+
+        later = self.now + datetime.timedelta(minutes=5)
+        self.saved = [saved_track(later), saved_track(later), *self.saved]
+
+        self.sync()
+
+        self.assertEqual(self.requests, [0])
+        self.assertEqual(self.library.tracks.count(), 122)
+
+        self.library.refresh_from_db()
+
+        self.assertEqual(self.library.tracks_saved_until, later)
+
+    def test_total_mismatch_reconciles(self):
+        self.sync()
+        self.requests.clear()
+
+        removed = self.saved.pop(60)
+
+        self.sync()
+
+        self.assertEqual(self.requests, [0, 0, 50, 100])
+        self.assertEqual(self.library.tracks.count(), 119)
+        self.assertFalse(
+            self.library.tracks.filter(spotify_id=removed["track"]["id"]).exists()
+        )
+
+    def test_skipped_items_dont_reconcile(self):
+        episode = saved_track(self.now - datetime.timedelta(minutes=30))
+        episode["track"]["type"] = "episode"
+        self.saved.insert(1, episode)
+
+        self.assertEqual(self.sync(), 120)
+
+        self.requests.clear()
+        self.sync()
+
+        self.assertEqual(self.requests, [0])
+
+    def test_reconcile_keeps_tracks_from_other_sources(self):
+        self.sync()
+
+        requested = Track.objects.create(
+            name=fake.name(), spotify_id=str(fake.uuid4()), duration=180_000
+        )
+        self.library.tracks.add(requested)
+        self.saved.pop(60)
+
+        self.sync()
+
+        self.assertEqual(self.library.saved_tracks.count(), 119)
+        self.assertTrue(self.library.tracks.filter(pk=requested.pk).exists())
+
+
+class SyncSavedAlbumsTestCase(SavedItemsTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.saved = [
+            saved_album(self.now - datetime.timedelta(hours=i)) for i in range(60)
+        ]
+
+    def sync(self) -> int:
+        with mock.patch.object(SpotifyLibraryService, "fetch", self.fetch):
+            return sync_saved_albums(self.user.pk)
+
+    def test_albums_are_synced_in_bulk(self):
+        with CaptureQueriesContext(connection) as one_page:
+            self.saved = self.saved[:10]
+            self.sync()
+
+        self.library.saved_albums.clear()
+        Library.objects.filter(pk=self.library.pk).update(albums_saved_until=None)
+        self.saved = [
+            saved_album(self.now - datetime.timedelta(hours=i)) for i in range(50)
+        ]
+
+        with CaptureQueriesContext(connection) as full_page:
+            self.assertEqual(self.sync(), 50)
+
+        self.assertEqual(len(full_page), len(one_page))
+        self.assertEqual(self.library.saved_albums.count(), 50)
+        self.assertEqual(
+            set(self.library.albums.values_list("num_tracks", flat=True)), {3}
+        )
+
+    def test_invalid_albums_dont_reconcile(self):
+        del self.saved[1]["album"]["release_date"]
+
+        self.assertEqual(self.sync(), 59)
+        self.assertEqual(self.requests, [0, 50])
+
+        self.requests.clear()
+        self.sync()
+
+        self.assertEqual(self.requests, [0])
+
+
+def api_playlist(owner_id: str) -> dict:
+    return {
+        "spotify_id": str(fake.uuid4()),
+        "name": fake.name(),
+        "owner_name": fake.name(),
+        "owner_id": owner_id,
+        "link": fake.url(),
+        "image_url": fake.image_url(),
+        "num_tracks": 6,
+        "track_link": fake.url(),
+        "version": str(fake.uuid4()),
+    }
+
+
+class SyncPlaylistsToLibraryTestCase(TestCase):
+    def setUp(self):
+        self.user = TestHelpers.create_test_user()
+        self.api_playlists = [api_playlist(self.user.spotify_id)]
+        self.now = timezone.now().replace(microsecond=0)
+        self.pages = [
+            [saved_track(self.now - datetime.timedelta(days=i)) for i in range(3)]
+            for _ in range(2)
+        ]
+        self.linked_before_page: list[int] = []
+
+    def playlist_pages(self, *args, **kwargs) -> typing.Iterator[list[dict]]:
+        playlist = Playlist.objects.get(spotify_id=self.api_playlists[0]["spotify_id"])
+
+        for page in self.pages:
+            self.linked_before_page.append(playlist.tracks.count())
+
+            yield page
+
+    def test_playlist_items_are_synced_a_page_at_a_time(self):
+        with mock.patch.object(
+            LIBRARY, "library_playlist_pages", side_effect=self.playlist_pages
+        ):
+            sync_and_add_playlists_to_library(self.user.pk, self.api_playlists)
+
+        playlist = Playlist.objects.get(spotify_id=self.api_playlists[0]["spotify_id"])
+
+        self.assertTrue(playlist.is_synced)
+        self.assertEqual(self.linked_before_page, [0, 3])
+        self.assertEqual(playlist.tracks.count(), 6)
+
+    def test_failed_sync_leaves_the_playlist_stale(self):
+        self.api_playlists[0]["is_synced"] = True
+
+        def failing_pages(*args, **kwargs) -> typing.Iterator[list[dict]]:
+            yield self.pages[0]
+
+            raise SpotifyAPIError("Internal Server Error")
+
+        with (
+            mock.patch.object(
+                LIBRARY, "library_playlist_pages", side_effect=failing_pages
+            ),
+            self.assertRaises(SpotifyAPIError),
+        ):
+            sync_and_add_playlists_to_library(self.user.pk, self.api_playlists)
+
+        playlist = self.api_playlists[0]
+        stored = Playlist.objects.get(spotify_id=playlist["spotify_id"])
+
+        self.assertFalse(stored.is_synced)
+        self.assertEqual(
+            Playlist.sync.stale({playlist["spotify_id"]: playlist["version"]}),
+            {playlist["spotify_id"]},
+        )
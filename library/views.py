@@ -11,6 +11,7 @@ from api.libs.constants import SpotifyAPIEndpoints
 from api.models import Playlist
 from api.serializers.library import ExpandedPlaylist as ExpandedPlaylistSerializer
 from api.services.spotify import (
+    ResponseCache,
     SpotifyAuthService,
     SpotifyDataService,
     SpotifyLibraryService,
@@ -32,7 +33,7 @@ from library.tasks import (
 from library.tasks.playlists import sync_and_add_playlists_to_library
 
 AUTH = SpotifyAuthService()
-LIBRARY = SpotifyLibraryService(auth_service=AUTH)
+LIBRARY = SpotifyLibraryService(auth_service=AUTH, cache=ResponseCache())
 DATA = SpotifyDataService()
 
 
@@ -111,7 +112,12 @@ class PlaylistViewSet(ViewSetMixin, viewsets.ViewSet):
             return Response(data={}, status=HTTPStatus.NOT_FOUND)
 
         user_id = request.user.id
-        playlist = self._library.library_playlist(user_id, spotify_id)
+        playlist = self._library.library_playlist(
+            user_id,
+            spotify_id,
+            fields=ExpandedPlaylistSerializer.api_fields,
+            item_fields=ExpandedPlaylistSerializer.api_item_fields,
+        )
         data = ExpandedPlaylistSerializer.get(playlist).model_dump()
 
         return Response(data=data, status=HTTPStatus.OK)
@@ -5,6 +5,7 @@ Generated by 'django-admin startproject' using Django 5.1.1.
 
 import os
 import pathlib
+import typing
 
 from dotenv import load_dotenv
 
@@ -144,6 +145,67 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 SPOTIFY_CLIENT_ID = os.environ.get("SPOTIFY_CLIENT_ID", None)
 SPOTIFY_CLIENT_SECRET = os.environ.get("SPOTIFY_CLIENT_SECRET", None)
 SPOTIFY_BASE_URL = "https://api.spotify.com/v1/"
+# Refresh access tokens this many seconds before they expire
+SPOTIFY_TOKEN_REFRESH_MARGIN = int(os.environ.get("SPOTIFY_TOKEN_REFRESH_MARGIN", 300))
+
+# Spotify API HTTP transport (shared, keep-alive connection pool)
+SPOTIFY_HTTP2 = bool(int(os.environ.get("SPOTIFY_HTTP2", 1)))
+SPOTIFY_HTTP_TIMEOUT = float(os.environ.get("SPOTIFY_HTTP_TIMEOUT", 10))
+# Pages requested at once when listings are fetched concurrently
+SPOTIFY_HTTP_CONCURRENCY = int(os.environ.get("SPOTIFY_HTTP_CONCURRENCY", 4))
+
+
+class HTTPPoolSettings(typing.TypedDict):
+    """Limits of the Spotify API connection pool (``httpx.Limits``)."""
+
+    max_connections: int
+    max_keepalive_connections: int
+    keepalive_expiry: float
+
+
+SPOTIFY_HTTP_POOL: HTTPPoolSettings = {
+    "max_connections": int(os.environ.get("SPOTIFY_HTTP_MAX_CONNECTIONS", 20)),
+    "max_keepalive_connections": int(
+        os.environ.get("SPOTIFY_HTTP_MAX_KEEPALIVE_CONNECTIONS", 10)
+    ),
+    "keepalive_expiry": float(os.environ.get("SPOTIFY_HTTP_KEEPALIVE_EXPIRY", 30)),
+}
+
+
+class RateLimitSettings(typing.TypedDict):
+    """Settings of the Spotify API rate limiter & throttled request retries."""
+
+    backend: str  # "redis" or "local"
+    redis_url: str
+    rate: float
+    min_rate: float
+    max_rate: float
+    burst: int
+    user_rate: float
+    user_burst: int
+    max_retries: int
+    max_retry_after: float
+
+
+# Spotify API rate limiting (adaptive token bucket, requests per second).
+# The "redis" backend shares the app-wide budget (and per-user sub-budgets)
+# between every worker process; "local" paces each process on its own.
+SPOTIFY_RATE_LIMIT: RateLimitSettings = {
+    "backend": os.environ.get("SPOTIFY_RATE_LIMIT_BACKEND", "redis"),
+    "redis_url": os.environ.get(
+        "SPOTIFY_RATE_LIMIT_REDIS_URL",
+        os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379"),
+    ),
+    "rate": float(os.environ.get("SPOTIFY_RATE_LIMIT_RATE", 5)),
+    "min_rate": float(os.environ.get("SPOTIFY_RATE_LIMIT_MIN_RATE", 1)),
+    "max_rate": float(os.environ.get("SPOTIFY_RATE_LIMIT_MAX_RATE", 20)),
+    "burst": int(os.environ.get("SPOTIFY_RATE_LIMIT_BURST", 10)),
+    "user_rate": float(os.environ.get("SPOTIFY_RATE_LIMIT_USER_RATE", 5)),
+    "user_burst": int(os.environ.get("SPOTIFY_RATE_LIMIT_USER_BURST", 10)),
+    # Retries of a throttled (429) request, and the longest Retry-After to wait
+    "max_retries": int(os.environ.get("SPOTIFY_RATE_LIMIT_MAX_RETRIES", 3)),
+    "max_retry_after": float(os.environ.get("SPOTIFY_RATE_LIMIT_MAX_WAIT", 60)),
+}
 
 REST_FRAMEWORK = {
     "DEFAULT_METADATA_CLASS": "rest_framework.metadata.SimpleMetadata",
@@ -161,6 +223,65 @@ CELERY_RESULT_BACKEND = "django-db"
 CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379")
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 CELERY_RESULT_EXTENDED = True
+CELERY_BEAT_SCHEDULE = {
+    "poll-listening-history": {
+        "task": "apps.tasks.poll_listening_history",
+        "schedule": float(os.environ.get("LISTENING_HISTORY_POLL_INTERVAL", 5 * 60)),
+    },
+    "refresh-saved-libraries": {
+        "task": "library.tasks.saved.refresh_saved_libraries",
+        "schedule": float(
+            os.environ.get("SAVED_LIBRARY_REFRESH_INTERVAL", 24 * 60 * 60)
+        ),
+    },
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "spotify": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get(
+            "SPOTIFY_CACHE_REDIS_URL",
+            os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379"),
+        ),
+        "OPTIONS": {"socket_connect_timeout": 0.5, "socket_timeout": 0.5},
+    },
+}
+
+
+class ResponseCacheSettings(typing.TypedDict):
+    """Settings of the Spotify API response cache."""
+
+    alias: str
+    ttl: float
+    timeout: int
+
+
+# Spotify API response cache: responses are served from the cache for "ttl"
+# seconds, then revalidated with their ETag until they expire ("timeout").
+SPOTIFY_CACHE: ResponseCacheSettings = {
+    "alias": os.environ.get("SPOTIFY_CACHE_ALIAS", "spotify"),
+    "ttl": float(os.environ.get("SPOTIFY_CACHE_TTL", 30)),
+    "timeout": int(os.environ.get("SPOTIFY_CACHE_TIMEOUT", 60 * 60 * 24)),
+}
+
+
+class FeatureStoreSettings(typing.TypedDict):
+    """Settings of the audio features store."""
+
+    alias: str
+    maxsize: int
+    timeout: int
+
+
+# Audio features never change: keep them in memory & in the shared cache.
+SPOTIFY_FEATURE_STORE: FeatureStoreSettings = {
+    "alias": os.environ.get("SPOTIFY_FEATURE_STORE_ALIAS", "spotify"),
+    "maxsize": int(os.environ.get("SPOTIFY_FEATURE_STORE_SIZE", 10_000)),
+    "timeout": int(os.environ.get("SPOTIFY_FEATURE_STORE_TIMEOUT", 60 * 60 * 24 * 30)),
+}
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",